@@ -25,7 +25,7 @@ export const BucketContextProvider: React.FC<PropsWithChildren> = ({
 
   // no need to re-instantiate browser ever again after component is mounted
   const bucketBrowser = useMemo(
-    () => new BucketFileBrowser({ bucketEndPoint: 'buckets', bucket: '' }),
+    () => new BucketFileBrowser({ bucketEndPoint: 'directory', bucket: '' }),
     []
   );
 
@@ -179,6 +179,17 @@ export const BucketSpace = (): JSX.Element => {
             />
           );
         })}
+        {currentDir?.hasMore && (
+          <li
+            className={'bucket-BrowserListItem bucket-LoadMore'}
+            aria-label={'load-more'}
+            onClick={withSpinnerDecorator(async () => {
+              await currentDir.listMore();
+            })}
+          >
+            Load more...
+          </li>
+        )}
       </ul>
       <DropZone
         show={!showSpinner && currentDir !== null}
@@ -7,6 +7,7 @@ import BucketFile = BucketFileBrowser.BucketFile;
 import { useBucketContext } from './BucketContext';
 import { Dialog, showErrorMessage } from '@jupyterlab/apputils';
 import { useToolTip } from './Tooltip';
+import { formatBytes } from './utils/bucketUtils';
 import IError = Dialog.IError;
 
 export function CollabSpaceEntry({
@@ -95,7 +96,9 @@ export function CollabSpaceEntry({
                 ref={nameInputRef}
               />
             ) : (
-              <p onClick={onClick}>{metadata.name}</p>
+              <p onClick={onClick} title={Private.describe(metadata)}>
+                {metadata.name}
+              </p>
             )}
           </DragDownload>
         </ContextMenu>
@@ -118,6 +121,24 @@ export namespace CollabSpaceEntry {
 }
 
 namespace Private {
+  /**
+   * text describing the size and the last modification of a file, when they are known
+   */
+  export const describe = (
+    entry: BucketFileBrowser.IBrowserEntry
+  ): string | undefined => {
+    const file = entry as BucketFile;
+    const details: Array<string> = [];
+    if (file.size !== undefined) {
+      details.push(formatBytes(file.size));
+    }
+    if (file.lastModified) {
+      details.push(`modified ${new Date(file.lastModified).toLocaleString()}`);
+    }
+    return details.length > 0 ? details.join(', ') : undefined;
+  };
+
+
   export type WrapperProps = React.PropsWithChildren<{
     tag: 'li' | 'div';
   }>;
@@ -12,8 +12,13 @@ import { MimeData } from '@lumino/coreutils';
 import { Contents } from '@jupyterlab/services';
 import { Dialog, showDialog, showErrorMessage } from '@jupyterlab/apputils';
 import { UploadAnimation } from './FileTransferAnimations';
+import { MULTIPART_THRESHOLD } from './bucketFileBrowser';
+import { runConcurrently } from './utils/bucketUtils';
 import IError = Dialog.IError;
 
+// number of files uploaded at the same time from local storage
+const UPLOAD_WORKERS = 4;
+
 export const DropZone: React.FC<DropZone.IProps> = ({
   show,
   finishAction
@@ -81,6 +86,14 @@ export const DropZone: React.FC<DropZone.IProps> = ({
       source: dragSource,
       action: async () => {
         const [path, name] = [dragSource.path, dragSource.name];
+        if (dragSource.type === 'directory') {
+          const resp =
+            await bucketBrowser.currentDirectory?.uploadDirectory(path);
+          if (resp && !resp.success) {
+            await showErrorMessage('Upload Failed', resp.message);
+          }
+          return;
+        }
         await bucketBrowser.currentDirectory?.upload(path, name);
       }
     };
@@ -198,35 +211,52 @@ export const DropZone: React.FC<DropZone.IProps> = ({
     }
     setUploading(true);
     if (e.dataTransfer.files && e.dataTransfer.files[0]) {
-      if (e.dataTransfer.files.length > 1) {
-        await showErrorMessage(
-          'Unsupported',
-          'Currently you can only upload a file at a time!'
+      try {
+        const directory = bucketBrowser.currentDirectory;
+        const filesToUpload = Array.from(e.dataTransfer.files);
+        const smallFiles = filesToUpload.filter(
+          f => f.size <= MULTIPART_THRESHOLD
+        );
+        const largeFiles = filesToUpload.filter(
+          f => f.size > MULTIPART_THRESHOLD
         );
-      } else {
-        try {
-          const fileToUpload = e.dataTransfer.files[0];
-          const fileName = fileToUpload.name;
-          const uploadUrl =
-            await bucketBrowser.currentDirectory?.getUploadUrl(fileName);
+        const uploaded: Array<string> = [];
+        // upload urls of all the small files are requested at once, then the files are sent in parallel
+        const uploadUrls =
+          smallFiles.length > 0
+            ? await directory?.getUploadUrls(smallFiles.map(f => f.name))
+            : undefined;
+        await runConcurrently(smallFiles, UPLOAD_WORKERS, async file => {
+          const uploadUrl = uploadUrls?.get(file.name);
           if (!uploadUrl) {
             return;
           }
           const uploadResp = await fetch(uploadUrl, {
             method: 'PUT',
-            body: fileToUpload
+            body: file
           });
           if (uploadResp.ok) {
-            await showDialog({
-              title: 'Upload Success!',
-              body: `${fileName} was uploaded to ${bucketBrowser.currentDirectory?.absolutePath}/${fileName}`,
-              buttons: [Dialog.okButton({ label: 'OK' })]
-            });
-            await finishAction();
+            uploaded.push(file.name);
           }
-        } catch (e) {
-          await showErrorMessage('Upload Failed', e as string | IError);
+        });
+        for (const file of largeFiles) {
+          if (await directory?.multipartUpload(file)) {
+            uploaded.push(file.name);
+          }
+        }
+        if (uploaded.length > 0) {
+          await showDialog({
+            title: 'Upload Success!',
+            body:
+              uploaded.length === 1
+                ? `${uploaded[0]} was uploaded to ${directory?.absolutePath}/${uploaded[0]}`
+                : `${uploaded.length} of ${filesToUpload.length} files were uploaded to ${directory?.absolutePath}/`,
+            buttons: [Dialog.okButton({ label: 'OK' })]
+          });
+          await finishAction();
         }
+      } catch (e) {
+        await showErrorMessage('Upload Failed', e as string | IError);
       }
     }
     setUploading(false);
@@ -2,7 +2,7 @@ import {BucketSpace, BucketWidget} from "../BucketWidget";
 import {cleanup, fireEvent, render, screen, waitFor} from '@testing-library/react';
 import React from "react";
 import {BucketContextProvider, useBucketContext} from "../BucketContext";
-import {getError} from "./testUtils";
+import {getError, listingPage} from "./testUtils";
 import {ContextError} from "../exceptions";
 
 jest.mock('../handler', () => {
@@ -15,6 +15,9 @@ jest.mock('../handler', () => {
           if (_url.includes('buckets_list')) {
               return Promise.resolve(['bucket1', 'test_bucket', 'bucket_2'])
           }
+          if (_url.includes('directory')) {
+              return Promise.resolve(listingPage(filesData.files, _url))
+          }
           return Promise.resolve(filesData)
       })
   };
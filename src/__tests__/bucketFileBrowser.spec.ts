@@ -1,5 +1,5 @@
 import {BucketFileBrowser} from "../bucketFileBrowser";
-import {getError, NoErrorThrownError} from "./testUtils";
+import {getError, listingPage, NoErrorThrownError} from "./testUtils";
 import {BreadCrumbNotFoundError, FilePathMatchError, InvalidDirectoryError} from "../exceptions";
 import BucketDirectory = BucketFileBrowser.BucketDirectory;
 import BucketFile = BucketFileBrowser.BucketFile;
@@ -16,6 +16,9 @@ jest.mock('../handler', () => {
           if (url.includes('fail')){
               return Promise.reject(new Error());
           }
+          if (url.includes('page_size')){
+              return Promise.resolve(listingPage(filesData.files, url));
+          }
           return Promise.resolve(filesData)
       })
   };
@@ -158,6 +161,17 @@ describe('Test BucketFileBrowser', () => {
         expect(browser.breadcrumbs).toEqual([]);
     });
 
+    it('tests subdirectories are listed when accessed', async () => {
+        const browser = new BucketFileBrowser({bucketEndPoint: 'test', bucket: 'test'});
+        await browser.openBucket();
+        expect(browser.currentDirectory?.hasMore).toEqual(false);
+        expect(browser.currentDirectory?.directories.get('dir1')?.hasMore).toEqual(true);
+        const dir = await browser.cd('dir1');
+        expect(dir.hasMore).toEqual(false);
+        expect(dir.directoriesCount).toEqual(1);
+        expect(requestAPI).toHaveBeenLastCalledWith('test?bucket=test&prefix=dir1&page_size=500&format=columnar');
+    });
+
     it('Tests cd success if dir exists as child of current dir', async () => {
         const browser = new BucketFileBrowser({bucketEndPoint: 'test', bucket: 'test'});
         await browser.openBucket();
@@ -12,4 +12,50 @@ export const getError = async (call: () => unknown): Promise<Error> => {
   } catch (error) {
     return error as Error;
   }
-};
\ No newline at end of file
+};
+/**
+ * one level of the directory requested by <url> (?prefix=...) from a list of paths, as returned by the
+ * directory listing endpoint
+ * @param paths
+ * @param url
+ */
+export const listingPage = (paths: Array<string>, url: string) => {
+  const prefix = new URLSearchParams(url.split('?')[1]).get('prefix');
+  const start = prefix ? `${prefix}/` : '';
+  const directories = new Set<string>();
+  const files: Array<{ name: string }> = [];
+  for (const path of paths.filter(p => p.startsWith(start))) {
+    const relativePath = path.slice(start.length);
+    if (relativePath.includes('/')) {
+      directories.add(relativePath.split('/')[0]);
+    } else {
+      files.push({ name: relativePath });
+    }
+  }
+  if (url.includes('format=columnar')) {
+    return {
+      success: true,
+      message: '',
+      prefix: start,
+      directories: [...directories],
+      files: [],
+      listing: {
+        prefixes: [''],
+        prefix_ids: files.map(() => 0),
+        names: files.map(f => f.name),
+        sizes: files.map(() => 0),
+        hashes: files.map(() => null),
+        mtimes: files.map(() => null)
+      },
+      cursor: null
+    };
+  }
+  return {
+    success: true,
+    message: '',
+    prefix: start,
+    directories: [...directories],
+    files: files,
+    cursor: null
+  };
+};
@@ -1,4 +1,4 @@
-import {getExtension} from '../utils/bucketUtils';
+import {decodeColumnarListing, formatBytes, getExtension, runConcurrently} from '../utils/bucketUtils';
 import {assertIsNode} from "../utils/domUtils";
 
 
@@ -38,6 +38,43 @@ describe('test getExtension', () => {
     })
 })
 
+describe('test columnar listing', () => {
+    it('decodes files with their directories', () => {
+        const listing = {
+            prefixes: ['', 'dir'],
+            prefix_ids: [0, 1],
+            names: ['a.txt', 'b.txt'],
+            sizes: [1, 2],
+            hashes: ['h1', null],
+            mtimes: ['2023-01-11T08:27:45.613660', null]
+        };
+        expect(decodeColumnarListing(listing)).toEqual([
+            {name: 'a.txt', bytes: 1, hash: 'h1', last_modified: '2023-01-11T08:27:45.613660'},
+            {name: 'dir/b.txt', bytes: 2, hash: null, last_modified: null}
+        ]);
+    });
+
+    it('formats sizes', () => {
+        expect(formatBytes(512)).toEqual('512 B');
+        expect(formatBytes(1536)).toEqual('1.5 KB');
+        expect(formatBytes(3 * 1024 * 1024 * 1024)).toEqual('3.0 GB');
+    });
+});
+
+describe('test runConcurrently', () => {
+    it('starts no new task once a task failed', async () => {
+        const started: Array<number> = [];
+        const task = async (item: number) => {
+            started.push(item);
+            if (item === 1) {
+                throw new Error('failed');
+            }
+        };
+        await expect(runConcurrently([1, 2, 3, 4], 1, task)).rejects.toThrow('failed');
+        expect(started).toEqual([1]);
+    });
+});
+
 describe('test domUtils.ts', () => {
    it('tests assertIsNode with Node as argument', () => {
        const node = document.createElement('div');
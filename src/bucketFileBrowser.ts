@@ -6,9 +6,26 @@ import {
 } from './exceptions';
 import { Dialog, showDialog, showErrorMessage } from '@jupyterlab/apputils';
 import { JpFileBrowser } from './JpFileBrowser';
-import { getExtension } from './utils/bucketUtils';
+import {
+  decodeColumnarListing,
+  getExtension,
+  IColumnarListing,
+  IFileMetadata,
+  runConcurrently
+} from './utils/bucketUtils';
 import IError = Dialog.IError;
 
+/**
+ * files larger than this (in bytes) are uploaded from local storage as multipart uploads
+ */
+export const MULTIPART_THRESHOLD = 64 * 1024 * 1024;
+const MULTIPART_WORKERS = 4;
+const MULTIPART_PART_ATTEMPTS = 3;
+/**
+ * number of entries of a directory listed in one request
+ */
+export const LISTING_PAGE_SIZE = 500;
+
 export class BucketFileBrowser {
   private _bucket: string;
   private readonly _bucketEndpoint: string;
@@ -27,15 +44,6 @@ export class BucketFileBrowser {
     this._currentFiles = new Map<string, BucketFileBrowser.IBrowserEntry>();
   }
 
-  private _buildBrowser(contents: Array<string>): void {
-    this._homeDirectory = new BucketFileBrowser.BucketDirectory(
-      '',
-      contents,
-      this.bucket
-    );
-    this._currentDirectory = this._homeDirectory;
-  }
-
   /**
    * getter function for the _currentDirectory
    */
@@ -86,21 +94,23 @@ export class BucketFileBrowser {
   }
 
   /**
-   * method to get the file structure of the bucket and build the browser for it
+   * method to open the bucket and list the first page of its top directory. Subdirectories
+   * are listed when they are accessed
    */
   async openBucket(): Promise<BucketFileBrowser.BucketDirectory | undefined> {
     // make sure the current file set is empty before populating
     this._currentFiles.clear();
     this._breadcrumbs = []; // current path is '/'
     try {
-      const bucketStructureResponse =
-        await requestAPI<BucketFileBrowser.IBucketStructureResponse>(
-          `${this._bucketEndpoint}?bucket=${this._bucket}`
-        );
-      if (!bucketStructureResponse.success) {
-        await showErrorMessage('ERROR', bucketStructureResponse.message);
-      }
-      this._buildBrowser(bucketStructureResponse.files);
+      const homeDirectory = BucketFileBrowser.BucketDirectory.fromListing(
+        '',
+        this._bucket,
+        '',
+        this._bucketEndpoint
+      );
+      await homeDirectory.list();
+      this._homeDirectory = homeDirectory;
+      this._currentDirectory = homeDirectory;
     } catch (e) {
       await showErrorMessage('ERROR', `Could not open bucket. ${e}`);
     }
@@ -126,6 +136,7 @@ export class BucketFileBrowser {
         `Can't cd to directory ${directoryName}! Directory doesn't seem to exist.`
       );
     }
+    await dirToCd.list();
     this._currentDirectory = dirToCd;
     this._currentFiles.clear();
     this._breadcrumbs.push(dirToCd);
@@ -170,6 +181,17 @@ export namespace BucketFileBrowser {
     files: Array<string>;
   }
 
+  export interface IDirectoryPageResponse {
+    success: boolean;
+    message: string;
+    prefix: string;
+    directories: Array<string>;
+    files: Array<IFileMetadata>;
+    // metadata of the files, when requested in columnar format
+    listing?: IColumnarListing;
+    cursor: string | null;
+  }
+
   export interface IBrowserEntry {
     name: string;
     absolutePath: string;
@@ -198,6 +220,11 @@ export namespace BucketFileBrowser {
 
     public readonly isFile: boolean = false;
 
+    // position of the next page of the listing, undefined once the last page was listed
+    private _cursor?: string;
+    private _listed = true;
+    private _listingEndpoint = 'directory';
+
     /**
      * Create a new directory instance
      * @param name - name of directory
@@ -217,6 +244,29 @@ export namespace BucketFileBrowser {
       this._buildContents(contents);
     }
 
+    /**
+     * Create a directory whose contents are listed from the server on demand, one page at a time
+     * @param name - name of directory
+     * @param bucket - bucket name as string
+     * @param absolutePath - pathlike string representing the absolute path of the directory in bucket
+     * @param listingEndpoint - endpoint listing a page of a directory
+     */
+    static fromListing(
+      name: string,
+      bucket: string,
+      absolutePath?: string,
+      listingEndpoint = 'directory'
+    ): BucketDirectory {
+      const directory = new BucketDirectory(name, [], bucket, absolutePath);
+      directory._listed = false;
+      directory._listingEndpoint = listingEndpoint;
+      return directory;
+    }
+
+    private _childPath(name: string): string {
+      return this.absolutePath ? `${this.absolutePath}/${name}` : name;
+    }
+
     private _buildContents(contents: Array<string>): void {
       const subdirs = new Map<string, Array<string>>();
       // instantiate files in this directory while creating the list with subdirectories
@@ -224,7 +274,7 @@ export namespace BucketFileBrowser {
         if (!path.includes('/')) {
           const fileEntry = new BucketFile(
             path,
-            this.absolutePath ? `${this.absolutePath}/${path}` : path,
+            this._childPath(path),
             this.bucket
           );
 
@@ -242,14 +292,11 @@ export namespace BucketFileBrowser {
       }
       // build sub-directories
       subdirs.forEach((value, key) => {
-        const absolutePath = this.absolutePath
-          ? `${this.absolutePath}/${key}`
-          : key;
         const subDir = new BucketDirectory(
           key,
           value,
           this.bucket,
-          absolutePath
+          this._childPath(key)
         );
         this.directories.set(key, subDir);
       });
@@ -259,6 +306,75 @@ export namespace BucketFileBrowser {
       return this.files.size;
     }
 
+    /**
+     * true if this directory has entries which were not listed yet
+     */
+    public get hasMore(): boolean {
+      return !this._listed || this._cursor !== undefined;
+    }
+
+    /**
+     * Lists the first page of this directory, if it was not listed already
+     */
+    async list(): Promise<void> {
+      if (!this._listed) {
+        await this.listMore();
+      }
+    }
+
+    /**
+     * Lists the next page of entries of this directory and adds them to its contents
+     * @param pageSize - max number of entries to list
+     */
+    async listMore(pageSize: number = LISTING_PAGE_SIZE): Promise<void> {
+      if (!this.hasMore) {
+        return;
+      }
+      let query = `bucket=${encodeURIComponent(
+        this.bucket
+      )}&prefix=${encodeURIComponent(
+        this.absolutePath
+      )}&page_size=${pageSize}&format=columnar`;
+      if (this._cursor !== undefined) {
+        query += `&cursor=${encodeURIComponent(this._cursor)}`;
+      }
+      const page = await requestAPI<IDirectoryPageResponse>(
+        `${this._listingEndpoint}?${query}`
+      );
+      if (!page.success) {
+        throw new Error(page.message);
+      }
+      for (const name of page.directories) {
+        if (!this.directories.has(name)) {
+          this.directories.set(
+            name,
+            BucketDirectory.fromListing(
+              name,
+              this.bucket,
+              this._childPath(name),
+              this._listingEndpoint
+            )
+          );
+        }
+      }
+      const files = page.listing
+        ? decodeColumnarListing(page.listing)
+        : page.files;
+      for (const file of files) {
+        this.files.set(
+          file.name,
+          new BucketFile(
+            file.name,
+            this._childPath(file.name),
+            this.bucket,
+            file
+          )
+        );
+      }
+      this._cursor = page.cursor ?? undefined;
+      this._listed = true;
+    }
+
     public get directoriesCount(): number {
       return this.directories.size;
     }
@@ -296,6 +412,22 @@ export namespace BucketFileBrowser {
       console.log('result: ', result);
     }
 
+    /**
+     * Uploads a directory (with all its subdirectories) from drive to bucket in this directory
+     * @param directorySource directory to be uploaded from drive in the form path/to/directory
+     */
+    async uploadDirectory(
+      directorySource: string
+    ): Promise<IBulkTransferResponse> {
+      return await requestAPI<IBulkTransferResponse>(
+        `upload_directory?source_dir=${encodeURIComponent(
+          directorySource
+        )}&bucket=${this.bucket}&destination=${encodeURIComponent(
+          this.absolutePath
+        )}`
+      );
+    }
+
     /**
      * Get an upload URL for a file to this directory in the same bucket as this directory
      * Note: to upload the file make a PUT request with a bytes stream to the URL returned by this method
@@ -322,6 +454,121 @@ export namespace BucketFileBrowser {
       return uploadUrlResponse.url;
     }
 
+    /**
+     * Get upload URLs for many files to this directory at once. Returns a map of file names to upload URLs,
+     * which is empty if the user cancelled the upload.
+     * Note: to upload the files make PUT requests with their bytes streams to the URLs returned by this method
+     * @param filenames
+     */
+    async getUploadUrls(filenames: Array<string>): Promise<Map<string, string>> {
+      const uploadUrls = new Map<string, string>();
+      const existing = filenames.filter(name => this.files.has(name));
+      if (existing.length > 0 && !(await this._confirmOverride(existing[0]))) {
+        return uploadUrls;
+      }
+      const uploadUrlsResponse = await requestAPI<IBatchUploadResponse>(
+        'local_upload_batch',
+        {
+          method: 'POST',
+          body: JSON.stringify({
+            to_bucket: this.bucket,
+            targets: filenames.map(name => ({
+              with_name: name,
+              to_path: this.absolutePath
+            }))
+          })
+        }
+      );
+      for (const target of uploadUrlsResponse.urls) {
+        if (target.success) {
+          uploadUrls.set(target.with_name, target.url);
+        }
+      }
+      if (!uploadUrlsResponse.success) {
+        await showErrorMessage(
+          'Error',
+          `Could not get upload urls for ${
+            filenames.length - uploadUrls.size
+          } files!`
+        );
+      }
+      return uploadUrls;
+    }
+
+    /**
+     * Uploads a large file from local storage to this directory as a multipart upload. The file is sent
+     * in parts, several at a time, each part being retried on failure, then the upload is completed.
+     * The upload is aborted if a part or the completion fails.
+     * Returns false if the upload was cancelled by the user.
+     * @param file
+     */
+    async multipartUpload(file: File): Promise<boolean> {
+      const allowUpload = await this._confirmOverride(file.name);
+      if (!allowUpload) {
+        return false;
+      }
+      const query = `to_bucket=${this.bucket}&with_name=${encodeURIComponent(
+        file.name
+      )}&to_path=${encodeURIComponent(this.absolutePath)}&file_size=${
+        file.size
+      }`;
+      let batch = await requestAPI<IMultipartUploadResponse>(
+        `multipart_upload?${query}`
+      );
+      if (!batch.success) {
+        throw new Error(batch.message);
+      }
+      const uploadId = batch.upload_id;
+      try {
+        const etags: Record<string, string> = {};
+        let firstPart = 1;
+        while (batch.success) {
+          const partSize = batch.part_size;
+          const urls = Object.entries(batch.urls);
+          await runConcurrently(urls, MULTIPART_WORKERS, async ([part, url]) => {
+            const start = (Number(part) - 1) * partSize;
+            etags[part] = await putPart(url, file.slice(start, start + partSize));
+          });
+          firstPart += urls.length;
+          if (firstPart > batch.parts_count) {
+            break;
+          }
+          batch = await requestAPI<IMultipartUploadResponse>(
+            `multipart_upload?${query}&upload_id=${uploadId}&first_part=${firstPart}`
+          );
+        }
+        if (!batch.success) {
+          throw new Error(batch.message);
+        }
+        const completeResponse = await requestAPI<IMultipartUploadResponse>(
+          'multipart_upload',
+          {
+            method: 'POST',
+            body: JSON.stringify({
+              to_bucket: this.bucket,
+              with_name: file.name,
+              to_path: this.absolutePath,
+              upload_id: uploadId,
+              etags: etags
+            })
+          }
+        );
+        if (!completeResponse.success) {
+          throw new Error(completeResponse.message);
+        }
+      } catch (e) {
+        // drop the parts uploaded so far, they would take storage space until the upload expires
+        await requestAPI<IMultipartUploadResponse>(
+          `multipart_upload?${query}&upload_id=${uploadId}`,
+          { method: 'DELETE' }
+        ).catch(abortError =>
+          console.error(`Could not abort upload of ${file.name}`, abortError)
+        );
+        throw e;
+      }
+      return true;
+    }
+
     /**
      * Checks if a file with the provided <filename> already exists in this directory
      * and prompts the user if it should be replaced. Returns true if it should be replaced
@@ -350,6 +597,10 @@ export namespace BucketFileBrowser {
     private _name: string;
     public readonly bucket: string;
     private _absolutePath: string;
+    // size in bytes, if known from the listing
+    public readonly size?: number;
+    // last modification date, if known from the listing
+    public readonly lastModified?: string;
 
     public readonly isFile: boolean = true;
 
@@ -358,11 +609,19 @@ export namespace BucketFileBrowser {
      * @param name - name of the file
      * @param absolutePath - absolute path to this file
      * @param bucket - bucket name as string
+     * @param metadata - metadata of the file from the bucket listing
      */
-    constructor(name: string, absolutePath: string, bucket: string) {
+    constructor(
+      name: string,
+      absolutePath: string,
+      bucket: string,
+      metadata?: IFileMetadata
+    ) {
       this._name = name;
       this.bucket = bucket;
       this._absolutePath = absolutePath;
+      this.size = metadata?.bytes;
+      this.lastModified = metadata?.last_modified ?? undefined;
       this._validate();
     }
 
@@ -481,11 +740,61 @@ export namespace BucketFileBrowser {
     }
   }
 
+  /**
+   * Upload a part of a multipart upload, retrying on failure. Returns the ETag of the part
+   * @param url
+   * @param body
+   */
+  async function putPart(url: string, body: Blob): Promise<string> {
+    let lastError: unknown;
+    for (let attempt = 1; attempt <= MULTIPART_PART_ATTEMPTS; attempt++) {
+      try {
+        const resp = await fetch(url, { method: 'PUT', body: body });
+        if (resp.ok) {
+          return resp.headers.get('ETag') ?? '';
+        }
+        lastError = new Error(`${resp.status} ${resp.statusText}`);
+      } catch (e) {
+        lastError = e;
+      }
+    }
+    throw lastError;
+  }
+
+  export interface IBatchUploadResponse {
+    success: boolean;
+    message: string;
+    urls: Array<{
+      with_name: string;
+      to_path: string;
+      url: string;
+      success: boolean;
+      message: string;
+    }>;
+  }
+
+  export interface IMultipartUploadResponse {
+    success: boolean;
+    message: string;
+    upload_id: string;
+    part_size: number;
+    parts_count: number;
+    urls: Record<string, string>;
+  }
+
   export interface INativeUploadResponse {
     success: boolean;
     url: string;
   }
 
+  export interface IBulkTransferResponse {
+    success: boolean;
+    message: string;
+    succeeded: number;
+    failed: number;
+    files: Array<{ name: string; success: boolean; message: string }>;
+  }
+
   export interface IDownloadUrl {
     success: boolean;
     url: string;
@@ -37,3 +37,94 @@ export interface IGuessResponse {
   bucket: string;
   message: string;
 }
+
+/**
+ * Run the async <task> for each of the <items>, with at most <limit> tasks running at the same time.
+ * Once a task fails no new task is started, and the promise rejects with the first error after the
+ * running tasks settle.
+ * @param items
+ * @param limit
+ * @param task
+ */
+export async function runConcurrently<T>(
+  items: Array<T>,
+  limit: number,
+  task: (item: T) => Promise<void>
+): Promise<void> {
+  let next = 0;
+  let failed = false;
+  let firstError: unknown;
+  const worker = async (): Promise<void> => {
+    while (!failed && next < items.length) {
+      const item = items[next++];
+      try {
+        await task(item);
+      } catch (e) {
+        if (!failed) {
+          failed = true;
+          firstError = e;
+        }
+      }
+    }
+  };
+  const workers = [];
+  for (let i = 0; i < Math.min(limit, items.length); i++) {
+    workers.push(worker());
+  }
+  await Promise.all(workers);
+  if (failed) {
+    throw firstError;
+  }
+}
+
+/**
+ * Metadata of the files of a listing packed as parallel arrays. The directory of each file is
+ * stored once in prefixes and referenced by its index in prefix_ids
+ */
+export interface IColumnarListing {
+  prefixes: Array<string>;
+  prefix_ids: Array<number>;
+  names: Array<string>;
+  sizes: Array<number>;
+  hashes: Array<string | null>;
+  mtimes: Array<string | null>;
+}
+
+export interface IFileMetadata {
+  name: string;
+  bytes?: number;
+  hash?: string | null;
+  last_modified?: string | null;
+}
+
+/**
+ * Unpack a columnar listing to the metadata of each file
+ * @param listing
+ */
+export function decodeColumnarListing(
+  listing: IColumnarListing
+): Array<IFileMetadata> {
+  return listing.names.map((name, i) => {
+    const prefix = listing.prefixes[listing.prefix_ids[i]];
+    return {
+      name: prefix ? `${prefix}/${name}` : name,
+      bytes: listing.sizes[i],
+      hash: listing.hashes[i],
+      last_modified: listing.mtimes[i]
+    };
+  });
+}
+
+/**
+ * Human readable size of <bytes>, e.g. 1.5 MB
+ * @param bytes
+ */
+export const formatBytes = (bytes: number): string => {
+  const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+  let unit = 0;
+  while (bytes >= 1024 && unit < units.length - 1) {
+    bytes /= 1024;
+    unit++;
+  }
+  return `${unit === 0 ? bytes : bytes.toFixed(1)} ${units[unit]}`;
+};
@@ -8,6 +8,7 @@ except ImportError:
     warnings.warn("Importing 'tvb_ext_bucket' outside a proper installation.")
     __version__ = "dev"
 from .handlers import setup_handlers
+from .jobs import JOB_QUEUE
 
 
 def _jupyter_labextension_paths():
@@ -32,5 +33,7 @@ def _load_jupyter_server_extension(server_app):
         JupyterLab application instance
     """
     setup_handlers(server_app.web_app)
+    # resume the background transfers queued before the server stopped
+    JOB_QUEUE.start()
     name = "tvb_ext_bucket"
     server_app.log.info(f"Registered {name} server extension")
@@ -1,6 +1,14 @@
+import os
+
 from ebrains_drive.client import BucketApiClient
+from ebrains_drive.exceptions import ClientHttpError
+from requests.adapters import HTTPAdapter
 
 from tvb_ext_bucket.bucket_api.buckets import ExtendedBuckets
+from tvb_ext_bucket.bucket_api.resilience import call_with_retries, RETRY_STATUSES
+
+# max number of pooled connections kept per host by a client session
+HTTP_POOL_SIZE = int(os.getenv('TVB_EXT_BUCKET_HTTP_POOL_SIZE', 16))
 
 
 class ExtendedBucketApiClient(BucketApiClient):
@@ -8,7 +16,24 @@ class ExtendedBucketApiClient(BucketApiClient):
     def __init__(self, username=None, password=None, token=None, env="") -> None:
         super().__init__(username, password, token, env)
         self.buckets = ExtendedBuckets(self)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     @property
     def token(self):
         return self._token
+
+    def send_request(self, method, url, *args, **kwargs):
+        """
+        Send an api request through the retries and the circuit breaker of its endpoint,
+        every call of the buckets, files and multipart uploads goes through here
+        """
+        expected = kwargs.pop("expected", 200)
+        expected = tuple(expected) if hasattr(expected, "__iter__") else (expected,)
+        send = super().send_request
+        resp = call_with_retries(method, url, lambda: send(method, url, *args, expected=expected + RETRY_STATUSES,
+                                                           **kwargs))
+        if resp.status_code not in expected:
+            raise ClientHttpError(resp.status_code, f"Expected {expected}, but got {resp.status_code}")
+        return resp
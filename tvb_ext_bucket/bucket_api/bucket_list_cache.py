@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from ebrains_drive.exceptions import ClientHttpError, TokenExpired, Unauthorized
+
+from tvb_ext_bucket.executor import EXECUTOR
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# seconds a listing of the buckets of a user is fresh; older listings are still served, but refreshed in
+# the background. 0 disables the cache
+BUCKET_LIST_TTL = int(os.getenv('TVB_EXT_BUCKET_BUCKET_LIST_TTL', 60))
+# max number of users whose buckets are kept in cache
+BUCKET_LIST_CACHE_SIZE = int(os.getenv('TVB_EXT_BUCKET_BUCKET_LIST_CACHE_SIZE', 64))
+
+# statuses telling that the user can't list the buckets with its token anymore
+UNAUTHORIZED_STATUSES = (401, 403)
+
+
+def is_unauthorized(error):
+    # type: (Exception) -> bool
+    return isinstance(error, (TokenExpired, Unauthorized)) or \
+        (isinstance(error, ClientHttpError) and error.code in UNAUTHORIZED_STATUSES)
+
+
+class BucketListCache:
+    """
+    Process wide cache of the buckets each user can access, with stale-while-revalidate semantics: a listing
+    younger than <ttl> seconds is served as is, an older one is served right away while it is fetched again
+    in the background. The listing of a user is dropped when the api rejects its token (401/403).
+    """
+
+    def __init__(self, ttl=BUCKET_LIST_TTL, max_size=BUCKET_LIST_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._listings = OrderedDict()  # type: OrderedDict[str, Tuple[List[Any], float]]
+        self._refreshing = set()  # type: Set[str]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        # type: () -> bool
+        return self.ttl > 0
+
+    def get(self, user, list_buckets):
+        # type: (str, Callable[[], List[Any]]) -> List[Any]
+        """
+        Get the buckets of <user>, calling <list_buckets> to list them if they are not cached
+        """
+        if not self.enabled:
+            return list_buckets()
+        with self._lock:
+            entry = self._listings.get(user)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._listings.move_to_end(user)
+                stale = time.time() - entry[1] > self.ttl
+                if stale:
+                    self.stale_hits += 1
+                else:
+                    self.hits += 1
+                refresh = stale and user not in self._refreshing
+                if refresh:
+                    self._refreshing.add(user)
+        if entry is None:
+            return self._fetch(user, list_buckets)
+        if refresh:
+            EXECUTOR.submit(self._refresh, user, list_buckets)
+        return entry[0]
+
+    def _fetch(self, user, list_buckets):
+        # type: (str, Callable[[], List[Any]]) -> List[Any]
+        try:
+            buckets = list_buckets()
+        except Exception as e:
+            if is_unauthorized(e):
+                self.invalidate(user)
+            raise
+        with self._lock:
+            self._listings[user] = (buckets, time.time())
+            self._listings.move_to_end(user)
+            while len(self._listings) > self.max_size:
+                self._listings.popitem(last=False)
+        return buckets
+
+    def _refresh(self, user, list_buckets):
+        # type: (str, Callable[[], List[Any]]) -> None
+        try:
+            self._fetch(user, list_buckets)
+        except Exception as e:
+            LOGGER.warning(f'Could not refresh the buckets of user {user}: {e}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(user)
+
+    def invalidate(self, user):
+        # type: (str) -> None
+        with self._lock:
+            if self._listings.pop(user, None) is not None:
+                LOGGER.info(f'Invalidating the cached buckets of user {user}')
+                self.invalidations += 1
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._listings.clear()
+
+    def stats(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0,
+                'invalidations': self.invalidations,
+                'entries': len(self._listings),
+                'ttl': self.ttl
+            }
+
+    def __len__(self):
+        return len(self._listings)
+
+
+BUCKET_LIST_CACHE = BucketListCache()
@@ -0,0 +1,177 @@
+import hashlib
+import heapq
+import io
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from tvb_ext_bucket.bucket_api.multipart import MULTIPART_PART_SIZE
+
+# outcome of comparing a transferred file with the hash of the object in the storage
+VERIFIED = 'verified'
+# the hash of the object is not known, or was computed in a way that can't be reproduced (e.g. multipart
+# uploads with another part size), only the size was checked
+UNVERIFIED = 'unverified'
+MISMATCH = 'mismatch'
+# how many times a transfer is attempted when the transferred content does not match the hash of the object
+TRANSFER_VERIFY_ATTEMPTS = int(os.getenv('TVB_EXT_BUCKET_TRANSFER_VERIFY_ATTEMPTS', 2))
+# size in bytes of the blocks read when hashing a local file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def parts_count(object_hash):
+    # type: (Optional[str]) -> Optional[int]
+    """
+    Number of parts of a multipart hash (<md5 of the parts md5s>-<parts count>), None for a plain md5
+    """
+    if not object_hash or '-' not in object_hash:
+        return None
+    count = object_hash.rsplit('-', 1)[-1]
+    return int(count) if count.isdigit() else None
+
+
+def composite_hash(part_digests):
+    # type: (List[bytes]) -> str
+    """
+    Hash of a multipart object from the md5 digests of its parts, in order
+    """
+    return f'{hashlib.md5(b"".join(part_digests)).hexdigest()}-{len(part_digests)}'
+
+
+def verify(digest, size, remote_hash, remote_bytes=None, same_parts=False):
+    # type: (str, int, Optional[str], Optional[int], bool) -> str
+    """
+    Compare the <digest> and <size> of transferred content with the hash and size of the object in the storage.
+    A multipart hash only tells a mismatch when the parts of <digest> are known to be split like the ones of the
+    object (<same_parts>, e.g. the object was just uploaded in these parts); otherwise differing multipart hashes
+    may just come from another part size (another tool, another configuration) and the result is UNVERIFIED.
+    -------
+    :return: VERIFIED, UNVERIFIED or MISMATCH
+    """
+    if remote_bytes is not None and remote_bytes != size:
+        return MISMATCH
+    remote_hash = (remote_hash or '').strip('"')
+    if not remote_hash:
+        return UNVERIFIED
+    if parts_count(digest) != parts_count(remote_hash):
+        # one side is a plain md5 and the other a multipart hash, or the parts are of another size
+        return UNVERIFIED
+    if digest == remote_hash:
+        return VERIFIED
+    return MISMATCH if parts_count(remote_hash) is None or same_parts else UNVERIFIED
+
+
+class ObjectHash:
+    """
+    Incremental hash of the content of an object, computed the way the storage does: the md5 of the content,
+    or when <part_size> is set, the multipart hash of the content split in parts of <part_size> bytes.
+    """
+
+    def __init__(self, part_size=None):
+        # type: (Optional[int]) -> None
+        self.part_size = part_size
+        self.bytes = 0
+        self._md5 = hashlib.md5()
+        self._part_digests = []  # type: List[bytes]
+        self._part_bytes = 0
+
+    @classmethod
+    def like(cls, remote_hash, part_size=MULTIPART_PART_SIZE):
+        # type: (Optional[str], int) -> ObjectHash
+        """
+        Hash computed the same way as <remote_hash>, multipart hashes are assumed to use <part_size> parts,
+        so they only confirm the content when they match exactly
+        """
+        return cls(part_size if parts_count(remote_hash) is not None else None)
+
+    def update(self, data):
+        # type: (bytes) -> None
+        self.bytes += len(data)
+        if self.part_size is None:
+            self._md5.update(data)
+            return
+        view = memoryview(data)
+        while view:
+            taken = min(len(view), self.part_size - self._part_bytes)
+            self._md5.update(view[:taken])
+            self._part_bytes += taken
+            view = view[taken:]
+            if self._part_bytes == self.part_size:
+                self._part_digests.append(self._md5.digest())
+                self._md5 = hashlib.md5()
+                self._part_bytes = 0
+
+    def hexdigest(self):
+        # type: () -> str
+        if self.part_size is None:
+            return self._md5.hexdigest()
+        digests = list(self._part_digests)
+        if self._part_bytes or not digests:
+            digests.append(self._md5.digest())
+        return composite_hash(digests)
+
+    def verify(self, remote_hash, remote_bytes=None):
+        # type: (Optional[str], Optional[int]) -> str
+        return verify(self.hexdigest(), self.bytes, remote_hash, remote_bytes)
+
+
+def hash_file(path, object_hash, start=0, end=None):
+    # type: (str, ObjectHash, int, Optional[int]) -> None
+    """
+    Feed <object_hash> with the bytes of <path> from <start> to <end> (inclusive), or to the end of the file
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            block = f.read(HASH_BLOCK_SIZE if remaining is None else min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            object_hash.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+
+
+class RangeHash:
+    """
+    Feeds an ObjectHash with a file written as ranges completing out of order (a ranged download).
+    Once the ranges written so far are contiguous with the hashed position, they are read back and hashed
+    while they are still in the page cache and the rest of the file is being downloaded.
+    """
+
+    def __init__(self, path, object_hash, ranges=()):
+        # type: (str, ObjectHash, Iterable[Tuple[int, int]]) -> None
+        self.path = path
+        self.object_hash = object_hash
+        self.position = 0
+        self._pending = []  # type: List[Tuple[int, int]]
+        for start, end in ranges:
+            self.add(start, end)
+
+    def add(self, start, end):
+        # type: (int, int) -> None
+        """
+        Record that the inclusive range (<start>, <end>) of the file is written
+        """
+        heapq.heappush(self._pending, (start, end))
+        while self._pending and self._pending[0][0] <= self.position:
+            start, end = heapq.heappop(self._pending)
+            if end >= self.position:
+                hash_file(self.path, self.object_hash, self.position, end)
+                self.position = end + 1
+
+
+class HashingReader(io.FileIO):
+    """
+    File opened for reading which hashes its content as it is read, so a file is hashed while it is uploaded
+    """
+
+    def __init__(self, path, object_hash):
+        # type: (str, ObjectHash) -> None
+        super().__init__(path, 'rb')
+        self.object_hash = object_hash
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if data:
+            self.object_hash.update(data)
+        return data
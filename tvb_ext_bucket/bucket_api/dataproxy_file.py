@@ -1,11 +1,81 @@
-from typing import Dict, Any
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Tuple
 
 import requests
 from ebrains_drive.utils import on_401_raise_unauthorized
+from tvb_ext_bucket.bucket_api.link_cache import DOWNLOAD_LINK_CACHE
+from tvb_ext_bucket.bucket_api.resilience import call_with_retries, observed_call
+from tvb_ext_bucket.exceptions import DataproxyTransferError
 from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.tracing import current_span, propagated, span, traced
 
 LOGGER = get_logger(__name__)
 
+# size in bytes of the chunks read from the storage when streaming a file
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('TVB_EXT_BUCKET_DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+# files larger than this (in bytes) are downloaded as concurrent HTTP Range segments
+RANGED_DOWNLOAD_THRESHOLD = int(os.getenv('TVB_EXT_BUCKET_RANGED_DOWNLOAD_THRESHOLD', 64 * 1024 * 1024))
+# size in bytes of a segment in a ranged download
+RANGED_DOWNLOAD_SEGMENT_SIZE = int(os.getenv('TVB_EXT_BUCKET_RANGED_DOWNLOAD_SEGMENT_SIZE', 16 * 1024 * 1024))
+# number of concurrent connections used by a ranged download
+RANGED_DOWNLOAD_WORKERS = int(os.getenv('TVB_EXT_BUCKET_RANGED_DOWNLOAD_WORKERS', 4))
+# how many times a segment requests a fresh download link when the storage rejects the current one
+LINK_REFRESH_ATTEMPTS = 3
+
+
+def split_ranges(size, segment_size):
+    # type: (int, int) -> List[Tuple[int, int]]
+    """
+    Split <size> bytes in inclusive (start, end) byte ranges of at most <segment_size> bytes
+    """
+    return [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+
+class _StreamedBody:
+    """
+    Request body of known length fed from an iterator of chunks, so requests can send it with a
+    Content-Length header without reading it all in memory
+    """
+
+    def __init__(self, chunks, length):
+        # type: (Iterator[bytes], int) -> None
+        self._chunks = chunks
+        self._length = length
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def __len__(self):
+        return self._length
+
+
+class _DownloadLink:
+    """
+    Download link shared by the segments of a ranged download. The link is requested again
+    once, by the first segment that finds it expired.
+    """
+
+    def __init__(self, dataproxy_file):
+        self._dataproxy_file = dataproxy_file
+        self._url = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        # type: () -> str
+        with self._lock:
+            if self._url is None:
+                self._url = self._dataproxy_file.get_download_link()
+            return self._url
+
+    def expire(self, url):
+        # type: (str) -> None
+        with self._lock:
+            if self._url == url:
+                self._url = None
+                DOWNLOAD_LINK_CACHE.expire(self._dataproxy_file, url)
+
 
 class DataproxyFile:
     """
@@ -37,25 +107,151 @@ class DataproxyFile:
     __repr__ = __str__
 
     def get_download_link(self):
-        """n.b. this download link expires in the order of seconds if bucket is private
+        """n.b. this download link expires in the order of seconds if bucket is private,
+        links are cached until shortly before they expire
+        """
+        return DOWNLOAD_LINK_CACHE.get(self, self.request_download_link)
+
+    @traced('download_link')
+    def request_download_link(self):
+        # type: () -> str
+        """
+        request a new download link from the api, bypassing the link cache
         """
         resp = self.client.get(f"/v1/{self.bucket.target}/{self.bucket.dataproxy_entity_name}/{self.name}", params={
             "redirect": False
         })
         return resp.json().get("url")
 
+    def _get_from_storage(self, **kwargs):
+        # type: (...) -> requests.Response
+        """
+        GET the content of this file from its download link, with the requests.get <kwargs>. A cached link
+        rejected by the storage (401/403) is dropped from the link cache and the content requested once more
+        with a fresh link.
+        """
+        for attempt in range(2):
+            url = self.get_download_link()
+            # Auth header must **NOT** be attached to the download link obtained, or we will get 401
+            resp = call_with_retries('GET', url, lambda: requests.get(url, **kwargs))
+            if resp.status_code not in (401, 403):
+                return resp
+            DOWNLOAD_LINK_CACHE.expire(self, url)
+            if attempt == 0:
+                LOGGER.info(f'Download link of {self.name} was rejected, requesting a new one')
+                resp.close()
+        return resp
+
     def get_content(self):
         # type: () -> bytes
         """ returns the contents of a file from data storage"""
-        url = self.get_download_link()
-        # Auth header must **NOT** be attached to the download link obtained, or we will get 401
-        return requests.get(url).content
+        with span('transfer') as transfer:
+            content = self._get_from_storage().content
+            transfer.set('bytes', len(content))
+        return content
+
+    def stream(self, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        # type: (int) -> Iterator[bytes]
+        """
+        yields the contents of a file from data storage in chunks of at most <chunk_size> bytes,
+        so the whole file is never held in memory
+        """
+        with self._get_from_storage(stream=True) as resp:
+            resp.raise_for_status()
+            for chunk in resp.iter_content(chunk_size):
+                yield chunk
+
+    @traced('pipe')
+    def pipe_to(self, upload_url, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        # type: (str, int) -> None
+        """
+        uploads the contents of this file to <upload_url> with a PUT request, streaming it from data storage
+        chunk by chunk, so at most <chunk_size> bytes are held in memory
+        """
+        body = _StreamedBody(self.stream(chunk_size), self.bytes)
+        current_span().set('bytes', self.bytes)
+        resp = observed_call('PUT', upload_url, lambda: requests.request('PUT', upload_url, data=body))
+        resp.raise_for_status()
+
+    @traced('copy')
+    @on_401_raise_unauthorized("Unauthorized")
+    def copy_to(self, dst_name):
+        # type: (str) -> dict
+        """
+        server side copy of this file to <dst_name> in the same bucket
+        """
+        LOGGER.info(f'COPY: copying file {self.name} to {dst_name}')
+        resp = self.client.put(f"/v1/{self.bucket.target}/{self.bucket.dataproxy_entity_name}/{self.name}/copy",
+                               params={"name": dst_name})
+        return resp.json()
+
+    def download_ranges(self, target_file, ranges=None, workers=RANGED_DOWNLOAD_WORKERS,
+                        segment_size=RANGED_DOWNLOAD_SEGMENT_SIZE, on_range_done=None):
+        # type: (str, List[Tuple[int, int]], int, int, callable) -> None
+        """
+        downloads the file into <target_file> as concurrent HTTP Range requests. The target file is
+        preallocated to the size of the file and each range is written at its own offset.
+        ----------
+        :ranges: inclusive (start, end) byte ranges to download, by default the whole file
+        split in segments of <segment_size> bytes
+        :workers: number of ranges downloaded at the same time
+        :on_range_done: callable receiving (start, end) after each range is written
+        """
+        if ranges is None:
+            ranges = split_ranges(self.bytes, segment_size)
+        fd = os.open(target_file, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, self.bytes)
+        finally:
+            os.close(fd)
+
+        link = _DownloadLink(self)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tvb_ext_bucket_range') as pool:
+            download_range = propagated(self._download_range)
+            futures = {pool.submit(download_range, link, target_file, start, end): (start, end)
+                       for start, end in ranges}
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    if on_range_done is not None:
+                        on_range_done(*futures[future])
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    @traced('range')
+    def _download_range(self, link, target_file, start, end):
+        # type: (_DownloadLink, str, int, int) -> None
+        for _ in range(LINK_REFRESH_ATTEMPTS):
+            url = link.get()
+            with call_with_retries('GET', url, lambda: requests.get(url, headers={'Range': f'bytes={start}-{end}'},
+                                                                    stream=True)) as resp:
+                if resp.status_code in (401, 403):
+                    LOGGER.info(f'Download link of {self.name} was rejected, requesting a new one')
+                    link.expire(url)
+                    continue
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    raise DataproxyTransferError(f'Storage ignored the range request for {self.name}!')
+                with open(target_file, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                    written = f.tell() - start
+            current_span().set('bytes', written)
+            if written != end - start + 1:
+                raise DataproxyTransferError(f'Incomplete range {start}-{end} for {self.name}: '
+                                             f'got {written} bytes!')
+            return
+        raise DataproxyTransferError(f'Could not get a valid download link for {self.name}!')
 
     @classmethod
     def from_json(cls, client, bucket, file_json: Dict[str, Any]):
         parsed_args = cls._parse_json_to_params(file_json)
         return cls(client, bucket, **parsed_args)
 
+    @traced('delete')
     @on_401_raise_unauthorized("Unauthorized")
     def delete(self):
         # type: () -> dict
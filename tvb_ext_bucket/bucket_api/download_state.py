@@ -0,0 +1,86 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+from tvb_ext_bucket.bucket_api.dataproxy_file import split_ranges
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class DownloadState:
+    """
+    Sidecar file recording the byte ranges of a partial download which are already on disk, together with
+    the version (hash, last_modified, bytes) of the remote object they belong to.
+    """
+    SUFFIX = '.json'
+
+    def __init__(self, path, file_hash, last_modified, file_bytes, ranges=None):
+        # type: (str, str, str, int, List[Tuple[int, int]]) -> None
+        self.path = path
+        self.hash = file_hash
+        self.last_modified = last_modified
+        self.bytes = file_bytes
+        self.ranges = [tuple(r) for r in ranges] if ranges else []
+
+    @classmethod
+    def for_file(cls, path, dataproxy_file):
+        return cls(path, dataproxy_file.hash, dataproxy_file.last_modified, dataproxy_file.bytes)
+
+    @classmethod
+    def load(cls, path):
+        # type: (str) -> Optional[DownloadState]
+        """
+        Read the state stored at <path>, returns None if there is no (readable) state
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return cls(path, data['hash'], data['last_modified'], data['bytes'], data['ranges'])
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(path):
+                LOGGER.warning(f'Ignoring unreadable download state {path}: {e}')
+            return None
+
+    def matches(self, dataproxy_file):
+        # type: (...) -> bool
+        """
+        Check that the state was recorded for the current version of the remote object
+        """
+        return (self.hash, self.last_modified, self.bytes) == \
+            (dataproxy_file.hash, dataproxy_file.last_modified, dataproxy_file.bytes)
+
+    def add_range(self, start, end):
+        # type: (int, int) -> None
+        self.ranges.append((start, end))
+        self.save()
+
+    def missing_ranges(self, segment_size):
+        # type: (int) -> List[Tuple[int, int]]
+        """
+        Inclusive byte ranges, at most <segment_size> long, which are not on disk yet
+        """
+        missing = []
+        position = 0
+        for start, end in sorted(self.ranges) + [(self.bytes, self.bytes)]:
+            if start > position:
+                missing.extend((position + s, position + e) for s, e in split_ranges(start - position, segment_size))
+            position = max(position, end + 1)
+        return missing
+
+    def save(self):
+        # type: () -> None
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'hash': self.hash,
+                'last_modified': self.last_modified,
+                'bytes': self.bytes,
+                'ranges': self.ranges
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        # type: () -> None
+        if os.path.exists(self.path):
+            os.remove(self.path)
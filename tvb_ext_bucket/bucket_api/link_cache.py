@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from calendar import timegm
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# seconds a download link is assumed to be valid when its expiry can't be read from the url
+DOWNLOAD_LINK_TTL = int(os.getenv('TVB_EXT_BUCKET_DOWNLOAD_LINK_TTL', 10))
+# seconds before its expiry when a cached download link is requested again
+DOWNLOAD_LINK_REFRESH_MARGIN = int(os.getenv('TVB_EXT_BUCKET_DOWNLOAD_LINK_REFRESH_MARGIN', 5))
+# max number of download links kept in cache
+DOWNLOAD_LINK_CACHE_SIZE = int(os.getenv('TVB_EXT_BUCKET_DOWNLOAD_LINK_CACHE_SIZE', 1024))
+
+
+def get_link_expiry(url, default_ttl=DOWNLOAD_LINK_TTL):
+    # type: (str, int) -> float
+    """
+    Read the expiry (epoch seconds) of a presigned url from its query: Swift temp urls (temp_url_expires),
+    S3 v4 (X-Amz-Date + X-Amz-Expires) and S3 v2 (Expires) are supported.
+    If the url carries no expiry, it is assumed to expire after <default_ttl> seconds.
+    """
+    query = {key.lower(): values[0] for key, values in parse_qs(urlparse(url).query).items()}
+    try:
+        if 'temp_url_expires' in query:
+            return float(query['temp_url_expires'])
+        if 'x-amz-date' in query and 'x-amz-expires' in query:
+            signed_at = timegm(time.strptime(query['x-amz-date'], '%Y%m%dT%H%M%SZ'))
+            return signed_at + float(query['x-amz-expires'])
+        if 'expires' in query:
+            return float(query['expires'])
+    except ValueError:
+        LOGGER.warning(f'Could not read the expiry of a download link, assuming {default_ttl}s')
+    return time.time() + default_ttl
+
+
+class DownloadLinkCache:
+    """
+    Process wide cache of download links, keyed by bucket, path and hash of the file, so a new version of
+    the file never gets the link of an older one. A link is served until shortly before it expires; the
+    next request after that asks the api for a new one (lazy refresh). Least recently used links are
+    evicted when the cache grows past its max size.
+    """
+
+    def __init__(self, refresh_margin=DOWNLOAD_LINK_REFRESH_MARGIN, max_size=DOWNLOAD_LINK_CACHE_SIZE):
+        self.refresh_margin = refresh_margin
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._links = OrderedDict()  # type: OrderedDict[Tuple[str, str, str], Tuple[str, float]]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(dataproxy_file):
+        # type: (...) -> Tuple[str, str, str]
+        return dataproxy_file.bucket.dataproxy_entity_name, dataproxy_file.name, dataproxy_file.hash
+
+    def _cached(self, key):
+        # type: (Tuple[str, str, str]) -> Optional[str]
+        entry = self._links.get(key)
+        if entry is None:
+            return None
+        url, refresh_at = entry
+        if time.time() >= refresh_at:
+            del self._links[key]
+            return None
+        self._links.move_to_end(key)
+        return url
+
+    def get(self, dataproxy_file, request_link):
+        # type: (..., Callable[[], str]) -> str
+        """
+        Get the cached download link of <dataproxy_file>, calling <request_link> for a new one
+        if there is none or it is about to expire
+        """
+        key = self._key(dataproxy_file)
+        with self._lock:
+            url = self._cached(key)
+            if url is not None:
+                self.hits += 1
+                return url
+            self.misses += 1
+
+        url = request_link()
+        if url:
+            now = time.time()
+            lifetime = get_link_expiry(url) - now
+            # links living less than twice the margin are refreshed half way through their lifetime instead
+            refresh_at = now + lifetime - min(self.refresh_margin, lifetime / 2)
+            with self._lock:
+                self._links[key] = (url, refresh_at)
+                while len(self._links) > self.max_size:
+                    self._links.popitem(last=False)
+        return url
+
+    def expire(self, dataproxy_file, url=None):
+        # type: (..., str) -> None
+        """
+        Drop the cached link of <dataproxy_file> (e.g. after the storage rejected it).
+        If <url> is provided, the link is dropped only if it is still the cached one.
+        """
+        key = self._key(dataproxy_file)
+        with self._lock:
+            entry = self._links.get(key)
+            if entry is not None and (url is None or entry[0] == url):
+                del self._links[key]
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._links.clear()
+
+    def __len__(self):
+        return len(self._links)
+
+
+DOWNLOAD_LINK_CACHE = DownloadLinkCache()
@@ -0,0 +1,109 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from ebrains_drive.utils import on_401_raise_unauthorized
+
+from tvb_ext_bucket.bucket_api.dataproxy_file import DataproxyFile
+from tvb_ext_bucket.bucket_api.object_index import OBJECT_INDEX
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+DELIMITER = '/'
+# number of entries (files and directories) returned in a page of a directory listing by default
+LISTING_PAGE_SIZE = int(os.getenv('TVB_EXT_BUCKET_LISTING_PAGE_SIZE', 500))
+# max number of entries a client can ask for in a page of a directory listing
+MAX_LISTING_PAGE_SIZE = 1000
+
+
+@on_401_raise_unauthorized("Unauthorized")
+def list_directory(bucket, prefix='', cursor=None, page_size=LISTING_PAGE_SIZE):
+    # type: (Any, str, Optional[str], int) -> Dict[str, Any]
+    """
+    List one level of the directory <prefix> of <bucket>: its files and its direct subdirectories, in pages
+    of at most <page_size> entries. The storage groups the objects of the subdirectories by the delimiter,
+    so a page costs the same regardless of how many objects are nested below it.
+    ----------
+    :cursor: opaque position where the page starts, as returned with the previous page
+    -------
+    :return: {'prefix', 'directories': [names], 'files': [metadata of the files, with names relative
+    to the directory], 'cursor': position of the next page or None if this is the last page}
+    """
+    prefix = prefix.strip(DELIMITER)
+    if prefix:
+        prefix += DELIMITER
+    page_size = max(1, min(page_size, MAX_LISTING_PAGE_SIZE))
+    LOGGER.info(f'Listing directory {prefix or DELIMITER} of bucket {bucket.name}, {page_size} entries from {cursor}')
+    resp = bucket.client.get(f"/v1/{bucket.target}/{bucket.dataproxy_entity_name}", params={
+        "prefix": prefix or None,
+        "delimiter": DELIMITER,
+        "limit": page_size,
+        "marker": cursor
+    })
+    objects = resp.json().get("objects", [])
+
+    directories = dict()
+    files = []
+    for obj in objects:
+        # grouped subdirectories come as {"subdir": "<prefix><name>/"}
+        name = obj.get('subdir') or obj['name']
+        relative_name = name[len(prefix):]
+        if not relative_name:
+            continue
+        if DELIMITER in relative_name:
+            # objects nested deeper are folded in their top directory, in case the delimiter is not honoured
+            directories[relative_name.split(DELIMITER)[0]] = None
+            continue
+        metadata = {json_key: obj.get(json_key) for json_key in DataproxyFile.DP_FILE_PARAMS_MAP}
+        OBJECT_INDEX.put(bucket, metadata)
+        files.append(dict(metadata, name=relative_name))
+
+    last = objects[-1] if objects else None
+    return {
+        'prefix': prefix,
+        'directories': list(directories),
+        'files': files,
+        'cursor': (last.get('subdir') or last['name']) if len(objects) == page_size else None
+    }
+
+
+def to_columnar(files):
+    # type: (List[Dict[str, Any]]) -> Dict[str, Any]
+    """
+    Pack the metadata of <files> as parallel arrays (one entry per file) instead of one dict per file.
+    The directory of each file is stored once in 'prefixes' and referenced by its index in 'prefix_ids',
+    so 'names' only hold the base names of the files.
+    -------
+    :return: {'prefixes', 'prefix_ids', 'names', 'sizes', 'hashes', 'mtimes'}
+    """
+    prefix_ids = dict()  # type: Dict[str, int]
+    listing = {'prefixes': [], 'prefix_ids': [], 'names': [], 'sizes': [], 'hashes': [], 'mtimes': []}
+    for metadata in files:
+        prefix, _, name = metadata['name'].rpartition(DELIMITER)
+        if prefix not in prefix_ids:
+            prefix_ids[prefix] = len(listing['prefixes'])
+            listing['prefixes'].append(prefix)
+        listing['prefix_ids'].append(prefix_ids[prefix])
+        listing['names'].append(name)
+        listing['sizes'].append(metadata['bytes'])
+        listing['hashes'].append(metadata['hash'])
+        listing['mtimes'].append(metadata['last_modified'])
+    return listing
+
+
+def from_columnar(listing):
+    # type: (Dict[str, Any]) -> List[Dict[str, Any]]
+    """
+    Unpack a listing packed by to_columnar to the metadata of each file
+    """
+    files = []
+    for prefix_id, name, size, file_hash, mtime in zip(listing['prefix_ids'], listing['names'], listing['sizes'],
+                                                       listing['hashes'], listing['mtimes']):
+        prefix = listing['prefixes'][prefix_id]
+        files.append({
+            'name': f'{prefix}{DELIMITER}{name}' if prefix else name,
+            'bytes': size,
+            'hash': file_hash,
+            'last_modified': mtime
+        })
+    return files
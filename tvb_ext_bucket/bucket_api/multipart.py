@@ -0,0 +1,145 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+
+import requests
+from ebrains_drive.utils import on_401_raise_unauthorized
+
+from tvb_ext_bucket.bucket_api.dataproxy_file import split_ranges
+from tvb_ext_bucket.bucket_api.resilience import backoff_delay, observed_call, parse_retry_after
+from tvb_ext_bucket.exceptions import DataproxyTransferError
+from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.tracing import propagated, span
+
+LOGGER = get_logger(__name__)
+
+# files larger than this (in bytes) are uploaded as multipart uploads
+MULTIPART_THRESHOLD = int(os.getenv('TVB_EXT_BUCKET_MULTIPART_THRESHOLD', 64 * 1024 * 1024))
+# size in bytes of a part, the storage requires at least 5MB for all the parts except the last one
+MULTIPART_PART_SIZE = int(os.getenv('TVB_EXT_BUCKET_MULTIPART_PART_SIZE', 16 * 1024 * 1024))
+# number of parts uploaded at the same time
+MULTIPART_WORKERS = int(os.getenv('TVB_EXT_BUCKET_MULTIPART_WORKERS', 4))
+# how many times the upload of a part is attempted before the whole upload fails
+MULTIPART_PART_ATTEMPTS = 3
+# max number of part urls handed out in one request
+MAX_PART_URLS_BATCH = 100
+
+
+class MultipartUpload:
+    """
+    Multipart upload of an object in a bucket: parts are uploaded independently to presigned urls
+    and the object is created when the upload is completed with the ETags of all its parts.
+    """
+
+    def __init__(self, bucket, name, upload_id=None):
+        self.bucket = bucket
+        self.name = name.lstrip('/')
+        self.upload_id = upload_id
+
+    @property
+    def _endpoint(self):
+        return f"/v1/{self.bucket.target}/{self.bucket.dataproxy_entity_name}/{self.name}/multipart"
+
+    @on_401_raise_unauthorized("Unauthorized")
+    def start(self):
+        # type: () -> str
+        resp = self.bucket.client.put(self._endpoint)
+        self.upload_id = resp.json().get("uploadId")
+        if not self.upload_id:
+            raise DataproxyTransferError(f'Could not start a multipart upload for {self.name}!')
+        LOGGER.info(f'Started multipart upload {self.upload_id} for {self.name}')
+        return self.upload_id
+
+    @on_401_raise_unauthorized("Unauthorized")
+    def get_part_url(self, part_number):
+        # type: (int) -> str
+        resp = self.bucket.client.put(f"{self._endpoint}/{self.upload_id}/{part_number}",
+                                      params={"redirect": "false"})
+        url = resp.json().get("url")
+        if not url:
+            raise DataproxyTransferError(f'No upload url for part {part_number} of {self.name}!')
+        return url
+
+    def get_part_urls(self, part_numbers, workers=MULTIPART_WORKERS):
+        # type: (Iterable[int], int) -> Dict[int, str]
+        """
+        Get the upload urls of several parts, requested concurrently
+        """
+        part_numbers = list(part_numbers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tvb_ext_bucket_multipart') as pool:
+            return dict(zip(part_numbers, pool.map(propagated(self.get_part_url), part_numbers)))
+
+    @on_401_raise_unauthorized("Unauthorized")
+    def complete(self, etags):
+        # type: (Dict[int, str]) -> None
+        """
+        Create the object from the uploaded parts, <etags> maps part numbers to the ETags of the parts
+        """
+        self.bucket.client.put(f"{self._endpoint}/{self.upload_id}", params={"redirect": "false"},
+                               json={str(part_number): etag.strip('"') for part_number, etag in etags.items()})
+        LOGGER.info(f'Completed multipart upload {self.upload_id} for {self.name} with {len(etags)} parts')
+
+    @on_401_raise_unauthorized("Unauthorized")
+    def abort(self):
+        # type: () -> None
+        """
+        Abort the upload, so the storage drops the parts uploaded so far
+        """
+        self.bucket.client.delete(f"{self._endpoint}/{self.upload_id}")
+        LOGGER.info(f'Aborted multipart upload {self.upload_id} for {self.name}')
+
+    def abort_quietly(self):
+        # type: () -> None
+        """
+        Abort the upload after a failure, logging (instead of raising) the errors of the abort itself
+        """
+        try:
+            self.abort()
+        except Exception as e:
+            LOGGER.error(f'Could not abort multipart upload {self.upload_id} for {self.name}: {e}')
+
+    def upload_file(self, source_file, part_size=MULTIPART_PART_SIZE, workers=MULTIPART_WORKERS):
+        # type: (str, int, int) -> str
+        """
+        Upload <source_file> in parts of <part_size> bytes, <workers> parts at a time, then complete the upload.
+        At most <workers> parts are held in memory. The upload is aborted if a part or the completion fails.
+        -------
+        :return: multipart hash of the uploaded content, computed from the parts as they are sent
+        """
+        if self.upload_id is None:
+            self.start()
+        ranges = split_ranges(os.path.getsize(source_file), part_size)
+
+        def upload_part(part):
+            part_number, (start, end) = part
+            with open(source_file, 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+            return part_number, self._put_part(part_number, data), hashlib.md5(data).digest()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tvb_ext_bucket_multipart') as pool:
+                parts = list(pool.map(propagated(upload_part), enumerate(ranges, start=1)))
+            self.complete({part_number: etag for part_number, etag, _ in parts})
+        except BaseException:
+            self.abort_quietly()
+            raise
+        return f'{hashlib.md5(b"".join(digest for _, _, digest in parts)).hexdigest()}-{len(parts)}'
+
+    def _put_part(self, part_number, data):
+        # type: (int, bytes) -> str
+        for attempt in range(1, MULTIPART_PART_ATTEMPTS + 1):
+            try:
+                url = self.get_part_url(part_number)
+                with span('put_part', part=part_number, bytes=len(data)):
+                    resp = observed_call('PUT', url, lambda: requests.put(url, data=data))
+                resp.raise_for_status()
+                return resp.headers.get('etag', '')
+            except requests.RequestException as e:
+                if attempt == MULTIPART_PART_ATTEMPTS:
+                    raise DataproxyTransferError(f'Could not upload part {part_number} of {self.name}: {e}')
+                LOGGER.warning(f'Upload of part {part_number} of {self.name} failed ({e}), retrying')
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                time.sleep(backoff_delay(attempt, parse_retry_after(retry_after)))
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from tvb_ext_bucket.bucket_api.dataproxy_file import DataproxyFile
+from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.tracing import traced
+
+LOGGER = get_logger(__name__)
+
+# seconds after which the metadata of a file, indexed from a listing, is considered stale
+OBJECT_INDEX_TTL = int(os.getenv('TVB_EXT_BUCKET_OBJECT_INDEX_TTL', 60))
+# max number of files, of all the buckets, whose metadata is kept in the index
+OBJECT_INDEX_SIZE = int(os.getenv('TVB_EXT_BUCKET_OBJECT_INDEX_SIZE', 100000))
+
+
+def file_metadata(dataproxy_file):
+    # type: (Any) -> Dict[str, Any]
+    """
+    Extract the listing metadata (same keys as the json returned by the api) of a file object
+    """
+    return {json_key: getattr(dataproxy_file, json_key, None) for json_key in DataproxyFile.DP_FILE_PARAMS_MAP}
+
+
+class ObjectIndex:
+    """
+    Index of (bucket, path) -> file metadata, filled by the listings of the buckets: the full listing, and the
+    pages of the directories browsed by the user. Fresh metadata answers lookups without listing the bucket.
+    While the path is missing from the index or its metadata is stale, lookups fall back to a prefix filtered
+    listing of the bucket. Stale entries are dropped when they are looked up or reach the least recently used
+    end of the index, and least recently used entries are evicted when the index grows past its max size.
+    """
+
+    def __init__(self, ttl=OBJECT_INDEX_TTL, max_size=OBJECT_INDEX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # (bucket, path) -> (metadata, time it was listed)
+        self._objects = OrderedDict()  # type: OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(bucket):
+        return bucket.dataproxy_entity_name
+
+    @traced('ls')
+    def refresh(self, bucket):
+        # type: (Any) -> Dict[str, Dict[str, Any]]
+        """
+        List the whole bucket and rebuild its index
+        """
+        objects = {f.name: file_metadata(f) for f in bucket.ls()}
+        listed_at = time.time()
+        with self._lock:
+            self._drop_bucket(self._key(bucket))
+            for metadata in objects.values():
+                self._put(self._key(bucket), metadata, listed_at)
+            self._evict(listed_at)
+        return objects
+
+    def lookup(self, bucket, path):
+        # type: (Any, str) -> Optional[Dict[str, Any]]
+        """
+        Get the metadata of the file at <path> in <bucket> or None if there is no such file
+        """
+        key = self._key(bucket), path
+        with self._lock:
+            entry = self._objects.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                self._objects.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._objects[key]
+            self.misses += 1
+        LOGGER.info(f'Index miss for {path} in bucket {bucket.name}, listing by prefix')
+        return self.stat(bucket, path)
+
+    @traced('ls')
+    def stat(self, bucket, path):
+        # type: (Any, str) -> Optional[Dict[str, Any]]
+        """
+        Get the current metadata of the file at <path> from a prefix filtered listing of <bucket>,
+        and update the index with it
+        """
+        dataproxy_file = next((f for f in bucket.ls(prefix=path) if f.name == path), None)
+        if dataproxy_file is None:
+            self.remove(bucket, path)
+            return None
+        metadata = file_metadata(dataproxy_file)
+        self.put(bucket, metadata)
+        return metadata
+
+    @traced('ls')
+    def list_prefix(self, bucket, prefix):
+        # type: (Any, str) -> List[Dict[str, Any]]
+        """
+        List the files of <bucket> under <prefix> and update the index with their metadata
+        """
+        files = [file_metadata(f) for f in bucket.ls(prefix=prefix)]
+        for metadata in files:
+            self.put(bucket, metadata)
+        return files
+
+    def put(self, bucket, metadata):
+        # type: (Any, Dict[str, Any]) -> None
+        """
+        Add or replace the metadata of a file, as just listed, in the index of <bucket>
+        """
+        listed_at = time.time()
+        with self._lock:
+            self._put(self._key(bucket), metadata, listed_at)
+            self._evict(listed_at)
+
+    def _put(self, bucket_key, metadata, listed_at):
+        # type: (str, Dict[str, Any], float) -> None
+        """
+        Add the metadata listed at <listed_at> as the most recently used entry. Must be called with the lock held
+        """
+        key = bucket_key, metadata['name']
+        self._objects[key] = (metadata, listed_at)
+        self._objects.move_to_end(key)
+
+    def _evict(self, now):
+        # type: (float) -> None
+        """
+        Drop the stale entries at the least recently used end of the index, then the least recently used
+        entries past the max size. Must be called with the lock held
+        """
+        while self._objects:
+            key, (_, listed_at) = next(iter(self._objects.items()))
+            if now - listed_at <= self.ttl and len(self._objects) <= self.max_size:
+                break
+            del self._objects[key]
+
+    def _drop_bucket(self, bucket_key):
+        # type: (str) -> None
+        """
+        Drop the entries of a bucket. Must be called with the lock held
+        """
+        for key in [key for key in self._objects if key[0] == bucket_key]:
+            del self._objects[key]
+
+    def remove(self, bucket, path):
+        # type: (Any, str) -> None
+        with self._lock:
+            self._objects.pop((self._key(bucket), path), None)
+
+    def invalidate(self, bucket=None):
+        # type: (Any) -> None
+        """
+        Drop the index of <bucket>, or of all the buckets if no bucket is provided
+        """
+        with self._lock:
+            if bucket is None:
+                self._objects.clear()
+            else:
+                self._drop_bucket(self._key(bucket))
+
+
+OBJECT_INDEX = ObjectIndex()
@@ -0,0 +1,245 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from tvb_ext_bucket.exceptions import DataproxyUnavailable
+from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.metrics import UPSTREAM_CALLS, UPSTREAM_LATENCY
+from tvb_ext_bucket.tracing import span
+
+LOGGER = get_logger(__name__)
+
+# how many times a call failing with a transient error is attempted
+RETRY_ATTEMPTS = int(os.getenv('TVB_EXT_BUCKET_RETRY_ATTEMPTS', 3))
+# seconds of the first backoff, doubled for each new attempt
+RETRY_BACKOFF = float(os.getenv('TVB_EXT_BUCKET_RETRY_BACKOFF', 0.5))
+# max seconds waited between two attempts, also caps the waits asked by Retry-After
+RETRY_BACKOFF_MAX = float(os.getenv('TVB_EXT_BUCKET_RETRY_BACKOFF_MAX', 30))
+# consecutive transient failures of an endpoint after which its calls fail fast
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('TVB_EXT_BUCKET_CIRCUIT_FAILURE_THRESHOLD', 5))
+# seconds an endpoint fails fast before a trial call is let through
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('TVB_EXT_BUCKET_CIRCUIT_RESET_TIMEOUT', 30))
+
+# responses telling that the server is overloaded or temporarily failing
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# responses telling that the request was not processed, so even non idempotent requests can be sent again
+NOT_PROCESSED_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+
+def endpoint_of(method, url):
+    # type: (str, str) -> str
+    """
+    Name the endpoint called by <method> <url>, with the bucket and object names replaced by placeholders,
+    e.g. 'GET /v1/buckets/{bucket}/{object}'. Presigned urls of the storage are named by their host.
+    """
+    parsed = urlparse(url)
+    parts = parsed.path.strip('/').split('/')
+    if 'v1' not in parts:
+        return f'{method.upper()} {parsed.netloc}'
+    parts = parts[parts.index('v1'):]
+    name = '/' + '/'.join(parts[:2])
+    if len(parts) > 2:
+        name += '/{bucket}'
+    if len(parts) > 3:
+        name += '/{object}'
+        if 'multipart' in parts[4:]:
+            name += '/multipart'
+        elif parts[-1] == 'copy':
+            name += '/copy'
+    return f'{method.upper()} {name}'
+
+
+def parse_retry_after(value):
+    # type: (Optional[str]) -> Optional[float]
+    """
+    Seconds to wait as asked by a Retry-After header, given as seconds or as an http date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    # type: (int, Optional[float]) -> float
+    """
+    Seconds to wait after the failed <attempt> (starting at 1): what the server asked for with Retry-After,
+    otherwise an exponential backoff with full jitter, so clients failing together do not retry together
+    """
+    if retry_after is not None:
+        return min(retry_after, RETRY_BACKOFF_MAX)
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Fails the calls to an endpoint fast after <failure_threshold> consecutive transient failures, instead
+    of letting every caller wait for timeouts and retries. After <reset_timeout> seconds a single trial
+    call is let through: the circuit closes again if it succeeds and stays open otherwise. A trial call
+    whose outcome is never recorded does not hold the circuit half open: another one is let through
+    <reset_timeout> seconds after it started.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, endpoint, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        # type: () -> None
+        """
+        Raise DataproxyUnavailable if the endpoint must not be called now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.time()
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining <= 0:
+                LOGGER.info(f'Letting a trial call through to {self.endpoint}')
+                self.state = self.HALF_OPEN
+                # the trial call started now, the next one is let through if it is not over in time
+                self.opened_at = now
+                return
+        raise DataproxyUnavailable(f'The data proxy is unavailable ({self.endpoint} keeps failing), '
+                                   f'try again in {max(remaining, 1):.0f}s!')
+
+    def record_success(self):
+        # type: () -> None
+        with self._lock:
+            if self.state != self.CLOSED:
+                LOGGER.info(f'Endpoint {self.endpoint} recovered')
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        # type: () -> None
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    LOGGER.warning(f'Endpoint {self.endpoint} failed {self.failures} times, failing fast '
+                                   f'for {self.reset_timeout}s')
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+
+class CircuitBreakers:
+    """
+    Process wide circuit breakers, one per endpoint
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = dict()  # type: Dict[str, CircuitBreaker]
+        self._lock = threading.Lock()
+
+    def get(self, endpoint):
+        # type: (str) -> CircuitBreaker
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def states(self):
+        # type: () -> Dict[str, str]
+        with self._lock:
+            return {endpoint: breaker.state for endpoint, breaker in self._breakers.items()}
+
+    def reset(self):
+        # type: () -> None
+        with self._lock:
+            self._breakers.clear()
+
+
+CIRCUIT_BREAKERS = CircuitBreakers()
+
+
+def observed_call(method, url, call):
+    # type: (str, str, Callable[[], requests.Response]) -> requests.Response
+    """
+    Send a request with <call>, counting it and the time until its response in the upstream metrics of its endpoint,
+    and timing it as a span of the current trace
+    """
+    endpoint = endpoint_of(method, url)
+    with span('http', endpoint=endpoint) as http_span:
+        started = time.perf_counter()
+        try:
+            resp = call()
+        except requests.RequestException as e:
+            UPSTREAM_CALLS.inc(endpoint, type(e).__name__)
+            raise
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, endpoint)
+        UPSTREAM_CALLS.inc(endpoint, str(resp.status_code))
+        http_span.set('status', resp.status_code)
+    return resp
+
+
+def call_with_retries(method, url, call, attempts=RETRY_ATTEMPTS):
+    # type: (str, str, Callable[[], requests.Response], int) -> requests.Response
+    """
+    Send a request with <call>, sending it again after a backoff when it fails with a connection error or
+    one of RETRY_STATUSES, up to <attempts> times. Requests with a non idempotent <method> are only sent
+    again when the server did not process them. The circuit breaker of the endpoint is consulted before each
+    attempt and fed with its outcome, and every attempt is counted in the upstream metrics of the endpoint.
+    -------
+    :return: the last response, which can still have one of RETRY_STATUSES once the attempts are exhausted
+    """
+    endpoint = endpoint_of(method, url)
+    breaker = CIRCUIT_BREAKERS.get(endpoint)
+    retry_statuses = RETRY_STATUSES if method.upper() in IDEMPOTENT_METHODS else NOT_PROCESSED_STATUSES
+    for attempt in range(1, attempts + 1):
+        try:
+            breaker.before_call()
+        except DataproxyUnavailable:
+            UPSTREAM_CALLS.inc(endpoint, 'circuit_open')
+            raise
+        try:
+            resp = observed_call(method, url, call)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            breaker.record_failure()
+            if attempt == attempts or method.upper() not in IDEMPOTENT_METHODS:
+                raise
+            delay = backoff_delay(attempt)
+            LOGGER.warning(f'{endpoint} failed ({e}), attempt {attempt} of {attempts}, retrying in {delay:.1f}s')
+        except Exception:
+            # not worth a retry (e.g. too many redirects) and not a sign the endpoint is down, but a failed
+            # trial call must be recorded, otherwise it would leave the circuit half open
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                breaker.record_failure()
+            raise
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return resp
+            breaker.record_failure()
+            if attempt == attempts or resp.status_code not in retry_statuses:
+                return resp
+            delay = backoff_delay(attempt, parse_retry_after(resp.headers.get('Retry-After')))
+            resp.close()
+            LOGGER.warning(f'{endpoint} answered {resp.status_code}, attempt {attempt} of {attempts}, '
+                           f'retrying in {delay:.1f}s')
+        time.sleep(delay)
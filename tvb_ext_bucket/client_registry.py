@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from tvb_ext_bucket.bucket_api.bucket_api import ExtendedBucketApiClient
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# seconds a client is kept before being rebuilt, regardless of usage
+CLIENT_TTL = int(os.getenv('TVB_EXT_BUCKET_CLIENT_TTL', 15 * 60))
+# max number of clients (distinct user/token pairs) kept alive at the same time
+CLIENT_MAX_SIZE = int(os.getenv('TVB_EXT_BUCKET_CLIENT_MAX_SIZE', 8))
+
+
+def get_token_claims(token):
+    # type: (str) -> Dict[str, Any]
+    """
+    Decode the payload of a JWT token without validating its signature.
+    Returns an empty dict if the token is not a JWT.
+    """
+    try:
+        _header, payload, _signature = token.split('.')
+        return json.loads(base64.urlsafe_b64decode(payload + '==').decode('utf-8'))
+    except (ValueError, AttributeError):
+        return dict()
+
+
+def get_token_user(token):
+    # type: (str) -> str
+    """
+    Name of the user a token was issued to, empty if the token is not a JWT
+    """
+    claims = get_token_claims(token)
+    return claims.get('preferred_username') or claims.get('sub') or ''
+
+
+def get_user_key(token):
+    # type: (str) -> str
+    """
+    Key of the per user caches for the owner of <token>: the user name, or a digest of the token itself when it
+    names no user, so users are never mixed up and the token is never stored or logged in clear
+    """
+    return get_token_user(token) or 'token-' + hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+
+
+class ClientRegistry:
+    """
+    Process wide registry of authenticated api clients, keyed by user and token.
+    Reusing a client keeps its HTTP session (and the pooled connections) warm between requests.
+    Entries are evicted when they get older than the ttl, when their token expires or, in LRU order,
+    when the registry grows past its max size.
+    """
+
+    def __init__(self, ttl=CLIENT_TTL, max_size=CLIENT_MAX_SIZE, client_factory=ExtendedBucketApiClient):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._client_factory = client_factory
+        self._clients = OrderedDict()  # type: OrderedDict[Tuple[str, str], Tuple[Any, float, float]]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        # type: (str) -> Tuple[str, str]
+        return get_token_user(token), token
+
+    def _is_stale(self, created_at, expires_at):
+        # type: (float, float) -> bool
+        now = time.time()
+        return now - created_at > self.ttl or (expires_at is not None and now >= expires_at)
+
+    def get_client(self, token):
+        # type: (str) -> ExtendedBucketApiClient
+        """
+        Get the cached client for the provided token, building a new one if needed
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                client, created_at, expires_at = entry
+                if not self._is_stale(created_at, expires_at):
+                    self._clients.move_to_end(key)
+                    return client
+                LOGGER.info(f'Api client for user {key[0]} is stale, building a new one')
+                del self._clients[key]
+
+            client = self._client_factory(token=token)
+            self._clients[key] = (client, time.time(), get_token_claims(token).get('exp'))
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+            return client
+
+    def update_token(self, old_token, new_token):
+        # type: (str, str) -> None
+        """
+        Move the clients authenticated with <old_token> to the refreshed <new_token> of the same user,
+        so transfers holding one of these clients keep working past the expiry of the old token
+        """
+        with self._lock:
+            for key, (client, created_at, _) in list(self._clients.items()):
+                if key[1] != old_token or key[0] != self._key(new_token)[0]:
+                    continue
+                client._token = new_token
+                del self._clients[key]
+                self._clients[self._key(new_token)] = (client, created_at, get_token_claims(new_token).get('exp'))
+
+    def invalidate(self, client):
+        # type: (Any) -> None
+        """
+        Drop the provided client from registry (e.g. after TokenExpired or Unauthorized)
+        """
+        with self._lock:
+            for key, (cached_client, _, _) in list(self._clients.items()):
+                if cached_client is client:
+                    LOGGER.info(f'Invalidating api client for user {key[0]}')
+                    del self._clients[key]
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+CLIENT_REGISTRY = ClientRegistry()
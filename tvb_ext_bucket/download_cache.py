@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where reflinks are not attempted
+    fcntl = None
+
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# directory holding the cached downloads
+DOWNLOAD_CACHE_DIR = os.getenv('TVB_EXT_BUCKET_DOWNLOAD_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'tvb_ext_bucket', 'downloads'))
+# max total size in bytes of the cached downloads, 0 (the default) disables the cache
+DOWNLOAD_CACHE_SIZE = int(os.getenv('TVB_EXT_BUCKET_DOWNLOAD_CACHE_SIZE', 0))
+# how content is placed in the cache and from the cache at the download target: 'auto' uses a reflink (copy on
+# write) where the file system supports it and copies otherwise (e.g. on ext4 or NFS), which writes each cached
+# download twice; 'reflink' only caches the downloads it can reflink, so caching never writes them again;
+# 'hardlink' shares the cached file itself, which is faster but lets in place edits of the downloaded file
+# alter the cache; 'copy' always copies
+DOWNLOAD_CACHE_LINK = os.getenv('TVB_EXT_BUCKET_DOWNLOAD_CACHE_LINK', 'auto')
+
+# ioctl request cloning a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def _reflink(source, target):
+    # type: (str, str) -> None
+    if fcntl is None:
+        raise OSError('Reflinks are not supported on this platform')
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+
+
+class DownloadCache:
+    """
+    Content addressed cache of downloaded files, keyed by bucket and hash of the object, so a file is
+    downloaded from the storage once and served from disk afterwards, whatever its name or location.
+    Least recently used entries are evicted when the cache grows past its max size.
+    """
+
+    def __init__(self, directory=DOWNLOAD_CACHE_DIR, max_size=DOWNLOAD_CACHE_SIZE, link=DOWNLOAD_CACHE_LINK):
+        self.directory = directory
+        self.max_size = max_size
+        self.link = link
+        self._entries = None  # type: Optional[OrderedDict[str, int]]
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        # type: () -> bool
+        return self.max_size > 0
+
+    @staticmethod
+    def _key(bucket_name, file_hash):
+        # type: (str, str) -> str
+        return hashlib.sha256(f'{bucket_name}/{file_hash}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        # type: (str) -> str
+        return os.path.join(self.directory, key)
+
+    def _load_entries(self):
+        # type: () -> OrderedDict
+        """
+        Index the entries on disk, least recently used first. Must be called with the lock held
+        """
+        if self._entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+            self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def _place(self, source, target, copy=True):
+        # type: (str, str, bool) -> None
+        """
+        Place the content of <source> at <target> as configured by the link mode, copying it (if <copy>)
+        when it can't be linked
+        """
+        if os.path.exists(target):
+            os.remove(target)
+        if self.link == 'hardlink':
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        if self.link != 'copy':
+            try:
+                _reflink(source, target)
+                return
+            except OSError:
+                if not copy:
+                    raise
+        shutil.copyfile(source, target)
+
+    def fetch(self, bucket_name, file_hash, file_bytes, target_file):
+        # type: (str, str, int, str) -> bool
+        """
+        Place the cached content of the object with <file_hash> in bucket <bucket_name> at <target_file>.
+        Returns False (a miss) if the object is not cached.
+        """
+        if not self.enabled or not file_hash:
+            return False
+        key = self._key(bucket_name, file_hash)
+        with self._lock:
+            entries = self._load_entries()
+            size = entries.get(key)
+            if size is not None and size != file_bytes:
+                LOGGER.warning(f'Dropping cached download {key}, its size does not match the object')
+                self._remove(key)
+                size = None
+            if size is None:
+                self.misses += 1
+                return False
+            entries.move_to_end(key)
+        try:
+            self._place(self._path(key), target_file)
+            # the modification time records the last use, so the LRU order survives restarts
+            os.utime(self._path(key))
+        except OSError as e:
+            LOGGER.warning(f'Could not serve {target_file} from the download cache: {e}')
+            with self._lock:
+                self.misses += 1
+                self._remove(key)
+            return False
+        with self._lock:
+            self.hits += 1
+            self.bytes_served += file_bytes
+        LOGGER.info(f'Served {target_file} from the download cache')
+        return True
+
+    def store(self, bucket_name, file_hash, source_file):
+        # type: (str, str, str) -> None
+        """
+        Add the downloaded <source_file> to the cache as the content of the object with <file_hash>
+        in bucket <bucket_name>, evicting the least recently used entries if needed. In the 'reflink' link
+        mode, the download is only cached when it can be reflinked, so caching does not write it again.
+        """
+        if not self.enabled or not file_hash:
+            return
+        size = os.path.getsize(source_file)
+        if size > self.max_size:
+            return
+        key = self._key(bucket_name, file_hash)
+        with self._lock:
+            if key in self._load_entries():
+                return
+        temp_path = f'{self._path(key)}.{threading.get_ident()}.tmp'
+        try:
+            self._place(source_file, temp_path, copy=self.link != 'reflink')
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            LOGGER.info(f'Not adding {source_file} to the download cache: {e}')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            entries = self._load_entries()
+            if key not in entries:
+                entries[key] = size
+                self._size += size
+            self._evict()
+
+    def _evict(self):
+        # type: () -> None
+        """
+        Remove least recently used entries until the cache fits its max size. Must be called with the lock held
+        """
+        while self._size > self.max_size and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key):
+        # type: (str) -> None
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self._size -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            for key in list(self._load_entries()):
+                self._remove(key)
+
+    def stats(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            if self.enabled:
+                self._load_entries()
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0,
+                'bytes_served': self.bytes_served,
+                'evictions': self.evictions,
+                'entries': len(self._entries or ()),
+                'size': self._size,
+                'max_size': self.max_size
+            }
+
+
+DOWNLOAD_CACHE = DownloadCache()
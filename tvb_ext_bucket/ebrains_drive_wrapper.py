@@ -7,51 +7,47 @@
 import ebrains_drive.exceptions
 import requests
 
-from ebrains_drive.files import DataproxyFile
-from ebrains_drive.exceptions import Unauthorized
+from ebrains_drive.exceptions import Unauthorized, TokenExpired
 from ebrains_drive.bucket import Bucket
 
 from tvb_ext_bucket.logger.builder import get_logger
-from tvb_ext_bucket.exceptions import CollabTokenError, CollabAccessError, DataproxyFileNotFound
+from tvb_ext_bucket.exceptions import CollabTokenError, CollabAccessError, DataproxyFileNotFound, \
+    DataproxyTransferError, DataproxyIntegrityError
 from tvb_ext_bucket.bucket_api.bucket_api import ExtendedBucketApiClient
+from tvb_ext_bucket.bucket_api.bucket_list_cache import BUCKET_LIST_CACHE
+from tvb_ext_bucket.bucket_api.checksum import ObjectHash, RangeHash, HashingReader, hash_file, verify, VERIFIED, \
+    UNVERIFIED, MISMATCH, TRANSFER_VERIFY_ATTEMPTS
+from tvb_ext_bucket.bucket_api.dataproxy_file import DataproxyFile, RANGED_DOWNLOAD_THRESHOLD, \
+    RANGED_DOWNLOAD_WORKERS, RANGED_DOWNLOAD_SEGMENT_SIZE
+from tvb_ext_bucket.bucket_api.download_state import DownloadState
+from tvb_ext_bucket.bucket_api.link_cache import DOWNLOAD_LINK_CACHE
+from tvb_ext_bucket.bucket_api.listing import list_directory, LISTING_PAGE_SIZE
+from tvb_ext_bucket.bucket_api.multipart import MultipartUpload, MULTIPART_THRESHOLD, MULTIPART_PART_SIZE, \
+    MAX_PART_URLS_BATCH
+from tvb_ext_bucket.bucket_api.object_index import OBJECT_INDEX
+from tvb_ext_bucket.client_registry import CLIENT_REGISTRY, get_user_key
+from tvb_ext_bucket.download_cache import DOWNLOAD_CACHE
+from tvb_ext_bucket.guess_cache import BUCKET_GUESS_CACHE
+from tvb_ext_bucket.metrics import observe_transfer
+from tvb_ext_bucket.sync import list_local, parse_last_modified, plan_sync
+# get_collab_token is re-exported, it used to be defined here
+from tvb_ext_bucket.token_provider import TOKEN_PROVIDER, TOKEN_ENV_VAR, get_collab_token  # noqa: F401
+from tvb_ext_bucket.tracing import current_span, span, traced
+from tvb_ext_bucket.transfers import BULK_TRANSFER_WORKERS, run_transfers
+import mimetypes
 import os
 
 import pathlib
+import time
+from typing import Optional, Union
 
 LOGGER = get_logger(__name__)
 
-TOKEN_ENV_VAR = 'CLB_AUTH'
-
-
-def get_collab_token():
-    # type: () -> str
-    """
-    Try to get the collab authentication token of the current user
-    -----
-    :return: token
-    """
-    try:
-        from clb_nb_utils import oauth as clb_oauth
-        token = clb_oauth.get_token()
-    except (ModuleNotFoundError, ConnectionError) as e:
-        LOGGER.warning(f"Could not connect to EBRAINS to retrieve an auth token: {e}")
-        LOGGER.info(f"Will try to use the auth token defined by environment variable {TOKEN_ENV_VAR}...")
-
-        token = os.environ.get(TOKEN_ENV_VAR)
-        if token is None:
-            LOGGER.error(f"No auth token defined as environment variable {TOKEN_ENV_VAR}! Please define one!")
-            raise CollabTokenError("Cannot connect to EBRAINS HPC without an auth token! Either run this on "
-                                   f"Collab, or define the {TOKEN_ENV_VAR} environment variable!")
-
-        LOGGER.info(f"Successfully retrieved the auth token from environment variable {TOKEN_ENV_VAR}!")
-
-    return token
-
-
 class BucketWrapper:
     def __init__(self):
         self.client = self.get_client()
 
+    @traced('bucket')
     def _get_bucket(self, bucket_name):
         # type: (str) -> Bucket
         """
@@ -63,7 +59,11 @@ class BucketWrapper:
         try:
             bucket = self.client.buckets.get_bucket(bucket_name)
             LOGGER.info('Bucket retrieved successfully.')
+        except TokenExpired:
+            self.invalidate_client()
+            raise
         except Unauthorized as e:
+            self.invalidate_client()
             error_msg = f'Could not access bucket {bucket_name} due to {str(e)}. Your access might be limited!'
             LOGGER.error(error_msg)
             raise CollabAccessError(error_msg)
@@ -81,9 +81,10 @@ class BucketWrapper:
         """
         file_path = file_path.lstrip('/')
         bucket = self._get_bucket(bucket_name)
-        # find first dataproxy file corresponding to provided path
-        dataproxy_file = next((f for f in bucket.ls() if f.name == file_path), None)
-        return dataproxy_file
+        metadata = OBJECT_INDEX.lookup(bucket, file_path)
+        if metadata is None:
+            return None
+        return DataproxyFile.from_json(bucket.client, bucket, metadata)
 
     def get_files_in_bucket(self, bucket_name):
         # type: (str) -> list[str]
@@ -94,21 +95,40 @@ class BucketWrapper:
         :return:
         """
         bucket = self._get_bucket(bucket_name)
-        # remove the prefix from the list of files
-        files_list = [f.name for f in bucket.ls()]
+        # a full listing is needed anyway, use it to rebuild the object index of the bucket
+        files_list = list(OBJECT_INDEX.refresh(bucket))
         return files_list
 
+    def get_files_metadata(self, bucket_name):
+        # type: (str) -> list[dict]
+        """
+        Gets the metadata (name, bytes, hash, last_modified, content_type) of all the files in a bucket space
+        """
+        bucket = self._get_bucket(bucket_name)
+        return list(OBJECT_INDEX.refresh(bucket).values())
+
+    def list_directory(self, bucket_name, prefix='', cursor=None, page_size=LISTING_PAGE_SIZE):
+        # type: (str, str, str, int) -> dict
+        """
+        Gets a page of the files and subdirectories directly under the directory <prefix> of bucket <bucket_name>,
+        without listing the rest of the bucket. Pass the returned cursor to get the next page.
+        """
+        bucket = self._get_bucket(bucket_name)
+        return list_directory(bucket, prefix, cursor, page_size)
+
     @staticmethod
     def get_client():
         # type: () -> ExtendedBucketApiClient
         """
-        Get an instance of the BucketApiClient
+        Get an instance of the BucketApiClient. Clients are cached per user and token, so consecutive
+        calls reuse the same authenticated client and its pooled HTTP connections.
         Returns
         -------
 
         """
         try:
-            token = get_collab_token()
+            with span('token'):
+                token = TOKEN_PROVIDER.get_token()
         except Exception as e:
             LOGGER.warning(f"Could not connect to EBRAINS to retrieve an auth token: {e}")
             LOGGER.info(f'"Will try to use the auth token defined by environment variable {TOKEN_ENV_VAR}...')
@@ -118,13 +138,33 @@ class BucketWrapper:
             raise CollabTokenError(f"Cannot connect to EBRAINS HPC without an auth token! Either run this on "
                                    f"Collab, or define the {TOKEN_ENV_VAR} environment variable!")
         LOGGER.info('Token retrieved successfully!')
-        return ExtendedBucketApiClient(token=token)
+        return CLIENT_REGISTRY.get_client(token)
+
+    @property
+    def user_key(self):
+        # type: () -> str
+        """
+        Key of the EBRAINS user the client acts for, the one the per user caches and limits are keyed by
+        """
+        return get_user_key(self.client.token)
 
-    def download_file(self, file_path, bucket_name, location):
-        # type: (str, str, str) -> bool
+    def invalidate_client(self):
+        # type: () -> None
+        """
+        Drop the current client and its token from the caches, next BucketWrapper will use a fresh one
+        """
+        CLIENT_REGISTRY.invalidate(self.client)
+        TOKEN_PROVIDER.invalidate(self.client.token)
+
+    def download_file(self, file_path, bucket_name, location, workers=RANGED_DOWNLOAD_WORKERS, skip_complete=False):
+        # type: (str, str, str, int, bool) -> Union[str, bool]
         """
         download a file with absolute path as <file_path> from bucket with name <bucket_name>
-        to location <location>
+        to location <location>. Files larger than RANGED_DOWNLOAD_THRESHOLD are downloaded over
+        <workers> concurrent connections and can be resumed if the download is interrupted.
+        With <skip_complete>, a file already downloaded (e.g. by a job interrupted by a restart) is kept.
+        -------
+        :return: result of the checksum verification ('verified' or 'unverified'), False if there is no such file
         """
         LOGGER.info(f'DOWNLOADING: attempt to download {file_path} from bucket {bucket_name} to location {location}')
         dataproxy_file = self._get_dataproxy_file(file_path, bucket_name)
@@ -132,11 +172,258 @@ class BucketWrapper:
         if dataproxy_file is None:
             return False
         file_name = file_path.split('/')[-1]
-        target_file = os.path.join(location, file_name)
-        with open(target_file, 'xb') as f:
-            content = dataproxy_file.get_content()
-            f.write(content)
-        return True
+        return self._download_dataproxy_file(dataproxy_file, os.path.join(location, file_name), workers,
+                                             skip_complete=skip_complete)
+
+    def download_prefix(self, prefix, bucket_name, location, workers=BULK_TRANSFER_WORKERS, skip_complete=False):
+        # type: (str, str, str, int, bool) -> dict
+        """
+        download all the files under the directory <prefix> of bucket <bucket_name> to location <location>,
+        keeping their directory structure. The bucket is listed once and the files are downloaded by
+        <workers> concurrent downloads, smallest files first. With <skip_complete>, the files already
+        downloaded (e.g. by a job interrupted by a restart) are kept.
+        -------
+        :return: summary of the transfer with the outcome of each file
+        """
+        prefix = prefix.strip('/')
+        LOGGER.info(f'DOWNLOADING: attempt to download {prefix}/ from bucket {bucket_name} to location {location}')
+        bucket = self._get_bucket(bucket_name)
+        files = OBJECT_INDEX.list_prefix(bucket, f'{prefix}/' if prefix else None)
+        # files are stored under the last directory of the prefix, same as downloading a directory
+        parent = '/'.join(prefix.split('/')[:-1])
+
+        def download(metadata):
+            relative_path = metadata['name'][len(parent):].lstrip('/')
+            target_file = os.path.join(location, *relative_path.split('/'))
+            os.makedirs(os.path.dirname(target_file) or '.', exist_ok=True)
+            return self._download_dataproxy_file(DataproxyFile.from_json(bucket.client, bucket, metadata),
+                                                 target_file, skip_complete=skip_complete)
+
+        files.sort(key=lambda metadata: metadata['bytes'] or 0)
+        return self._count_verified(run_transfers(download, files, workers, name_of=lambda metadata: metadata['name'],
+                                                  size_of=lambda metadata: metadata['bytes']))
+
+    @staticmethod
+    def _count_verified(summary):
+        # type: (dict) -> dict
+        """
+        Add to the summary of a transfer how many files passed the checksum verification
+        """
+        summary['verified'] = sum(outcome.get('result') == VERIFIED for outcome in summary['files'])
+        return summary
+
+    @traced('download')
+    def _download_dataproxy_file(self, dataproxy_file, target_file, workers=1, overwrite=False, skip_complete=False):
+        # type: (DataproxyFile, str, int, bool, bool) -> str
+        """
+        Download <dataproxy_file> to <target_file>, checking the downloaded content against the hash of the object.
+        With <skip_complete>, an existing <target_file> with the content of the object is kept as is.
+        -------
+        :return: VERIFIED or UNVERIFIED if the hash of the object can't be reproduced
+        """
+        if os.path.exists(target_file) and not overwrite:
+            verification = self._check_complete(dataproxy_file, target_file) if skip_complete else MISMATCH
+            if verification != MISMATCH:
+                LOGGER.info(f'File {target_file} is already downloaded, skipping it')
+                return verification
+            raise FileExistsError(f'File {target_file} already exists!')
+        # download to a hidden partial file next to the target, so an incomplete download never shows up as the target
+        location, file_name = os.path.split(target_file)
+        partial_file = os.path.join(location, f'.{file_name}.part')
+        bucket_name = dataproxy_file.bucket.dataproxy_entity_name
+        started = time.perf_counter()
+        source = 'storage'
+        if DOWNLOAD_CACHE.fetch(bucket_name, dataproxy_file.hash, dataproxy_file.bytes, partial_file):
+            # only verified downloads are cached; a partial download of the same file is no longer needed
+            verification = VERIFIED
+            source = 'cache'
+            state = DownloadState.load(partial_file + DownloadState.SUFFIX)
+        else:
+            verification, state, dataproxy_file = self._download_verified(dataproxy_file, partial_file, workers)
+            if verification == VERIFIED:
+                DOWNLOAD_CACHE.store(bucket_name, dataproxy_file.hash, partial_file)
+        if os.path.exists(target_file) and not overwrite:
+            raise FileExistsError(f'File {target_file} already exists!')
+        os.replace(partial_file, target_file)
+        if state is not None:
+            state.remove()
+        observe_transfer('download', source, dataproxy_file.bytes or 0, time.perf_counter() - started)
+        current_span().set('bytes', dataproxy_file.bytes)
+        current_span().set('source', source)
+        return verification
+
+    @staticmethod
+    def _check_complete(dataproxy_file, target_file):
+        # type: (DataproxyFile, str) -> str
+        """
+        Compare the content of the existing <target_file> with the object of <dataproxy_file>
+        -------
+        :return: VERIFIED or UNVERIFIED if it has the content of the object, MISMATCH otherwise
+        """
+        if os.path.getsize(target_file) != dataproxy_file.bytes:
+            return MISMATCH
+        object_hash = ObjectHash.like(dataproxy_file.hash)
+        hash_file(target_file, object_hash)
+        return object_hash.verify(dataproxy_file.hash, dataproxy_file.bytes)
+
+    def _download_verified(self, dataproxy_file, partial_file, workers):
+        # type: (DataproxyFile, str, int) -> tuple
+        """
+        Download <dataproxy_file> to <partial_file>, hashing the content as it is written. The metadata of
+        <dataproxy_file> can come from a cached listing: when the download does not match its hash, the object
+        is listed again, and the download is kept if it matches the current hash (the object was overwritten
+        since it was listed). Otherwise it is removed and attempted again, up to TRANSFER_VERIFY_ATTEMPTS times.
+        -------
+        :return: (verification result, download state of a ranged download or None, the downloaded file)
+        """
+        for attempt in range(1, TRANSFER_VERIFY_ATTEMPTS + 1):
+            object_hash = ObjectHash.like(dataproxy_file.hash)
+            if dataproxy_file.bytes > RANGED_DOWNLOAD_THRESHOLD:
+                state = self._download_resumable(dataproxy_file, partial_file, workers, object_hash)
+            else:
+                state = None
+                self._download_streamed(dataproxy_file, partial_file, object_hash)
+            verification = object_hash.verify(dataproxy_file.hash, dataproxy_file.bytes)
+            if verification != MISMATCH:
+                return verification, state, dataproxy_file
+            metadata = OBJECT_INDEX.stat(dataproxy_file.bucket, dataproxy_file.name)
+            if metadata is None:
+                self._remove_download(partial_file, state)
+                raise FileNotFoundError(f'File {dataproxy_file.name} was removed from the bucket while downloading it!')
+            if (metadata['hash'], metadata['bytes']) != (dataproxy_file.hash, dataproxy_file.bytes):
+                LOGGER.info(f'Remote file {dataproxy_file} changed since it was listed, checking the download '
+                            f'against its current checksum')
+                dataproxy_file = DataproxyFile.from_json(dataproxy_file.client, dataproxy_file.bucket, metadata)
+                verification = object_hash.verify(dataproxy_file.hash, dataproxy_file.bytes)
+                if verification != MISMATCH:
+                    return verification, state, dataproxy_file
+            LOGGER.warning(f'Downloaded content of {dataproxy_file} does not match its checksum '
+                           f'(attempt {attempt} of {TRANSFER_VERIFY_ATTEMPTS})')
+            self._remove_download(partial_file, state)
+        raise DataproxyIntegrityError(f'Downloaded content of {dataproxy_file.name} does not match its checksum!')
+
+    @staticmethod
+    def _remove_download(partial_file, state):
+        # type: (str, Optional[DownloadState]) -> None
+        os.remove(partial_file)
+        if state is not None:
+            state.remove()
+
+    @staticmethod
+    def _download_streamed(dataproxy_file, partial_file, object_hash):
+        # type: (DataproxyFile, str, ObjectHash) -> None
+        try:
+            with open(partial_file, 'wb') as f:
+                for chunk in dataproxy_file.stream():
+                    f.write(chunk)
+                    object_hash.update(chunk)
+        except BaseException:
+            os.remove(partial_file)
+            raise
+
+    @staticmethod
+    def _download_resumable(dataproxy_file, partial_file, workers, object_hash):
+        # type: (DataproxyFile, str, int, ObjectHash) -> DownloadState
+        """
+        Download the missing ranges of <partial_file>, as recorded by its sidecar state, and feed <object_hash>
+        with the file as the ranges complete. Download restarts from scratch if there is no state or if the
+        remote file changed since.
+        """
+        state_file = partial_file + DownloadState.SUFFIX
+        state = DownloadState.load(state_file)
+        if state is not None and state.matches(dataproxy_file) and os.path.exists(partial_file):
+            LOGGER.info(f'Resuming download of {dataproxy_file} from {partial_file}')
+        else:
+            if os.path.exists(partial_file):
+                LOGGER.info(f'Remote file {dataproxy_file} changed since last attempt, downloading it again')
+                os.remove(partial_file)
+            state = DownloadState.for_file(state_file, dataproxy_file)
+            state.save()
+        range_hash = RangeHash(partial_file, object_hash, state.ranges)
+
+        def on_range_done(start, end):
+            state.add_range(start, end)
+            range_hash.add(start, end)
+
+        LOGGER.info(f'Downloading {dataproxy_file} in ranges over {workers} connections')
+        dataproxy_file.download_ranges(partial_file, ranges=state.missing_ranges(RANGED_DOWNLOAD_SEGMENT_SIZE),
+                                       workers=workers, on_range_done=on_range_done)
+        return state
+
+    def sync_directory(self, local_dir, bucket_name, prefix, direction='both', dry_run=False,
+                       delete_extraneous=False, conflict='newer', workers=BULK_TRANSFER_WORKERS):
+        # type: (str, str, str, str, bool, bool, str, int) -> dict
+        """
+        Bring the local directory <local_dir> and the directory <prefix> of bucket <bucket_name> in sync. Files are
+        compared by size and hash, only new and changed files are transferred, by <workers> concurrent transfers.
+        ----------
+        :direction: 'upload' (local to bucket), 'download' (bucket to local) or 'both'
+        :dry_run: only compute the actions, without transferring or deleting anything
+        :delete_extraneous: in a one way sync, delete the files missing from the source side
+        :conflict: how files changed on both sides are resolved in a two-way sync: 'newer', 'local', 'remote'
+        or 'skip'
+        -------
+        :return: summary of the transfer, with the planned actions
+        """
+        if direction != 'download' and not os.path.isdir(local_dir):
+            raise FileNotFoundError(f'Could not find source directory {local_dir} on disk!')
+        prefix = prefix.strip(' ').strip('/')
+        bucket = self._get_bucket(bucket_name)
+        remote_files = {metadata['name'][len(prefix):].lstrip('/'): metadata
+                        for metadata in OBJECT_INDEX.list_prefix(bucket, f'{prefix}/' if prefix else None)}
+        local_files = list_local(local_dir) if os.path.isdir(local_dir) else dict()
+        actions = plan_sync(local_files, remote_files, direction, delete_extraneous, conflict)
+        LOGGER.info(f'SYNC: {len(actions)} actions between {local_dir} and {prefix}/ in bucket {bucket_name}')
+        if dry_run:
+            return {
+                'success': True,
+                'message': f'{len(actions)} files to synchronize',
+                'dry_run': True,
+                'actions': actions
+            }
+
+        def remote_name(path):
+            return f'{prefix}/{path}'.lstrip('/')
+
+        def run(action):
+            path = action['path']
+            local_path = os.path.join(local_dir, *path.split('/'))
+            if action['action'] == 'upload':
+                return self._upload_to_bucket(bucket, local_path, remote_name(path))
+            if action['action'] == 'download':
+                metadata = remote_files[path]
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                verification = self._download_dataproxy_file(DataproxyFile.from_json(bucket.client, bucket, metadata),
+                                                             local_path, overwrite=True)
+                # keep the date of the object, so a two-way sync does not see the local copy as newer
+                mtime = parse_last_modified(metadata['last_modified'])
+                if mtime is not None:
+                    os.utime(local_path, (mtime, mtime))
+                return verification
+            if action['action'] == 'delete_local':
+                os.remove(local_path)
+            elif action['action'] == 'delete_remote':
+                DataproxyFile(bucket.client, bucket, None, None, None, remote_name(path), None).delete()
+                OBJECT_INDEX.remove(bucket, remote_name(path))
+
+        def size_of(action):
+            if action['action'] == 'upload':
+                return local_files[action['path']]['bytes']
+            if action['action'] == 'download':
+                return remote_files[action['path']]['bytes']
+            return 0
+
+        # conflicts are left untouched and only reported
+        conflicts = [action['path'] for action in actions if action['action'] == 'conflict']
+        summary = self._count_verified(run_transfers(run, [action for action in actions
+                                                           if action['action'] != 'conflict'], workers,
+                                                     name_of=lambda action: action['path'], size_of=size_of))
+        summary['message'] = f'Synchronized {summary["succeeded"]} files, {summary["failed"]} failed, ' \
+                             f'{len(conflicts)} conflicts'
+        summary['dry_run'] = False
+        summary['actions'] = actions
+        summary['conflicts'] = conflicts
+        return summary
 
     def get_download_url(self, file_path, bucket_name):
         # type: (str, str) -> str
@@ -149,8 +436,32 @@ class BucketWrapper:
             raise DataproxyFileNotFound(f'Could not find DataproxyFile {file_path} in bucket {bucket_name}')
         return dataproxy_file.get_download_link()
 
+    def get_download_urls(self, file_paths, bucket_name, workers=BULK_TRANSFER_WORKERS):
+        # type: (list, str, int) -> list
+        """
+        Get download URLs for many files in bucket <bucket_name> at once. The bucket is resolved once, the files
+        are looked up in its object index and the links not cached yet are requested concurrently.
+        -------
+        :return: list of {'file', 'url', 'success', 'message'}, in the order of <file_paths>
+        """
+        bucket = self._get_bucket(bucket_name)
+
+        def get_url(file_path):
+            metadata = OBJECT_INDEX.lookup(bucket, file_path.lstrip('/'))
+            if metadata is None:
+                raise DataproxyFileNotFound(f'Could not find DataproxyFile {file_path} in bucket {bucket_name}')
+            return DataproxyFile.from_json(bucket.client, bucket, metadata).get_download_link()
+
+        summary = run_transfers(get_url, file_paths, workers)
+        return [{
+            'file': file_path,
+            'url': outcome.get('result', ''),
+            'success': outcome['success'],
+            'message': outcome['message']
+        } for file_path, outcome in zip(file_paths, summary['files'])]
+
     def upload_file_to(self, source_file, bucket, destination, filename):
-        # type: (str, str, str, str) -> bool
+        # type: (str, str, str, str) -> Union[str, bool]
         """
         Uploads the file <source_file> to bucket <bucket> in directory <destination> with name <filename>
         ----------
@@ -159,7 +470,8 @@ class BucketWrapper:
         :destination: path to the directory in the bucket to upload in
         :filename: name of the file after upload
         -------
-        :return: True if file uploaded successfully, False otherwise
+        :return: result of the checksum verification ('verified' or 'unverified') if file uploaded successfully,
+        False otherwise
         """
         if not os.path.exists(source_file):
             raise FileNotFoundError(f'Could not find source file {source_file} on disk!')
@@ -167,10 +479,85 @@ class BucketWrapper:
         to = f'{to}/{filename}'
         bucket = self._get_bucket(bucket)
         try:
-            bucket.upload(source_file, to)
+            return self._upload_to_bucket(bucket, source_file, to)
         except RuntimeError:
             return False
-        return True
+
+    def upload_directory(self, source_dir, bucket_name, destination, workers=BULK_TRANSFER_WORKERS):
+        # type: (str, str, str, int) -> dict
+        """
+        Uploads the directory <source_dir>, with all its files and subdirectories, to bucket <bucket_name>
+        in directory <destination>. Files are uploaded by <workers> concurrent uploads.
+        -------
+        :return: summary of the transfer with the outcome of each file and the aggregate throughput
+        """
+        if not os.path.isdir(source_dir):
+            raise FileNotFoundError(f'Could not find source directory {source_dir} on disk!')
+        source_dir = os.path.normpath(source_dir)
+        to = destination.strip(' ').strip('/')
+        to = f'{to}/{os.path.basename(source_dir)}'.lstrip('/')
+        bucket = self._get_bucket(bucket_name)
+        files = []
+        for dir_path, _, file_names in os.walk(source_dir):
+            files.extend(os.path.join(dir_path, file_name) for file_name in file_names)
+
+        def relative_path(source_file):
+            return os.path.relpath(source_file, source_dir).replace(os.sep, '/')
+
+        def upload(source_file):
+            return self._upload_to_bucket(bucket, source_file, f'{to}/{relative_path(source_file)}')
+
+        LOGGER.info(f'UPLOADING: {len(files)} files from {source_dir} to {to} in bucket {bucket_name}')
+        return self._count_verified(run_transfers(upload, files, workers, name_of=relative_path,
+                                                  size_of=os.path.getsize))
+
+    @staticmethod
+    @traced('upload')
+    def _upload_to_bucket(bucket, source_file, to):
+        # type: (Bucket, str, str) -> str
+        """
+        Upload <source_file> to <to> in <bucket>, hashing it while it is sent, and check the hash against the one
+        of the uploaded object. A mismatching upload is attempted again, up to TRANSFER_VERIFY_ATTEMPTS times,
+        after which the corrupted object is deleted.
+        -------
+        :return: VERIFIED or UNVERIFIED if the hash of the object can't be compared
+        """
+        name = to.lstrip('/')
+        size = os.path.getsize(source_file)
+        current_span().set('bytes', size)
+        started = time.perf_counter()
+        for attempt in range(1, TRANSFER_VERIFY_ATTEMPTS + 1):
+            if size > MULTIPART_THRESHOLD:
+                digest = MultipartUpload(bucket, to).upload_file(source_file)
+            else:
+                object_hash = ObjectHash()
+                with HashingReader(source_file, object_hash) as f, span('put', bytes=size):
+                    bucket.upload(f, to)
+                digest = object_hash.hexdigest()
+            metadata = OBJECT_INDEX.stat(bucket, name)
+            if metadata is None:
+                LOGGER.warning(f'Uploaded file {name} is not listed yet, its checksum could not be verified')
+                OBJECT_INDEX.put(bucket, {
+                    'hash': None,
+                    'last_modified': None,
+                    'bytes': size,
+                    'name': name,
+                    'content_type': mimetypes.guess_type(to)[0]
+                })
+                observe_transfer('upload', 'storage', size, time.perf_counter() - started)
+                return UNVERIFIED
+            verification = verify(digest, size, metadata['hash'], metadata['bytes'], same_parts=True)
+            if verification != MISMATCH:
+                observe_transfer('upload', 'storage', size, time.perf_counter() - started)
+                return verification
+            LOGGER.warning(f'Uploaded object {name} does not match the checksum of {source_file} '
+                           f'(attempt {attempt} of {TRANSFER_VERIFY_ATTEMPTS})')
+        try:
+            DataproxyFile.from_json(bucket.client, bucket, metadata).delete()
+        except Exception as e:
+            LOGGER.error(f'Could not delete the corrupted object {name}: {e}')
+        OBJECT_INDEX.remove(bucket, name)
+        raise DataproxyIntegrityError(f'Uploaded object {name} does not match the checksum of {source_file}!')
 
     def get_bucket_upload_url(self, to_bucket, with_name, to_path):
         # type: (str, str, str) -> str
@@ -180,47 +567,203 @@ class BucketWrapper:
         """
         target = f'{to_path}/{with_name}'.lstrip('/')
         bucket = self._get_bucket(to_bucket)
+        return self._get_upload_url(bucket, target)
+
+    def get_bucket_upload_urls(self, to_bucket, targets, workers=BULK_TRANSFER_WORKERS):
+        # type: (str, list, int) -> list
+        """
+        Get upload urls in the bucket <to_bucket> for many files at once. The bucket is resolved once and the urls
+        are requested concurrently.
+        ----------
+        :targets: list of (with_name, to_path) pairs, same as the arguments of get_bucket_upload_url
+        -------
+        :return: list of {'with_name', 'to_path', 'url', 'success', 'message'}, in the order of <targets>
+        """
+        bucket = self._get_bucket(to_bucket)
+
+        def get_url(target):
+            with_name, to_path = target
+            return self._get_upload_url(bucket, f'{to_path}/{with_name}'.lstrip('/'))
+
+        summary = run_transfers(get_url, targets, workers)
+        return [{
+            'with_name': with_name,
+            'to_path': to_path,
+            'url': outcome.get('result', ''),
+            'success': outcome['success'],
+            'message': outcome['message']
+        } for (with_name, to_path), outcome in zip(targets, summary['files'])]
+
+    @staticmethod
+    def _get_upload_url(bucket, target):
+        # type: (Bucket, str) -> str
         resp = bucket.client.put(f"/v1/{bucket.target}/{bucket.dataproxy_entity_name}/{target}")
         upload_url = resp.json().get("url")
         if upload_url is None:
             raise RuntimeError(f"Bucket.upload did not get upload url.")
         return upload_url
 
+    def get_multipart_upload_urls(self, to_bucket, with_name, to_path, file_size, upload_id=None, first_part=1):
+        # type: (str, str, str, int, str, int) -> dict
+        """
+        Get upload urls for the parts of a multipart upload of a file of <file_size> bytes in the bucket <to_bucket>
+        with a path <to_path> and the name <with_name>. A new multipart upload is started if no <upload_id> is given.
+        At most MAX_PART_URLS_BATCH urls are returned, starting from part number <first_part>.
+        Each part should be uploaded with a 'PUT' and its ETag response header kept to complete the upload.
+        """
+        target = f'{to_path}/{with_name}'.lstrip('/')
+        bucket = self._get_bucket(to_bucket)
+        upload = MultipartUpload(bucket, target, upload_id)
+        if upload_id is None:
+            upload.start()
+        parts_count = max(1, -(-file_size // MULTIPART_PART_SIZE))
+        last_part = min(parts_count, first_part + MAX_PART_URLS_BATCH - 1)
+        return {
+            'upload_id': upload.upload_id,
+            'part_size': MULTIPART_PART_SIZE,
+            'parts_count': parts_count,
+            'urls': upload.get_part_urls(range(first_part, last_part + 1))
+        }
+
+    def complete_multipart_upload(self, to_bucket, with_name, to_path, upload_id, etags):
+        # type: (str, str, str, str, dict) -> None
+        """
+        Complete the multipart upload <upload_id> with the ETags of its parts (part number -> ETag)
+        """
+        target = f'{to_path}/{with_name}'.lstrip('/')
+        bucket = self._get_bucket(to_bucket)
+        MultipartUpload(bucket, target, upload_id).complete({int(part): etag for part, etag in etags.items()})
+        OBJECT_INDEX.remove(bucket, target)
+
+    def abort_multipart_upload(self, to_bucket, with_name, to_path, upload_id):
+        # type: (str, str, str, str) -> None
+        """
+        Abort the multipart upload <upload_id>, dropping the parts uploaded so far
+        """
+        target = f'{to_path}/{with_name}'.lstrip('/')
+        bucket = self._get_bucket(to_bucket)
+        MultipartUpload(bucket, target, upload_id).abort()
+
     def delete_file_from_bucket(self, bucket_name, file_path):
         dataproxy_file = self._get_dataproxy_file(file_path, bucket_name)
         resp = {'success': False, 'message': ''}
         try:
             LOGGER.warning(f'Deleting file {file_path}')
             dataproxy_file.delete()
+            OBJECT_INDEX.remove(dataproxy_file.bucket, dataproxy_file.name)
+            DOWNLOAD_LINK_CACHE.expire(dataproxy_file)
             resp = {'success': True, 'message': f'File {file_path} was deleted from bucket {bucket_name}'}
         except (Unauthorized, AssertionError) as e:
             LOGGER.error(f'Something went wrong trying to delete file. Error: {e}')
             resp['message'] = str(e)
         return resp
 
+    def delete_files(self, bucket_name, paths=None, prefix=None, workers=BULK_TRANSFER_WORKERS):
+        # type: (str, list, str, int) -> dict
+        """
+        Deletes the files at <paths> and/or all the files under the directory <prefix> from bucket <bucket_name>.
+        The prefix is listed once and the files are deleted by <workers> concurrent requests.
+        -------
+        :return: {'success', 'message', 'failures': [paths that could not be deleted], 'number_of_removals'}
+        """
+        bucket = self._get_bucket(bucket_name)
+        names = [path.lstrip('/') for path in paths or []]
+        if prefix is not None:
+            prefix = prefix.strip('/')
+            files = OBJECT_INDEX.list_prefix(bucket, f'{prefix}/' if prefix else None)
+            names.extend(metadata['name'] for metadata in files)
+        names = list(dict.fromkeys(names))
+        LOGGER.warning(f'DELETE: deleting {len(names)} files from bucket {bucket_name}')
+
+        def delete(name):
+            # only the name is needed to delete a file, no need to look it up
+            DataproxyFile(bucket.client, bucket, None, None, None, name, None).delete()
+            OBJECT_INDEX.remove(bucket, name)
+
+        summary = run_transfers(delete, names, workers)
+        failures = [outcome['name'] for outcome in summary['files'] if not outcome['success']]
+        return {
+            'success': summary['success'],
+            'message': f'Deleted {summary["succeeded"]} files from bucket {bucket_name}, {len(failures)} failed',
+            'failures': failures,
+            'number_of_removals': summary['succeeded']
+        }
+
+    @traced('rename')
     def rename_file(self, bucket_name: str, file_path: str, new_name: str):
+        """
+        Renames the file at <file_path> in bucket <bucket_name> to <new_name>. The file is copied server side
+        when the data proxy supports it, otherwise it is streamed from the storage back into the new upload url.
+        The original file is deleted only after the new one is found with the same size and hash.
+        """
         dataproxy_file = self._get_dataproxy_file(file_path, bucket_name)
+        if dataproxy_file is None:
+            raise DataproxyFileNotFound(f'Could not find DataproxyFile {file_path} in bucket {bucket_name}')
+        bucket = dataproxy_file.bucket
         dir_path = '/'.join(file_path.split('/')[:-1])
-        file_data = dataproxy_file.get_content()
-        upload_url = self.get_bucket_upload_url(bucket_name, new_name, dir_path)
-        resp = requests.request('PUT', upload_url, data=file_data)
-        resp.raise_for_status()
+        new_path = dir_path + '/' + new_name
+        target = new_path.lstrip('/')
+        try:
+            dataproxy_file.copy_to(target)
+        except ebrains_drive.exceptions.ClientHttpError as e:
+            if e.code not in (404, 405, 501):
+                raise
+            LOGGER.info(f'Server side copy is not available ({e.code}), streaming {file_path} to {target}')
+            dataproxy_file.pipe_to(self._get_upload_url(bucket, target))
+
+        copied = OBJECT_INDEX.stat(bucket, target)
+        if not self._is_same_content(dataproxy_file, copied):
+            raise DataproxyTransferError(f'Could not verify the copy of {file_path} as {target}, '
+                                         f'the original file was kept!')
         dataproxy_file.delete()
-        return {'name': new_name, 'path': dir_path + '/' + new_name}
+        OBJECT_INDEX.remove(bucket, dataproxy_file.name)
+        DOWNLOAD_LINK_CACHE.expire(dataproxy_file)
+        return {'name': new_name, 'path': new_path}
+
+    @staticmethod
+    def _is_same_content(dataproxy_file, metadata):
+        # type: (DataproxyFile, dict) -> bool
+        """
+        Check the metadata of a copy against the original file. Hashes of multipart uploads
+        (<md5>-<parts count>) depend on the part size, so only sizes can be compared for them.
+        """
+        if metadata is None or metadata['bytes'] != dataproxy_file.bytes:
+            return False
+        hashes = (dataproxy_file.hash, metadata['hash'])
+        if None in hashes or any('-' in h for h in hashes):
+            return True
+        return hashes[0] == hashes[1]
 
     def list_buckets(self):
-        buckets = self.client.buckets.list_buckets()
+        """
+        Names of the buckets the current user can access, served from the buckets listings cache
+        """
+        try:
+            buckets = BUCKET_LIST_CACHE.get(self.user_key, self.client.buckets.list_buckets)
+        except (TokenExpired, Unauthorized):
+            self.invalidate_client()
+            raise
         return [b.name for b in buckets]
 
     def guess_bucket(self):
         # type: () -> str
         """
-        Attempt to guess a bucket name by looking for repos named as the mounted drive
+        Attempt to guess a bucket name by looking for repos named as the mounted drive. The guess is
+        remembered per user and collab, and done again in the background after a restart or once it gets old.
         """
         LOGGER.info('Trying to guess bucket...')
-        token = self.client.token
         collab_name = pathlib.Path.cwd().parts[4]  # educated guess, safer than lab env vars
         LOGGER.info(f'educated guess: {collab_name}')
+        token = self.client.token
+        return BUCKET_GUESS_CACHE.get(get_user_key(token), collab_name,
+                                      lambda: self._guess_bucket_of(collab_name, token))
+
+    @staticmethod
+    def _guess_bucket_of(collab_name, token):
+        # type: (str, str) -> str
+        """
+        Find the bucket of the collab whose drive is named <collab_name>
+        """
         LOGGER.info('getting drive client...')
         drive_client = ebrains_drive.connect(token=token)
         LOGGER.info(f'try to get repo by name {collab_name}...')
@@ -37,3 +37,33 @@ class DataproxyFileNotFound(TVBExtBucketException):
     """
     Exception to be thrown when a DataproxyFile can't be found in a bucket
     """
+
+
+class DataproxyTransferError(TVBExtBucketException):
+    """
+    Exception to be thrown when a transfer from/to the data proxy storage can't be completed
+    """
+
+
+class DataproxyIntegrityError(DataproxyTransferError):
+    """
+    Exception to be thrown when transferred content does not match the checksum of the object in the storage
+    """
+
+
+class TransferCancelled(TVBExtBucketException):
+    """
+    Exception to be thrown when a transfer is skipped because its job was cancelled
+    """
+
+
+class DataproxyUnavailable(CollabAccessError):
+    """
+    Exception to be thrown when calls to the data proxy fail fast because it keeps failing
+    """
+
+
+class InvalidRequestBody(TVBExtBucketException):
+    """
+    Exception to be thrown when the json body of a request does not have the expected structure
+    """
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from tvb_ext_bucket.tracing import propagated
+
+# max number of blocking bucket operations running at the same time for the handlers
+MAX_WORKERS = int(os.getenv('TVB_EXT_BUCKET_MAX_WORKERS', 8))
+
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='tvb_ext_bucket')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run the blocking callable <func> on the extension's bounded thread pool, so that the
+    Jupyter server event loop stays responsive while the call waits for the network
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(propagated(func), *args, **kwargs))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from tvb_ext_bucket.executor import EXECUTOR
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# file where the guessed buckets are persisted, so they are known right away after a restart of the server
+GUESS_CACHE_FILE = os.getenv('TVB_EXT_BUCKET_GUESS_CACHE_FILE',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'tvb_ext_bucket', 'guess_bucket.json'))
+# seconds after which a guessed bucket is still served, but guessed again in the background
+GUESS_CACHE_TTL = int(os.getenv('TVB_EXT_BUCKET_GUESS_CACHE_TTL', 24 * 60 * 60))
+
+
+class GuessCache:
+    """
+    Buckets guessed for the collab drive a user works in, keyed by user and collab name, kept in memory and
+    persisted to <path>. A bucket is guessed once: afterwards the known one is returned right away and, when it
+    was guessed by a previous run of the server or more than <ttl> seconds ago, guessed again in the background
+    for the next calls.
+    """
+
+    def __init__(self, path=GUESS_CACHE_FILE, ttl=GUESS_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None  # type: Optional[Dict[str, Tuple[str, float]]]
+        # keys guessed by this run of the server
+        self._guessed = set()  # type: Set[str]
+        self._revalidating = set()  # type: Set[str]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user, collab_name):
+        # type: (str, str) -> str
+        return f'{user}/{collab_name}'
+
+    def _load(self):
+        # type: () -> Dict[str, Tuple[str, float]]
+        """
+        Read the persisted entries the first time they are needed. Must be called with the lock held
+        """
+        if self._entries is None:
+            self._entries = dict()
+            try:
+                with open(self.path) as f:
+                    entries = json.load(f)
+                self._entries = {key: (bucket, float(guessed_at)) for key, (bucket, guessed_at) in entries.items()}
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                LOGGER.warning(f'Ignoring unreadable guessed buckets file {self.path}: {e}')
+        return self._entries
+
+    def _save(self):
+        # type: () -> None
+        """
+        Persist the entries. Must be called with the lock held
+        """
+        temp_path = f'{self.path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            LOGGER.error(f'Could not persist the guessed buckets to {self.path}: {e}')
+
+    def get(self, user, collab_name, guess):
+        # type: (str, str, Callable[[], str]) -> str
+        """
+        Get the bucket of <user> for <collab_name>, calling <guess> to find it if it is not known yet
+        """
+        key = self._key(user, collab_name)
+        with self._lock:
+            entry = self._load().get(key)
+            stale = entry is not None and key not in self._revalidating and \
+                (key not in self._guessed or time.time() - entry[1] > self.ttl)
+            if stale:
+                self._revalidating.add(key)
+        if entry is None:
+            return self._guess(key, guess)
+        if stale:
+            LOGGER.info(f'Guessing again the bucket of {collab_name} in the background')
+            EXECUTOR.submit(self._revalidate, key, guess)
+        return entry[0]
+
+    def _guess(self, key, guess):
+        # type: (str, Callable[[], str]) -> str
+        bucket = guess()
+        with self._lock:
+            self._load()[key] = (bucket, time.time())
+            self._guessed.add(key)
+            self._save()
+        return bucket
+
+    def _revalidate(self, key, guess):
+        # type: (str, Callable[[], str]) -> None
+        try:
+            self._guess(key, guess)
+        except Exception as e:
+            LOGGER.warning(f'Could not guess again the bucket of {key}, keeping the known one: {e}')
+        finally:
+            with self._lock:
+                self._revalidating.discard(key)
+
+    def invalidate(self, user, collab_name):
+        # type: (str, str) -> None
+        with self._lock:
+            key = self._key(user, collab_name)
+            self._guessed.discard(key)
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+
+BUCKET_GUESS_CACHE = GuessCache()
@@ -5,36 +5,161 @@
 # (c) 2022-2025, TVB Widgets Team
 #
 
+import gzip
 import json
+import zlib
+from typing import Dict, Tuple
 
-from jupyter_server.base.handlers import APIHandler
+from jupyter_server.base.handlers import APIHandler, JupyterHandler
 from jupyter_server.utils import url_path_join
 import tornado
 from tornado.web import MissingArgumentError
 
-from ebrains_drive.exceptions import TokenExpired
-from tvb_ext_bucket.exceptions import CollabAccessError
+from ebrains_drive.exceptions import ClientHttpError, TokenExpired
+from requests import RequestException
+from tvb_ext_bucket.exceptions import CollabAccessError, CollabTokenError, DataproxyFileNotFound, \
+    DataproxyTransferError, DataproxyIntegrityError, InvalidRequestBody
+from tvb_ext_bucket.bucket_api.bucket_list_cache import BUCKET_LIST_CACHE
+from tvb_ext_bucket.bucket_api.checksum import MISMATCH
+from tvb_ext_bucket.bucket_api.link_cache import DOWNLOAD_LINK_CACHE
+from tvb_ext_bucket.bucket_api.listing import LISTING_PAGE_SIZE, to_columnar
+from tvb_ext_bucket.bucket_api.object_index import OBJECT_INDEX
+from tvb_ext_bucket.download_cache import DOWNLOAD_CACHE
 from tvb_ext_bucket.ebrains_drive_wrapper import BucketWrapper
+from tvb_ext_bucket.executor import run_blocking
+from tvb_ext_bucket.jobs import JOB_QUEUE
 from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.metrics import METRICS, METRICS_CONTENT_TYPE, HANDLER_LATENCY, HANDLER_REQUESTS, count_error
+from tvb_ext_bucket.token_provider import TOKEN_PROVIDER
+from tvb_ext_bucket.tracing import TRACER
 
 LOGGER = get_logger(__name__)
 
+# json responses smaller than this (in bytes) are sent uncompressed
+COMPRESSION_MIN_BYTES = 1024
+# listing formats: 'names' is the list of file paths, 'columnar' is the metadata packed by to_columnar
+LISTING_FORMATS = ('names', 'columnar')
 
-class BucketsHandler(APIHandler):
+
+def cache_lookups():
+    # type: () -> Dict[str, Tuple[int, int]]
+    """
+    Hits and misses of the caches of the extension, by cache
+    """
+    return {
+        'download': (DOWNLOAD_CACHE.hits, DOWNLOAD_CACHE.misses),
+        'download_link': (DOWNLOAD_LINK_CACHE.hits, DOWNLOAD_LINK_CACHE.misses),
+        'object_index': (OBJECT_INDEX.hits, OBJECT_INDEX.misses),
+        'bucket_list': (BUCKET_LIST_CACHE.hits + BUCKET_LIST_CACHE.stale_hits, BUCKET_LIST_CACHE.misses)
+    }
+
+
+METRICS.collected('tvb_ext_bucket_cache_hits_total', 'Lookups answered by the caches', 'counter', ('cache',),
+                  lambda: [((cache,), hits) for cache, (hits, _) in cache_lookups().items()])
+METRICS.collected('tvb_ext_bucket_cache_misses_total', 'Lookups missed by the caches', 'counter', ('cache',),
+                  lambda: [((cache,), misses) for cache, (_, misses) in cache_lookups().items()])
+METRICS.collected('tvb_ext_bucket_cache_hit_ratio', 'Ratio of the lookups answered by the caches', 'gauge',
+                  ('cache',), lambda: [((cache,), hits / (hits + misses) if hits + misses else 0)
+                                       for cache, (hits, misses) in cache_lookups().items()])
+
+
+def negotiate_encoding(accept_encoding):
+    # type: (str) -> str
+    """
+    Choose the content encoding of a response from the Accept-Encoding header of the request:
+    gzip if accepted, otherwise deflate, otherwise None (identity)
+    """
+    accepted = dict()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ('gzip', 'deflate'):
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class InstrumentedHandler(APIHandler):
+    """
+    Base of the handlers of the extension, counting the requests it serves and their latency, and tracing
+    the sampled ones
+    """
+    _trace = None
+
+    async def prepare(self):
+        self._trace = TRACER.start(type(self).__name__, method=self.request.method, path=self.request.path)
+        await super().prepare()
+
+    def on_finish(self):
+        handler = type(self).__name__
+        HANDLER_REQUESTS.inc(handler, self.request.method, str(self.get_status()))
+        HANDLER_LATENCY.observe(self.request.request_time(), handler, self.request.method)
+        if self._trace is not None:
+            self._trace.set('status', self.get_status())
+            TRACER.finish(self._trace)
+            self._trace = None
+        super().on_finish()
+
+    def get_json_object(self, *list_keys):
+        # type: (str) -> dict
+        """
+        The json body of the request, which has to be an object whose list_keys (the ones it has) are lists
+        """
+        body = self.get_json_body()
+        if not isinstance(body, dict):
+            raise InvalidRequestBody('Expected a json object as request body!')
+        for key in list_keys:
+            if key in body and not isinstance(body[key], list):
+                raise InvalidRequestBody(f'Expected a list as {key} in request body!')
+        return body
+
+    def log_exception(self, typ, value, tb):
+        # only the errors the handlers let through are counted, the ones they answer with a status are not
+        if value is not None and not isinstance(value, tornado.web.HTTPError):
+            count_error(value)
+        super().log_exception(typ, value, tb)
+
+
+class CompressedJSONHandler(InstrumentedHandler):
+    """
+    Base for handlers sending large json responses, compressed with gzip or deflate when the client accepts it
+    """
+
+    def finish_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.set_header('Content-Type', 'application/json')
+        self.set_header('Vary', 'Accept-Encoding')
+        encoding = negotiate_encoding(self.request.headers.get('Accept-Encoding'))
+        if encoding is not None and len(body) >= COMPRESSION_MIN_BYTES:
+            body = gzip.compress(body) if encoding == 'gzip' else zlib.compress(body)
+            self.set_header('Content-Encoding', encoding)
+        self.finish(body)
+
+
+class BucketsHandler(InstrumentedHandler):
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         try:
-            wrapper = BucketWrapper()
-            resp = wrapper.list_buckets()
+            wrapper = await run_blocking(BucketWrapper)
+            resp = await run_blocking(wrapper.list_buckets)
             self.finish(json.dumps(resp))
         except Exception as e:
             LOGGER.error(f'Could not get a list of available buckets : {str(e)}')
             self.finish(json.dumps([]))
 
 
-class BucketHandler(APIHandler):
+class BucketHandler(CompressedJSONHandler):
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
+        """
+        lists the whole bucket. With format=columnar, the metadata of the files is returned as 'listing'
+        """
         response = {
             'success': False,
             'message': '',
@@ -42,10 +167,19 @@ class BucketHandler(APIHandler):
         }
         try:
             bucket_name = self.get_argument('bucket')
+            listing_format = self.get_argument('format', 'names')
+            if listing_format not in LISTING_FORMATS:
+                raise ValueError(f'Unknown listing format {listing_format}!')
             LOGGER.info(f'OPEN bucket {json.dumps(bucket_name)}')
-            bucket_wrapper = BucketWrapper()
-            response['files'] = bucket_wrapper.get_files_in_bucket(bucket_name)
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            if listing_format == 'columnar':
+                files = await run_blocking(bucket_wrapper.get_files_metadata, bucket_name)
+                response['listing'] = to_columnar(files)
+            else:
+                response['files'] = await run_blocking(bucket_wrapper.get_files_in_bucket, bucket_name)
             response['success'] = True
+        except ValueError as e:
+            response['message'] = str(e)
         except MissingArgumentError:
             response['message'] = 'No collab name provided!'
         except TokenExpired as e:
@@ -53,38 +187,117 @@ class BucketHandler(APIHandler):
             response['message'] = 'Error on getting buckets, your collab token is expired!'
         except CollabAccessError as e:
             response['message'] = e.message
-        self.finish(json.dumps(response))
+        self.finish_json(response)
 
 
-class DownloadHandler(APIHandler):
+class DirectoryHandler(CompressedJSONHandler):
+    """
+    Handler for listing a directory of a bucket one page at a time
+    """
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
+        """
+        lists a page of a directory. With format=columnar, the metadata of the files is returned as 'listing'
+        """
         response = {
             'success': False,
-            'message': ''
+            'message': '',
+            'directories': [],
+            'files': [],
+            'cursor': None
+        }
+        try:
+            bucket_name = self.get_argument('bucket')
+            prefix = self.get_argument('prefix', '')
+            cursor = self.get_argument('cursor', None)
+            page_size = int(self.get_argument('page_size', str(LISTING_PAGE_SIZE)))
+            listing_format = self.get_argument('format', 'names')
+            if listing_format not in LISTING_FORMATS:
+                raise ValueError(f'Unknown listing format {listing_format}!')
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            response.update(await run_blocking(bucket_wrapper.list_directory, bucket_name, prefix, cursor, page_size))
+            if listing_format == 'columnar':
+                response['listing'] = to_columnar(response['files'])
+                response['files'] = []
+            response['success'] = True
+        except MissingArgumentError:
+            response['message'] = 'No collab name provided!'
+        except ValueError as e:
+            response['message'] = str(e)
+        except TokenExpired as e:
+            LOGGER.info(f'Collab token expired: {e}')
+            response['message'] = 'Error on listing the bucket, your collab token is expired!'
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish_json(response)
+
+
+class DownloadHandler(InstrumentedHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        response = {
+            'success': False,
+            'message': '',
+            'verification': None
           }
         try:
             file_path = self.get_argument('file')
             bucket = self.get_argument('bucket')
             download_destination = self.get_argument('download_destination')
-            bucket_wrapper = BucketWrapper()
-            resp = bucket_wrapper.download_file(file_path, bucket, download_destination)
-            response['success'] = resp
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            resp = await run_blocking(bucket_wrapper.download_file, file_path, bucket, download_destination)
+            response['success'] = bool(resp)
+            response['verification'] = resp or None
             response['message'] = f'File {file_path} was downloaded from bucket {bucket}'
         except MissingArgumentError as e:
             response['message'] = e.log_message
         except FileExistsError:
             response['message'] = f'File {file_path.split("/")[-1]} already exists! Please move or ' \
                                   f'rename the existing file and try again!'
+        except DataproxyIntegrityError as e:
+            LOGGER.error(e.message)
+            response['verification'] = MISMATCH
+            response['message'] = f'Downloaded content of {file_path} is corrupted, please try again!'
+        except (DataproxyTransferError, RequestException) as e:
+            LOGGER.error(f'Download of {file_path} was interrupted: {e}')
+            response['message'] = f'Download of {file_path} was interrupted! Try again to resume it.'
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class BulkDownloadHandler(InstrumentedHandler):
+    """
+    Handler for downloading all the files in a directory of a bucket
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        response = {
+            'success': False,
+            'message': '',
+            'files': []
+        }
+        try:
+            prefix = self.get_argument('prefix')
+            bucket = self.get_argument('bucket')
+            download_destination = self.get_argument('download_destination')
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            response = await run_blocking(bucket_wrapper.download_prefix, prefix, bucket, download_destination)
+            response['message'] = f'Downloaded {response["succeeded"]} files from {prefix} in bucket {bucket}, ' \
+                                  f'{response["failed"]} failed'
+        except MissingArgumentError as e:
+            response['message'] = e.log_message
+        except CollabAccessError as e:
+            response['message'] = e.message
         self.finish(json.dumps(response))
 
 
-class DownloadUrlHandler(APIHandler):
+class DownloadUrlHandler(InstrumentedHandler):
     """
     Handler for download urls
     """
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         response = {
             'success': False,
             'message': '',
@@ -93,18 +306,52 @@ class DownloadUrlHandler(APIHandler):
         try:
             file_path = self.get_argument('file')
             bucket = self.get_argument('bucket')
-            bucket_wrapper = BucketWrapper()
-            url = bucket_wrapper.get_download_url(file_path, bucket)
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            url = await run_blocking(bucket_wrapper.get_download_url, file_path, bucket)
             response['success'] = True
             response['url'] = url
-        except (MissingArgumentError, FileNotFoundError) as e:
+        except MissingArgumentError as e:
             response['message'] = e.log_message
+        except (DataproxyFileNotFound, CollabAccessError) as e:
+            response['message'] = e.message
         self.finish(json.dumps(response))
 
 
-class UploadHandler(APIHandler):
+class DownloadUrlsHandler(InstrumentedHandler):
+    """
+    Handler for download urls of many files at once
+    """
     @tornado.web.authenticated
-    def get(self):
+    async def post(self):
+        """
+        expects a json body with the bucket and the list of files to get download urls for
+        """
+        response = {
+            'success': False,
+            'message': '',
+            'urls': []
+        }
+        try:
+            body = self.get_json_object('files')
+            bucket = body['bucket']
+            files = body['files']
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            response['urls'] = await run_blocking(bucket_wrapper.get_download_urls, files, bucket)
+            response['success'] = all(url['success'] for url in response['urls'])
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except InvalidRequestBody as e:
+            response['message'] = e.message
+            self.set_status(400)
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class UploadHandler(InstrumentedHandler):
+    @tornado.web.authenticated
+    async def get(self):
         response = {
             'success': False,
             'message': ''
@@ -114,27 +361,58 @@ class UploadHandler(APIHandler):
             bucket = self.get_argument('bucket')
             destination = self.get_argument('destination')
             filename = self.get_argument('filename')
-            bucket_wrapper = BucketWrapper()
-            resp = bucket_wrapper.upload_file_to(source_file, bucket, destination, filename)
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            resp = await run_blocking(bucket_wrapper.upload_file_to, source_file, bucket, destination, filename)
             if not resp:
                 response['message'] = f'Could not upload file {source_file} to bucket {bucket} at {destination}'
             else:
                 response = {
                     'success': True,
-                    'message': 'Upload success!'
+                    'message': 'Upload success!',
+                    'verification': resp
                 }
             self.finish(response)
         except MissingArgumentError as e:
             response['message'] = e.log_message
             self.finish(response)
+        except DataproxyIntegrityError as e:
+            response['message'] = e.message
+            response['verification'] = MISMATCH
+            self.finish(response)
+
+
+class UploadDirectoryHandler(InstrumentedHandler):
+    """
+    Handler for uploading a directory tree from the Jupyter workspace
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        response = {
+            'success': False,
+            'message': '',
+            'files': []
+        }
+        try:
+            source_dir = self.get_argument('source_dir')
+            bucket = self.get_argument('bucket')
+            destination = self.get_argument('destination')
+            bucket_wrapper = await run_blocking(BucketWrapper)
+            response = await run_blocking(bucket_wrapper.upload_directory, source_dir, bucket, destination)
+            response['message'] = f'Uploaded {response["succeeded"]} files to bucket {bucket}, ' \
+                                  f'{response["failed"]} failed'
+        except MissingArgumentError as e:
+            response['message'] = e.log_message
+        except (FileNotFoundError, CollabAccessError) as e:
+            response['message'] = str(e)
+        self.finish(json.dumps(response))
 
 
-class LocalUploadHandler(APIHandler):
+class LocalUploadHandler(InstrumentedHandler):
     """
     Handler for uploading a file from local storage
     """
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
         """
         get route of the handler. Returns an url to send data to with a "PUT" request
         """
@@ -146,8 +424,8 @@ class LocalUploadHandler(APIHandler):
             to_bucket = self.get_argument('to_bucket')
             with_name = self.get_argument('with_name')
             to_path = self.get_argument('to_path')
-            wrapper = BucketWrapper()
-            url = wrapper.get_bucket_upload_url(to_bucket, with_name, to_path)
+            wrapper = await run_blocking(BucketWrapper)
+            url = await run_blocking(wrapper.get_bucket_upload_url, to_bucket, with_name, to_path)
             response['success'] = True
             response['url'] = url
         except MissingArgumentError as e:
@@ -157,22 +435,211 @@ class LocalUploadHandler(APIHandler):
         self.finish(response)
 
 
-class ObjectsHandler(APIHandler):
+class LocalUploadBatchHandler(InstrumentedHandler):
+    """
+    Handler for uploading many files from local storage
+    """
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        post route of the handler. Expects a json body with the bucket and a list of {with_name, to_path} targets.
+        Returns an url for each target, to send its data to with a "PUT" request
+        """
+        response = {
+            'success': False,
+            'message': '',
+            'urls': []
+        }
+        try:
+            body = self.get_json_object('targets')
+            to_bucket = body['to_bucket']
+            if not all(isinstance(target, dict) for target in body['targets']):
+                raise InvalidRequestBody('Expected {with_name, to_path} objects as targets in request body!')
+            targets = [(target['with_name'], target['to_path']) for target in body['targets']]
+            wrapper = await run_blocking(BucketWrapper)
+            response['urls'] = await run_blocking(wrapper.get_bucket_upload_urls, to_bucket, targets)
+            response['success'] = all(url['success'] for url in response['urls'])
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except InvalidRequestBody as e:
+            response['message'] = e.message
+            self.set_status(400)
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class MultipartUploadHandler(InstrumentedHandler):
+    """
+    Handler for multipart uploads of large files from local storage
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        get route of the handler. Starts a multipart upload (unless an upload_id is provided)
+        and returns a batch of urls to send the parts to with "PUT" requests
+        """
+        response = {
+            'success': False,
+            'message': ''
+        }
+        try:
+            to_bucket = self.get_argument('to_bucket')
+            with_name = self.get_argument('with_name')
+            to_path = self.get_argument('to_path')
+            file_size = int(self.get_argument('file_size'))
+            upload_id = self.get_argument('upload_id', None)
+            first_part = int(self.get_argument('first_part', '1'))
+            wrapper = await run_blocking(BucketWrapper)
+            response.update(await run_blocking(wrapper.get_multipart_upload_urls, to_bucket, with_name, to_path,
+                                               file_size, upload_id, first_part))
+            response['success'] = True
+        except MissingArgumentError as e:
+            response['message'] = e.log_message
+        except (ValueError, CollabAccessError, DataproxyTransferError) as e:
+            response['message'] = str(e)
+        self.finish(json.dumps(response))
+
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        post route of the handler. Completes a multipart upload given the ETags of its parts
+        """
+        response = {
+            'success': False,
+            'message': ''
+        }
+        try:
+            body = self.get_json_object('etags')
+            to_bucket, with_name, to_path = body['to_bucket'], body['with_name'], body['to_path']
+            upload_id, etags = body['upload_id'], body['etags']
+            wrapper = await run_blocking(BucketWrapper)
+            await run_blocking(wrapper.complete_multipart_upload, to_bucket, with_name, to_path, upload_id, etags)
+            response['success'] = True
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except InvalidRequestBody as e:
+            response['message'] = e.message
+            self.set_status(400)
+        except (CollabAccessError, ClientHttpError) as e:
+            response['message'] = str(e)
+        self.finish(json.dumps(response))
+
+    @tornado.web.authenticated
+    async def delete(self):
+        """
+        delete route of the handler. Aborts a multipart upload, so its uploaded parts don't take storage space
+        """
+        response = {
+            'success': False,
+            'message': ''
+        }
+        try:
+            to_bucket = self.get_argument('to_bucket')
+            with_name = self.get_argument('with_name')
+            to_path = self.get_argument('to_path')
+            upload_id = self.get_argument('upload_id')
+            wrapper = await run_blocking(BucketWrapper)
+            await run_blocking(wrapper.abort_multipart_upload, to_bucket, with_name, to_path, upload_id)
+            response['success'] = True
+        except MissingArgumentError as e:
+            response['message'] = e.log_message
+        except (CollabAccessError, ClientHttpError) as e:
+            response['message'] = str(e)
+        self.finish(json.dumps(response))
+
+
+class SyncHandler(InstrumentedHandler):
+    """
+    Handler for synchronizing a directory of the Jupyter workspace with a directory of a bucket
+    """
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        expects a json body with local_dir, bucket and prefix, optionally direction ('upload', 'download' or
+        'both'), dry_run, delete_extraneous and conflict ('newer', 'local', 'remote' or 'skip')
+        """
+        response = {
+            'success': False,
+            'message': '',
+            'actions': []
+        }
+        try:
+            body = self.get_json_object()
+            local_dir, bucket, prefix = body['local_dir'], body['bucket'], body['prefix']
+            wrapper = await run_blocking(BucketWrapper)
+            response = await run_blocking(wrapper.sync_directory, local_dir, bucket, prefix,
+                                          direction=body.get('direction', 'both'),
+                                          dry_run=body.get('dry_run', False),
+                                          delete_extraneous=body.get('delete_extraneous', False),
+                                          conflict=body.get('conflict', 'newer'))
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except InvalidRequestBody as e:
+            response['message'] = e.message
+            self.set_status(400)
+        except (ValueError, FileNotFoundError) as e:
+            response['message'] = str(e)
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class ObjectsHandler(InstrumentedHandler):
     """
     Handler for objects in bucket
     """
     @tornado.web.authenticated
-    def delete(self, bucket_name, file_path):
+    async def delete(self, bucket_name, file_path):
         bucket = str(bucket_name)
         file_str = str(file_path)
         LOGGER.warning(f'DELETE: file {file_str} in bucket {bucket}!')
-        wrapper = BucketWrapper()
-        delete_response = wrapper.delete_file_from_bucket(bucket, file_str)
+        wrapper = await run_blocking(BucketWrapper)
+        delete_response = await run_blocking(wrapper.delete_file_from_bucket, bucket, file_str)
         self.finish(json.dumps(delete_response))
 
 
-class RenameHandler(APIHandler):
-    def get(self):
+class BulkDeleteHandler(InstrumentedHandler):
+    """
+    Handler for deleting many objects from a bucket at once
+    """
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        expects a json body with the bucket and the paths and/or the prefix of the files to delete
+        """
+        response = {
+            'success': False,
+            'message': '',
+            'failures': [],
+            'number_of_removals': 0
+        }
+        try:
+            body = self.get_json_object('paths')
+            bucket = body['bucket']
+            paths = body.get('paths', [])
+            prefix = body.get('prefix')
+            if not paths and prefix is None:
+                raise KeyError('paths or prefix')
+            LOGGER.warning(f'DELETE: {len(paths)} files and prefix {prefix} in bucket {bucket}!')
+            wrapper = await run_blocking(BucketWrapper)
+            response = await run_blocking(wrapper.delete_files, bucket, paths, prefix)
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except InvalidRequestBody as e:
+            response['message'] = e.message
+            self.set_status(400)
+        except CollabAccessError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class RenameHandler(InstrumentedHandler):
+    async def get(self):
         response = {
             'success': False,
             'message': '',
@@ -182,12 +649,14 @@ class RenameHandler(APIHandler):
             bucket = self.get_argument('bucket')
             file_path = self.get_argument('path')
             new_name = self.get_argument('new_name')
-            wrapper = BucketWrapper()
-            new_data = wrapper.rename_file(bucket, file_path, new_name)
+            wrapper = await run_blocking(BucketWrapper)
+            new_data = await run_blocking(wrapper.rename_file, bucket, file_path, new_name)
             response['success'] = True
             response['newData'] = new_data
         except MissingArgumentError as e:
             response['message'] = str(e)
+        except (DataproxyFileNotFound, DataproxyTransferError) as e:
+            response['message'] = e.message
         if not response['success']:
             self.set_status(400)
             self.finish(json.dumps(response))
@@ -195,16 +664,155 @@ class RenameHandler(APIHandler):
             self.finish(json.dumps(response))
 
 
-class GuessBucketHandler(APIHandler):
-    def get(self):
+class DownloadCacheHandler(InstrumentedHandler):
+    """
+    Handler reporting the hit/miss statistics of the local download cache
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        self.finish(json.dumps(DOWNLOAD_CACHE.stats()))
+
+
+class BucketListCacheHandler(InstrumentedHandler):
+    """
+    Handler reporting the hit/miss statistics of the buckets listings cache
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        self.finish(json.dumps(BUCKET_LIST_CACHE.stats()))
+
+
+class MetricsHandler(JupyterHandler):
+    """
+    Handler exporting the metrics of the extension in the Prometheus text format (not an APIHandler,
+    which only sends json)
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        self.set_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.finish(METRICS.render())
+
+
+class TokenHandler(InstrumentedHandler):
+    """
+    Handler reporting for how long the cached collab token is still valid, the token itself is not exposed
+    """
+    @tornado.web.authenticated
+    async def get(self):
+        response = {
+            'success': False,
+            'message': '',
+            'expires_in': None
+        }
+        try:
+            await run_blocking(TOKEN_PROVIDER.get_token)
+            response['expires_in'] = TOKEN_PROVIDER.remaining()
+            response['success'] = True
+        except CollabTokenError as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class JobsHandler(InstrumentedHandler):
+    """
+    Handler for the transfers run in the background by the job queue
+    """
+
+    @staticmethod
+    async def user_key():
+        # type: () -> str
+        """
+        Key of the EBRAINS user the jobs are run for. The per user limits and the job lookups use it, whatever
+        Jupyter user is logged in.
+        """
+        wrapper = await run_blocking(BucketWrapper)
+        return wrapper.user_key
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        status of the job of the user with the id given as query param, or of all the jobs of the user if there is
+        no id
+        """
+        response = {
+            'success': False,
+            'message': ''
+        }
+        try:
+            user = await self.user_key()
+            job_id = self.get_argument('id', None)
+            if job_id is None:
+                response['jobs'] = [job.to_json() for job in JOB_QUEUE.list(user)]
+                response['success'] = True
+            else:
+                job = JOB_QUEUE.get(job_id, user)
+                response['success'] = job is not None
+                response['message'] = '' if job is not None else f'No job with id {job_id}!'
+                response['job'] = job.to_json() if job is not None else None
+        except (CollabTokenError, CollabAccessError) as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        expects a json body with the kind of the job, its params and optionally its priority
+        """
+        response = {
+            'success': False,
+            'message': '',
+            'job': None
+        }
+        try:
+            body = self.get_json_object()
+            user = await self.user_key()
+            job = await run_blocking(JOB_QUEUE.enqueue, body['kind'], body['params'], user, body.get('priority'))
+            response['success'] = True
+            response['job'] = job.to_json()
+        except KeyError as e:
+            response['message'] = f'Missing {e} in request body!'
+            self.set_status(400)
+        except (ValueError, InvalidRequestBody) as e:
+            response['message'] = str(e)
+            self.set_status(400)
+        except (CollabTokenError, CollabAccessError) as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+    @tornado.web.authenticated
+    async def delete(self):
+        response = {
+            'success': False,
+            'message': '',
+            'job': None
+        }
+        try:
+            job_id = self.get_argument('id')
+            user = await self.user_key()
+            job = await run_blocking(JOB_QUEUE.cancel, job_id, user)
+            if job is None:
+                response['message'] = f'No job with id {job_id}!'
+            else:
+                response['success'] = job.cancel_requested
+                response['message'] = '' if job.cancel_requested else f'Job {job_id} is already {job.state}!'
+                response['job'] = job.to_json()
+        except MissingArgumentError as e:
+            response['message'] = e.log_message
+        except (CollabTokenError, CollabAccessError) as e:
+            response['message'] = e.message
+        self.finish(json.dumps(response))
+
+
+class GuessBucketHandler(InstrumentedHandler):
+    async def get(self):
         response = {
             'success': False,
             'bucket': '',
             'message': ''
         }
         try:
-            wrapper = BucketWrapper()
-            response['bucket'] = wrapper.guess_bucket()
+            wrapper = await run_blocking(BucketWrapper)
+            response['bucket'] = await run_blocking(wrapper.guess_bucket)
             response['success'] = True
         except AssertionError:
             response['message'] = 'Could not identify a repo. ' \
@@ -220,23 +828,49 @@ def setup_handlers(web_app):
     base_url = web_app.settings["base_url"]
     buckets_list_pattern = url_path_join(base_url, "tvb_ext_bucket", "buckets_list")
     bucket_pattern = url_path_join(base_url, "tvb_ext_bucket", "buckets")
+    directory_pattern = url_path_join(base_url, "tvb_ext_bucket", "directory")
     download_pattern = url_path_join(base_url, "tvb_ext_bucket", "download")
+    bulk_download_pattern = url_path_join(base_url, "tvb_ext_bucket", "download_prefix")
     download_ulr_pattern = url_path_join(base_url, "tvb_ext_bucket", "download_url")
+    download_urls_pattern = url_path_join(base_url, "tvb_ext_bucket", "download_urls")
     upload_pattern = url_path_join(base_url, "tvb_ext_bucket", "upload")
+    upload_directory_pattern = url_path_join(base_url, "tvb_ext_bucket", "upload_directory")
     local_upload_pattern = url_path_join(base_url, "tvb_ext_bucket", "local_upload")
+    local_upload_batch_pattern = url_path_join(base_url, "tvb_ext_bucket", "local_upload_batch")
+    multipart_upload_pattern = url_path_join(base_url, "tvb_ext_bucket", "multipart_upload")
+    sync_pattern = url_path_join(base_url, "tvb_ext_bucket", "sync")
     objects_handler = url_path_join(base_url, "tvb_ext_bucket", r"objects/(.*)/(.*)")
+    bulk_delete_pattern = url_path_join(base_url, "tvb_ext_bucket", "bulk_delete")
     rename_handler_pattern = url_path_join(base_url, "tvb_ext_bucket", "rename")
     guess_bucket_pattern = url_path_join(base_url, "tvb_ext_bucket", "guess_bucket")
+    download_cache_pattern = url_path_join(base_url, "tvb_ext_bucket", "download_cache")
+    jobs_pattern = url_path_join(base_url, "tvb_ext_bucket", "jobs")
+    token_pattern = url_path_join(base_url, "tvb_ext_bucket", "token")
+    buckets_list_cache_pattern = url_path_join(base_url, "tvb_ext_bucket", "buckets_list_cache")
+    metrics_pattern = url_path_join(base_url, "tvb_ext_bucket", "metrics")
 
     handlers = [
         (buckets_list_pattern, BucketsHandler),
         (bucket_pattern, BucketHandler),
+        (directory_pattern, DirectoryHandler),
         (download_pattern, DownloadHandler),
+        (bulk_download_pattern, BulkDownloadHandler),
         (download_ulr_pattern, DownloadUrlHandler),
+        (download_urls_pattern, DownloadUrlsHandler),
         (upload_pattern, UploadHandler),
+        (upload_directory_pattern, UploadDirectoryHandler),
         (local_upload_pattern, LocalUploadHandler),
+        (local_upload_batch_pattern, LocalUploadBatchHandler),
+        (multipart_upload_pattern, MultipartUploadHandler),
+        (sync_pattern, SyncHandler),
         (objects_handler, ObjectsHandler),
+        (bulk_delete_pattern, BulkDeleteHandler),
         (rename_handler_pattern, RenameHandler),
-        (guess_bucket_pattern, GuessBucketHandler)
+        (guess_bucket_pattern, GuessBucketHandler),
+        (download_cache_pattern, DownloadCacheHandler),
+        (jobs_pattern, JobsHandler),
+        (token_pattern, TokenHandler),
+        (buckets_list_cache_pattern, BucketListCacheHandler),
+        (metrics_pattern, MetricsHandler)
     ]
     web_app.add_handlers(host_pattern, handlers)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from tvb_ext_bucket.ebrains_drive_wrapper import BucketWrapper
+from tvb_ext_bucket.exceptions import TransferCancelled
+from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.metrics import count_error
+from tvb_ext_bucket.tracing import TRACER
+from tvb_ext_bucket.transfers import cancellable
+
+LOGGER = get_logger(__name__)
+
+# file where the jobs are persisted, so queued jobs survive a restart of the server
+JOBS_FILE = os.getenv('TVB_EXT_BUCKET_JOBS_FILE',
+                      os.path.join(os.path.expanduser('~'), '.cache', 'tvb_ext_bucket', 'jobs.json'))
+# max number of jobs running at the same time, for all the users
+JOB_WORKERS = int(os.getenv('TVB_EXT_BUCKET_JOB_WORKERS', 4))
+# max number of jobs of a user running at the same time
+JOB_WORKERS_PER_USER = int(os.getenv('TVB_EXT_BUCKET_JOB_WORKERS_PER_USER', 2))
+# number of finished jobs kept for their status
+JOB_HISTORY_SIZE = int(os.getenv('TVB_EXT_BUCKET_JOB_HISTORY_SIZE', 100))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# kinds of jobs: the BucketWrapper method running them, its positional arguments and keyword options
+# (as job params), the default priority and the options added when a job interrupted by a restart runs
+# again. Jobs with lower priority values run first, so interactive transfers of a file go ahead of bulk
+# transfers and syncs.
+JOB_KINDS = {
+    'download': {
+        'method': 'download_file',
+        'args': ('file', 'bucket', 'download_destination'),
+        'options': (),
+        'priority': 0,
+        'resume_options': {'skip_complete': True}
+    },
+    'upload': {
+        'method': 'upload_file_to',
+        'args': ('source_file', 'bucket', 'destination', 'filename'),
+        'options': (),
+        'priority': 0
+    },
+    'download_prefix': {
+        'method': 'download_prefix',
+        'args': ('prefix', 'bucket', 'download_destination'),
+        'options': (),
+        'priority': 10,
+        'resume_options': {'skip_complete': True}
+    },
+    'upload_directory': {
+        'method': 'upload_directory',
+        'args': ('source_dir', 'bucket', 'destination'),
+        'options': (),
+        'priority': 10
+    },
+    'sync': {
+        'method': 'sync_directory',
+        'args': ('local_dir', 'bucket', 'prefix'),
+        'options': ('direction', 'dry_run', 'delete_extraneous', 'conflict'),
+        'priority': 20
+    }
+}
+
+
+class Job:
+    """
+    Transfer run in the background by the JobQueue, with its state and outcome
+    """
+    FIELDS = ('id', 'kind', 'params', 'user', 'priority', 'state', 'created_at', 'started_at', 'finished_at',
+              'cancel_requested', 'message', 'result', 'restarts')
+
+    def __init__(self, kind, params, user, priority, job_id=None, state=QUEUED, created_at=None, started_at=None,
+                 finished_at=None, cancel_requested=False, message='', result=None, restarts=0):
+        # type: (str, Dict[str, Any], str, int, str, str, float, float, float, bool, str, Any, int) -> None
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.user = user
+        self.priority = priority
+        self.state = state
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.cancel_requested = cancel_requested
+        self.message = message
+        self.result = result
+        # times the job was interrupted by a restart of the server while running
+        self.restarts = restarts
+
+    @property
+    def finished(self):
+        # type: () -> bool
+        return self.state in FINISHED_STATES
+
+    def to_json(self):
+        # type: () -> Dict[str, Any]
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_json(cls, data):
+        # type: (Dict[str, Any]) -> Job
+        data = dict(data)
+        return cls(job_id=data.pop('id'), **data)
+
+
+class JobQueue:
+    """
+    Persistent queue of transfers run in the background, independently of the requests which enqueued them.
+    Queued jobs start by priority, then by age, while fewer than <workers> jobs run in total and fewer than
+    <workers_per_user> jobs of the same user run. Every change of state is written to <path>; jobs which
+    were queued or running when the server stopped are queued again when it starts.
+    """
+
+    def __init__(self, path=JOBS_FILE, workers=JOB_WORKERS, workers_per_user=JOB_WORKERS_PER_USER,
+                 history_size=JOB_HISTORY_SIZE):
+        self.path = path
+        self.workers = workers
+        self.workers_per_user = workers_per_user
+        self.history_size = history_size
+        self._jobs = OrderedDict()  # type: OrderedDict[str, Job]
+        self._cancel_events = dict()  # type: Dict[str, threading.Event]
+        self._pool = None  # type: Optional[ThreadPoolExecutor]
+        self._lock = threading.Lock()
+
+    def start(self):
+        # type: () -> None
+        """
+        Load the persisted jobs and start the queued ones, does nothing if the queue is already started
+        """
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._load()
+            self._pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='tvb_ext_bucket_job')
+        self._dispatch()
+
+    def _load(self):
+        # type: () -> None
+        """
+        Read the persisted jobs. Must be called with the lock held
+        """
+        try:
+            with open(self.path) as f:
+                jobs = [Job.from_json(data) for data in json.load(f)]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            LOGGER.warning(f'Ignoring unreadable jobs file {self.path}: {e}')
+            return
+        for job in jobs:
+            if job.state == RUNNING:
+                # interrupted by the restart, downloads resume from their partial files and keep the files
+                # completed by the previous run
+                job.state = QUEUED
+                job.started_at = None
+                job.restarts += 1
+            if job.state == QUEUED and job.cancel_requested:
+                job.state = CANCELLED
+                job.finished_at = time.time()
+            self._jobs[job.id] = job
+        LOGGER.info(f'Loaded {len(jobs)} jobs from {self.path}')
+
+    def _save(self):
+        # type: () -> None
+        """
+        Persist the jobs. Must be called with the lock held
+        """
+        temp_path = f'{self.path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump([job.to_json() for job in self._jobs.values()], f)
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            LOGGER.error(f'Could not persist the jobs to {self.path}: {e}')
+
+    def enqueue(self, kind, params, user, priority=None):
+        # type: (str, Dict[str, Any], str, Optional[int]) -> Job
+        """
+        Queue a job of <kind> (one of JOB_KINDS) for <user>. <params> must hold the arguments of the kind,
+        <priority> overrides the default priority of the kind.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind {kind}, expected one of {", ".join(JOB_KINDS)}!')
+        if not isinstance(params, dict):
+            raise ValueError(f'The params of a {kind} job must be an object!')
+        job_kind = JOB_KINDS[kind]
+        missing = [arg for arg in job_kind['args'] if arg not in params]
+        if missing:
+            raise ValueError(f'Missing {", ".join(missing)} in the params of a {kind} job!')
+        params = {key: value for key, value in params.items() if key in job_kind['args'] + job_kind['options']}
+        try:
+            priority = job_kind['priority'] if priority is None else int(priority)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f'Invalid priority {priority}, expected a number!')
+        job = Job(kind, params, user, priority)
+        self.start()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._save()
+        LOGGER.info(f'Queued {kind} job {job.id} of user {user} with priority {job.priority}')
+        self._dispatch()
+        return job
+
+    def get(self, job_id, user=None):
+        # type: (str, Optional[str]) -> Optional[Job]
+        """
+        Get the job with <job_id>, None if there is no such job or it belongs to another user than <user>
+        """
+        with self._lock:
+            return self._get(job_id, user)
+
+    def _get(self, job_id, user=None):
+        # type: (str, Optional[str]) -> Optional[Job]
+        """
+        Same as get. Must be called with the lock held
+        """
+        job = self._jobs.get(job_id)
+        if job is None or (user is not None and job.user != user):
+            return None
+        return job
+
+    def list(self, user=None):
+        # type: (Optional[str]) -> List[Job]
+        """
+        List the jobs of <user> (or of all the users), oldest first
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if user is None or job.user == user]
+
+    def cancel(self, job_id, user=None):
+        # type: (str, Optional[str]) -> Optional[Job]
+        """
+        Cancel a job: a queued job is dropped from the queue, a running bulk transfer skips the files not
+        started yet and stops once the files in progress are done. A running job ends as cancelled only if the
+        cancellation skipped some of its files. Returns None if there is no such job.
+        """
+        with self._lock:
+            job = self._get(job_id, user)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested = True
+            if job.state == QUEUED:
+                job.state = CANCELLED
+                job.finished_at = time.time()
+                self._trim_history()
+            else:
+                self._cancel_events[job.id].set()
+            self._save()
+        LOGGER.info(f'Cancelled job {job_id}')
+        return job
+
+    def _dispatch(self):
+        # type: () -> None
+        """
+        Start the queued jobs allowed to run by the concurrency limits, by priority then by age
+        """
+        with self._lock:
+            if self._pool is None:
+                return
+            running = [job for job in self._jobs.values() if job.state == RUNNING]
+            per_user = dict()  # type: Dict[str, int]
+            for job in running:
+                per_user[job.user] = per_user.get(job.user, 0) + 1
+            queued = sorted((job for job in self._jobs.values() if job.state == QUEUED),
+                            key=lambda job: (job.priority, job.created_at))
+            started = []
+            for job in queued:
+                if len(running) + len(started) >= self.workers:
+                    break
+                if per_user.get(job.user, 0) >= self.workers_per_user:
+                    continue
+                per_user[job.user] = per_user.get(job.user, 0) + 1
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._cancel_events[job.id] = threading.Event()
+                started.append(job)
+            if started:
+                self._save()
+        for job in started:
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        # type: (Job) -> None
+        LOGGER.info(f'Running {job.kind} job {job.id}')
+        job_kind = JOB_KINDS[job.kind]
+        try:
+            with cancellable(self._cancel_events[job.id]), TRACER.trace(f'job.{job.kind}', job=job.id):
+                wrapper = BucketWrapper()
+                args = [job.params[arg] for arg in job_kind['args']]
+                options = {option: job.params[option] for option in job_kind['options'] if option in job.params}
+                if job.restarts:
+                    options.update(job_kind.get('resume_options', {}))
+                result = getattr(wrapper, job_kind['method'])(*args, **options)
+            success = result['success'] if isinstance(result, dict) else bool(result)
+            message = result.get('message', '') if isinstance(result, dict) else ''
+            # a cancellation coming after the last transfer started skips nothing, the job completed
+            cancelled = isinstance(result, dict) and result.get('cancelled', 0) > 0
+        except TransferCancelled as e:
+            result, success, message, cancelled = None, False, str(e), True
+        except Exception as e:
+            LOGGER.error(f'{job.kind} job {job.id} failed: {e}')
+            count_error(e)
+            result, success, message, cancelled = None, False, str(e), False
+
+        with self._lock:
+            job.result = result
+            job.message = message
+            job.state = CANCELLED if cancelled else SUCCEEDED if success else FAILED
+            job.finished_at = time.time()
+            self._cancel_events.pop(job.id, None)
+            self._trim_history()
+            self._save()
+        LOGGER.info(f'{job.kind} job {job.id} {job.state}')
+        self._dispatch()
+
+    def _trim_history(self):
+        # type: () -> None
+        """
+        Forget the oldest finished jobs past the history size. Must be called with the lock held
+        """
+        finished = [job for job in self._jobs.values() if job.finished]
+        finished.sort(key=lambda job: job.finished_at or 0)
+        for job in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job.id]
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """
+        Stop starting jobs, the running jobs are completed if <wait>
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+JOB_QUEUE = JobQueue()
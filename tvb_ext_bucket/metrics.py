@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# upper bounds (in bytes per second) of the buckets of the throughput histograms
+THROUGHPUT_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value):
+    # type: (float) -> str
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names, values):
+    # type: (Iterable[str], Iterable[str]) -> str
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """
+    Monotonic count, one per combination of the values of <label_names>
+    """
+    TYPE = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        # type: (str, str, Labels) -> None
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = dict()  # type: Dict[Labels, float]
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        # type: (str, float) -> None
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        # type: (str) -> float
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        # type: () -> List[str]
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}'
+                for labels, value in values]
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, one per combination of the values of <label_names>
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        # type: (str, str, Labels, Tuple[float, ...]) -> None
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (math.inf,)
+        # per labels: observations count of each bucket (not cumulative), sum of the observed values
+        self._values = dict()  # type: Dict[Labels, Tuple[List[int], List[float]]]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # type: (float, str) -> None
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * len(self.buckets), [0.0])
+            counts, total = entry
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, *labels):
+        # type: (str) -> int
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry is not None else 0
+
+    def samples(self):
+        # type: () -> List[str]
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        samples = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names + ('le',), labels + (_format_value(bound),))
+                samples.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            samples.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}')
+            samples.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}')
+        return samples
+
+
+class Collected:
+    """
+    Metric whose values are read from <collect> when the metrics are exported, for the statistics kept
+    by other components (e.g. the hits of the caches), so they cost nothing until they are scraped
+    """
+
+    def __init__(self, name, documentation, metric_type, label_names, collect):
+        # type: (str, str, str, Labels, Callable[[], Iterable[Tuple[Labels, float]]]) -> None
+        self.name = name
+        self.documentation = documentation
+        self.TYPE = metric_type
+        self.label_names = label_names
+        self._collect = collect
+
+    def samples(self):
+        # type: () -> List[str]
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}'
+                for labels, value in self._collect()]
+
+
+class MetricsRegistry:
+    """
+    Metrics of the extension, exported in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics = []  # type: List
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        # type: (str, str, Labels) -> Counter
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        # type: (str, str, Labels, Tuple[float, ...]) -> Histogram
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def collected(self, name, documentation, metric_type, label_names, collect):
+        # type: (str, str, str, Labels, Callable[[], Iterable[Tuple[Labels, float]]]) -> Collected
+        return self._register(Collected(name, documentation, metric_type, label_names, collect))
+
+    def render(self):
+        # type: () -> str
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+HANDLER_REQUESTS = METRICS.counter('tvb_ext_bucket_handler_requests_total',
+                                   'Requests served by the handlers of the extension',
+                                   ('handler', 'method', 'status'))
+HANDLER_LATENCY = METRICS.histogram('tvb_ext_bucket_handler_latency_seconds',
+                                    'Time spent serving the requests, by handler',
+                                    ('handler', 'method'))
+UPSTREAM_CALLS = METRICS.counter('tvb_ext_bucket_upstream_calls_total',
+                                 'Calls to the data proxy api and to the object storage, by endpoint and outcome '
+                                 '(http status, exception type or circuit_open)',
+                                 ('endpoint', 'outcome'))
+UPSTREAM_LATENCY = METRICS.histogram('tvb_ext_bucket_upstream_latency_seconds',
+                                     'Time until the response headers of the calls to the data proxy api and to '
+                                     'the object storage, by endpoint',
+                                     ('endpoint',))
+TRANSFER_BYTES = METRICS.counter('tvb_ext_bucket_transfer_bytes_total',
+                                 'Bytes of the files downloaded and uploaded, by direction and source '
+                                 '(storage or local cache)',
+                                 ('direction', 'source'))
+TRANSFER_DURATION = METRICS.histogram('tvb_ext_bucket_transfer_duration_seconds',
+                                      'Time spent transferring a file, by direction and source',
+                                      ('direction', 'source'))
+TRANSFER_THROUGHPUT = METRICS.histogram('tvb_ext_bucket_transfer_throughput_bytes_per_second',
+                                        'Throughput of the transfers of a file, by direction and source',
+                                        ('direction', 'source'), buckets=THROUGHPUT_BUCKETS)
+ERRORS = METRICS.counter('tvb_ext_bucket_errors_total',
+                         'Errors raised while serving the requests and running the jobs, by exception type',
+                         ('type',))
+
+
+def observe_transfer(direction, source, size, seconds):
+    # type: (str, str, int, float) -> None
+    """
+    Record the transfer of a file of <size> bytes which took <seconds>
+    """
+    TRANSFER_BYTES.inc(direction, source, amount=size)
+    TRANSFER_DURATION.observe(seconds, direction, source)
+    if seconds > 0:
+        TRANSFER_THROUGHPUT.observe(size / seconds, direction, source)
+
+
+def count_error(error):
+    # type: (BaseException) -> None
+    ERRORS.inc(type(error).__name__)
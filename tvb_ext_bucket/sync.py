@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tvb_ext_bucket.bucket_api.checksum import ObjectHash, hash_file, parts_count
+from tvb_ext_bucket.bucket_api.download_state import DownloadState
+from tvb_ext_bucket.bucket_api.multipart import MULTIPART_PART_SIZE
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# 'upload' mirrors the local directory to the bucket, 'download' mirrors the bucket to the local directory,
+# 'both' copies new and changed files in both directions
+SYNC_DIRECTIONS = ('upload', 'download', 'both')
+# how a file changed on both sides is resolved in a two-way sync: keep the most recently modified
+# version, always keep the local one, always keep the remote one, or leave both untouched
+CONFLICT_POLICIES = ('newer', 'local', 'remote', 'skip')
+# seconds two modification times can differ and still be considered the same (coarse file system timestamps)
+MTIME_TOLERANCE = 1.0
+# max number of local file hashes remembered between syncs, keyed by path, size and modification time
+SYNC_HASH_CACHE_SIZE = int(os.getenv('TVB_EXT_BUCKET_SYNC_HASH_CACHE_SIZE', 10000))
+
+# (hash function, path, size, mtime, parts count of the remote hash) -> hash of the local file
+_HASHES = OrderedDict()  # type: OrderedDict[Tuple[Callable, str, int, float, Optional[int]], Optional[str]]
+_HASHES_LOCK = threading.Lock()
+
+
+def is_partial_download(file_name):
+    # type: (str) -> bool
+    """
+    Check if <file_name> is one of the hidden files of a download in progress
+    """
+    return file_name.startswith('.') and (file_name.endswith('.part') or
+                                          file_name.endswith('.part' + DownloadState.SUFFIX))
+
+
+def list_local(local_dir):
+    # type: (str) -> Dict[str, Dict[str, Any]]
+    """
+    List the files under <local_dir> as relative path (with '/' separators) -> {'path', 'bytes', 'mtime'}
+    """
+    files = dict()
+    for dir_path, _, file_names in os.walk(local_dir):
+        for file_name in file_names:
+            if is_partial_download(file_name):
+                continue
+            path = os.path.join(dir_path, file_name)
+            stat = os.stat(path)
+            relative_path = os.path.relpath(path, local_dir).replace(os.sep, '/')
+            files[relative_path] = {'path': path, 'bytes': stat.st_size, 'mtime': stat.st_mtime}
+    return files
+
+
+def parse_last_modified(last_modified):
+    # type: (Optional[str]) -> Optional[float]
+    """
+    Timestamp of the last_modified date of an object, which the api sends as an ISO date in UTC
+    """
+    if not last_modified:
+        return None
+    try:
+        date = datetime.fromisoformat(last_modified.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def local_hash(path, remote_hash, part_size=MULTIPART_PART_SIZE):
+    # type: (str, str, int) -> Optional[str]
+    """
+    Hash <path> the way the storage hashed the object with <remote_hash>: the md5 of the file, or for
+    multipart uploads (<md5 of the parts md5s>-<parts count>) the same composite hash computed with
+    <part_size> parts. Returns None if the hash can't be reproduced (e.g. another part size was used).
+    """
+    if not remote_hash:
+        return None
+    object_hash = ObjectHash.like(remote_hash, part_size)
+    count = parts_count(remote_hash)
+    if '-' in remote_hash and count != -(-os.path.getsize(path) // part_size):
+        return None
+    hash_file(path, object_hash)
+    return object_hash.hexdigest()
+
+
+def cached_local_hash(local, remote_hash, hash_of=local_hash):
+    # type: (Dict[str, Any], str, Callable[[str, str], Optional[str]]) -> Optional[str]
+    """
+    Hash the <local> file like <remote_hash> with <hash_of>, reusing the hash of a previous sync while the
+    size and the modification time of the file are unchanged
+    """
+    key = (hash_of, local['path'], local['bytes'], local['mtime'], parts_count(remote_hash))
+    with _HASHES_LOCK:
+        if key in _HASHES:
+            _HASHES.move_to_end(key)
+            return _HASHES[key]
+    digest = hash_of(local['path'], remote_hash)
+    with _HASHES_LOCK:
+        _HASHES[key] = digest
+        while len(_HASHES) > SYNC_HASH_CACHE_SIZE:
+            _HASHES.popitem(last=False)
+    return digest
+
+
+def is_same_file(local, remote, hash_of=local_hash):
+    # type: (Dict[str, Any], Dict[str, Any], Callable[[str, str], Optional[str]]) -> bool
+    """
+    Compare a local file with an object of the bucket: sizes first, then modification times (downloads get the
+    last_modified date of their object, so matching ones need no hashing), then hashes. When the hash of the
+    object is not known or can't be reproduced locally, a local file modified after the object was written
+    is considered changed.
+    """
+    if local['bytes'] != remote['bytes']:
+        return False
+    remote_mtime = parse_last_modified(remote['last_modified'])
+    if remote_mtime is not None and abs(local['mtime'] - remote_mtime) <= MTIME_TOLERANCE:
+        return True
+    digest = cached_local_hash(local, remote['hash'], hash_of) if remote['hash'] else None
+    if digest is not None:
+        return digest == remote['hash']
+    return remote_mtime is None or local['mtime'] <= remote_mtime
+
+
+def plan_sync(local_files, remote_files, direction='both', delete_extraneous=False, conflict='newer',
+              hash_of=local_hash):
+    # type: (Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]], str, bool, str, Callable) -> List[Dict[str, str]]
+    """
+    Diff the files of a local directory with the objects under a bucket prefix, both keyed by relative path,
+    and list the actions bringing them in sync.
+    ----------
+    :direction: one of SYNC_DIRECTIONS
+    :delete_extraneous: in a one way sync, delete the files missing from the source side
+    :conflict: one of CONFLICT_POLICIES, applies to files which differ in a two-way sync
+    -------
+    :return: list of {'path', 'action', 'reason'} sorted by path, action being one of
+    'upload', 'download', 'delete_local', 'delete_remote' or 'conflict' (left untouched)
+    """
+    if direction not in SYNC_DIRECTIONS:
+        raise ValueError(f'Unknown sync direction {direction}, expected one of {", ".join(SYNC_DIRECTIONS)}!')
+    if conflict not in CONFLICT_POLICIES:
+        raise ValueError(f'Unknown conflict policy {conflict}, expected one of {", ".join(CONFLICT_POLICIES)}!')
+
+    actions = []
+    for path in sorted(set(local_files) | set(remote_files)):
+        local, remote = local_files.get(path), remote_files.get(path)
+        if remote is None:
+            if direction != 'download':
+                actions.append({'path': path, 'action': 'upload', 'reason': 'missing from the bucket'})
+            elif delete_extraneous:
+                actions.append({'path': path, 'action': 'delete_local', 'reason': 'missing from the bucket'})
+        elif local is None:
+            if direction != 'upload':
+                actions.append({'path': path, 'action': 'download', 'reason': 'missing locally'})
+            elif delete_extraneous:
+                actions.append({'path': path, 'action': 'delete_remote', 'reason': 'missing locally'})
+        elif not is_same_file(local, remote, hash_of):
+            if direction != 'both':
+                actions.append({'path': path, 'action': direction, 'reason': 'changed'})
+            else:
+                actions.append({'path': path, 'action': _resolve_conflict(local, remote, conflict),
+                                'reason': f'changed on both sides, resolved by policy {conflict}'})
+    return actions
+
+
+def _resolve_conflict(local, remote, conflict):
+    # type: (Dict[str, Any], Dict[str, Any], str) -> str
+    if conflict == 'local':
+        return 'upload'
+    if conflict == 'remote':
+        return 'download'
+    remote_mtime = parse_last_modified(remote['last_modified'])
+    if conflict == 'skip' or remote_mtime is None or remote_mtime == local['mtime']:
+        return 'conflict'
+    return 'upload' if local['mtime'] > remote_mtime else 'download'
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from ebrains_drive.exceptions import ClientHttpError
+
+from tvb_ext_bucket.bucket_api.bucket_list_cache import BucketListCache
+
+
+class MockListBuckets:
+    def __init__(self, *listings):
+        self.listings = list(listings)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        listing = self.listings[min(self.calls, len(self.listings)) - 1]
+        if isinstance(listing, Exception):
+            raise listing
+        return listing
+
+
+def wait_refreshed(cache):
+    deadline = time.time() + 5
+    while cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_fresh_listing_is_served_from_cache():
+    cache = BucketListCache(ttl=60)
+    list_buckets = MockListBuckets(['a'])
+    assert cache.get('user', list_buckets) == ['a']
+    assert cache.get('user', list_buckets) == ['a']
+    assert list_buckets.calls == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_stale_listing_is_refreshed_in_background():
+    cache = BucketListCache(ttl=60)
+    list_buckets = MockListBuckets(['a'], ['a', 'b'])
+    cache.get('user', list_buckets)
+    cache._listings['user'] = (['a'], time.time() - 120)
+    assert cache.get('user', list_buckets) == ['a']
+    wait_refreshed(cache)
+    assert cache.get('user', list_buckets) == ['a', 'b']
+    assert list_buckets.calls == 2
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_unauthorized_refresh_invalidates_listing():
+    cache = BucketListCache(ttl=60)
+    list_buckets = MockListBuckets(['a'], ClientHttpError(403, 'Forbidden'), ['b'])
+    cache.get('user', list_buckets)
+    cache._listings['user'] = (['a'], time.time() - 120)
+    cache.get('user', list_buckets)
+    wait_refreshed(cache)
+    assert len(cache) == 0
+    assert cache.stats()['invalidations'] == 1
+    assert cache.get('user', list_buckets) == ['b']
+
+
+def test_transient_refresh_failure_keeps_listing():
+    cache = BucketListCache(ttl=60)
+    list_buckets = MockListBuckets(['a'], ClientHttpError(503, 'Unavailable'))
+    cache.get('user', list_buckets)
+    cache._listings['user'] = (['a'], time.time() - 120)
+    cache.get('user', list_buckets)
+    wait_refreshed(cache)
+    assert len(cache) == 1
+
+
+def test_unauthorized_listing_is_raised():
+    cache = BucketListCache(ttl=60)
+    with pytest.raises(ClientHttpError):
+        cache.get('user', MockListBuckets(ClientHttpError(401, 'Unauthorized')))
+    assert len(cache) == 0
+
+
+def test_disabled_cache():
+    cache = BucketListCache(ttl=0)
+    list_buckets = MockListBuckets(['a'])
+    cache.get('user', list_buckets)
+    cache.get('user', list_buckets)
+    assert list_buckets.calls == 2
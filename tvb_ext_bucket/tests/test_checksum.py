@@ -0,0 +1,57 @@
+import hashlib
+
+from tvb_ext_bucket.bucket_api.checksum import ObjectHash, RangeHash, HashingReader, composite_hash, verify, \
+    VERIFIED, UNVERIFIED, MISMATCH
+
+CONTENT = b'0123456789'
+MD5 = hashlib.md5(CONTENT).hexdigest()
+MULTIPART_HASH = composite_hash([hashlib.md5(part).digest() for part in [b'0123', b'4567', b'89']])
+
+
+def test_object_hash_in_chunks():
+    plain, multipart = ObjectHash(), ObjectHash(part_size=4)
+    for chunk in [b'012', b'34567', b'', b'89']:
+        plain.update(chunk)
+        multipart.update(chunk)
+    assert plain.hexdigest() == MD5
+    assert multipart.hexdigest() == MULTIPART_HASH
+    assert MULTIPART_HASH.endswith('-3')
+    assert ObjectHash.like(MULTIPART_HASH, part_size=4).part_size == 4
+    assert ObjectHash.like(MD5).part_size is None
+
+
+def test_verify():
+    assert verify(MD5, 10, MD5, 10) == VERIFIED
+    assert verify(MD5, 10, f'"{MD5}"') == VERIFIED
+    assert verify(MD5, 10, 'other', 10) == MISMATCH
+    assert verify(MD5, 9, MD5, 10) == MISMATCH
+    assert verify(MD5, 10, None, 10) == UNVERIFIED
+    # the object was uploaded in parts of another size
+    assert verify(MULTIPART_HASH, 10, 'other-2', 10) == UNVERIFIED
+    assert verify(MD5, 10, MULTIPART_HASH, 10) == UNVERIFIED
+    # same parts count, but the parts may be of another size
+    assert verify(MULTIPART_HASH, 10, 'other-3', 10) == UNVERIFIED
+    assert verify(MULTIPART_HASH, 10, 'other-3', 10, same_parts=True) == MISMATCH
+    assert verify(MULTIPART_HASH, 10, MULTIPART_HASH, 10) == VERIFIED
+
+
+def test_range_hash_out_of_order(tmp_path):
+    path = tmp_path / 'file'
+    path.write_bytes(CONTENT)
+    object_hash = ObjectHash()
+    range_hash = RangeHash(str(path), object_hash, [(8, 9)])
+    range_hash.add(4, 7)
+    assert object_hash.bytes == 0
+    range_hash.add(0, 3)
+    assert range_hash.position == 10
+    assert object_hash.hexdigest() == MD5
+
+
+def test_hashing_reader(tmp_path):
+    path = tmp_path / 'file'
+    path.write_bytes(CONTENT)
+    object_hash = ObjectHash(part_size=4)
+    with HashingReader(str(path), object_hash) as f:
+        while f.read(3):
+            pass
+    assert object_hash.verify(MULTIPART_HASH, 10) == VERIFIED
@@ -0,0 +1,70 @@
+import base64
+import json
+import time
+
+from tvb_ext_bucket.client_registry import ClientRegistry, get_token_claims, get_user_key
+
+
+class MockClient:
+    def __init__(self, token=''):
+        self.token = token
+
+
+def make_token(**claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode('utf-8')).decode('utf-8').rstrip('=')
+    return f'header.{payload}.signature'
+
+
+def test_get_token_claims():
+    token = make_token(preferred_username='user', exp=123)
+    assert get_token_claims(token) == {'preferred_username': 'user', 'exp': 123}
+    assert get_token_claims('not a jwt') == {}
+
+
+
+def test_get_user_key():
+    assert get_user_key(make_token(preferred_username='user')) == 'user'
+    # tokens naming no user are told apart, without keeping the token itself
+    first, second = get_user_key(make_token(exp=1)), get_user_key('not a jwt')
+    assert first != second
+    assert first.startswith('token-') and 'jwt' not in second
+
+def test_client_is_reused_for_same_token():
+    registry = ClientRegistry(client_factory=MockClient)
+    token = make_token(preferred_username='user', exp=time.time() + 100)
+    client = registry.get_client(token)
+    assert registry.get_client(token) is client
+    assert len(registry) == 1
+
+
+def test_client_is_rebuilt_after_ttl():
+    registry = ClientRegistry(ttl=-1, client_factory=MockClient)
+    token = make_token(preferred_username='user')
+    client = registry.get_client(token)
+    assert registry.get_client(token) is not client
+
+
+def test_client_is_rebuilt_when_token_expired():
+    registry = ClientRegistry(client_factory=MockClient)
+    token = make_token(preferred_username='user', exp=time.time() - 1)
+    client = registry.get_client(token)
+    assert registry.get_client(token) is not client
+
+
+def test_lru_eviction():
+    registry = ClientRegistry(max_size=2, client_factory=MockClient)
+    first = registry.get_client(make_token(preferred_username='first'))
+    registry.get_client(make_token(preferred_username='second'))
+    registry.get_client(make_token(preferred_username='first'))
+    registry.get_client(make_token(preferred_username='third'))
+    assert len(registry) == 2
+    assert registry.get_client(make_token(preferred_username='first')) is first
+
+
+def test_invalidate():
+    registry = ClientRegistry(client_factory=MockClient)
+    token = make_token(preferred_username='user')
+    client = registry.get_client(token)
+    registry.invalidate(client)
+    assert len(registry) == 0
+    assert registry.get_client(token) is not client
@@ -1,6 +1,8 @@
 import pytest
 from requests import Response
-from tvb_ext_bucket.bucket_api.dataproxy_file import DataproxyFile
+from tvb_ext_bucket.bucket_api.dataproxy_file import DataproxyFile, split_ranges
+from tvb_ext_bucket.bucket_api.link_cache import DOWNLOAD_LINK_CACHE
+from tvb_ext_bucket.exceptions import DataproxyTransferError
 from tvb_ext_bucket.tests.test_drive_wrapper import MockBucket
 
 
@@ -97,6 +99,99 @@ def test_get_content(mocker):
     assert dp_file.get_content() == smiley_face
 
 
+def test_stream(mocker):
+    smiley_face = b'\xF0\x9F\x98\x81'
+
+    def mock_get(_url, stream=False):
+        assert stream
+        resp = Response()
+        resp.status_code = 200
+        resp._content = smiley_face
+        resp._content_consumed = True
+        return resp
+    mocker.patch('requests.get', mock_get)
+    fake_client = MockClient()
+    fake_bucket = MockBucket()
+    dp_file = DataproxyFile.from_json(fake_client, fake_bucket, JSON_DATA)
+    assert list(dp_file.stream(chunk_size=2)) == [smiley_face[:2], smiley_face[2:]]
+
+
+def test_stream_refreshes_rejected_cached_link(mocker):
+    links = iter(['expired_url', 'test_url'])
+    dp_file = DataproxyFile.from_json(MockClient(), MockBucket(), JSON_DATA)
+    mocker.patch.object(DataproxyFile, 'request_download_link', lambda _self: next(links))
+
+    def mock_get(url, stream=False):
+        resp = Response()
+        resp.status_code = 403 if url == 'expired_url' else 200
+        resp._content = b'content'
+        resp._content_consumed = True
+        return resp
+    mocker.patch('requests.get', mock_get)
+    DOWNLOAD_LINK_CACHE.clear()
+    assert dp_file.get_download_link() == 'expired_url'
+    # the cached link is rejected, a new one is requested once
+    assert b''.join(dp_file.stream()) == b'content'
+    assert dp_file.get_download_link() == 'test_url'
+
+
+def test_split_ranges():
+    assert split_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert split_ranges(8, 4) == [(0, 3), (4, 7)]
+    assert split_ranges(0, 4) == []
+
+
+def make_ranged_get(content, rejected_urls=()):
+    def mock_get(url, headers=None, stream=False):
+        resp = Response()
+        resp._content_consumed = True
+        if url in rejected_urls:
+            resp.status_code = 403
+            resp._content = b''
+            return resp
+        start, end = headers['Range'].replace('bytes=', '').split('-')
+        resp.status_code = 206
+        resp._content = content[int(start):int(end) + 1]
+        return resp
+    return mock_get
+
+
+def test_download_ranges(mocker, tmp_path):
+    content = bytes(range(256)) * 4
+    mocker.patch('requests.get', make_ranged_get(content))
+    dp_file = DataproxyFile.from_json(MockClient(), MockBucket(), dict(JSON_DATA, bytes=len(content)))
+    target = tmp_path / 'target'
+    done = []
+    dp_file.download_ranges(str(target), workers=3, segment_size=100,
+                            on_range_done=lambda start, end: done.append((start, end)))
+    assert target.read_bytes() == content
+    assert sorted(done) == split_ranges(len(content), 100)
+
+
+def test_download_ranges_refreshes_expired_link(mocker, tmp_path):
+    content = b'0123456789'
+    links = iter(['expired_url', 'test_url'])
+    dp_file = DataproxyFile.from_json(MockClient(), MockBucket(), dict(JSON_DATA, bytes=len(content)))
+    mocker.patch.object(dp_file, 'get_download_link', lambda: next(links))
+    mocker.patch('requests.get', make_ranged_get(content, rejected_urls=('expired_url',)))
+    target = tmp_path / 'target'
+    dp_file.download_ranges(str(target), workers=1, segment_size=4)
+    assert target.read_bytes() == content
+
+
+def test_download_ranges_fails_when_range_not_supported(mocker, tmp_path):
+    def mock_get(url, headers=None, stream=False):
+        resp = Response()
+        resp.status_code = 200
+        resp._content = b'0123456789'
+        resp._content_consumed = True
+        return resp
+    mocker.patch('requests.get', mock_get)
+    dp_file = DataproxyFile.from_json(MockClient(), MockBucket(), dict(JSON_DATA, bytes=10))
+    with pytest.raises(DataproxyTransferError):
+        dp_file.download_ranges(str(tmp_path / 'target'), workers=2, segment_size=4)
+
+
 def test_delete_file_success():
     fake_client = MockClient()
     fake_bucket = MockBucket()
@@ -0,0 +1,90 @@
+import os
+
+from tvb_ext_bucket.download_cache import DownloadCache
+
+
+def make_file(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_fetch_after_store(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=100, link='copy')
+    assert not cache.fetch('bucket', 'hash', 5, str(tmp_path / 'target'))
+    cache.store('bucket', 'hash', make_file(tmp_path / 'source', b'12345'))
+
+    assert cache.fetch('bucket', 'hash', 5, str(tmp_path / 'target'))
+    assert (tmp_path / 'target').read_bytes() == b'12345'
+    # same content in another bucket is a different entry
+    assert not cache.fetch('other_bucket', 'hash', 5, str(tmp_path / 'target2'))
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['size']) == (1, 2, 1, 5)
+    assert stats['bytes_served'] == 5
+
+
+def test_files_without_hash_are_not_cached(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=100)
+    cache.store('bucket', None, make_file(tmp_path / 'source', b'12345'))
+    assert not cache.fetch('bucket', None, 5, str(tmp_path / 'target'))
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10, link='copy')
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    cache.store('bucket', 'b', make_file(tmp_path / 'b', b'bbbb'))
+    assert cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+    cache.store('bucket', 'c', make_file(tmp_path / 'c', b'cccc'))
+
+    assert cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+    assert not cache.fetch('bucket', 'b', 4, str(tmp_path / 'target'))
+    assert cache.stats()['evictions'] == 1
+    # files larger than the cache are not stored
+    cache.store('bucket', 'd', make_file(tmp_path / 'd', b'd' * 11))
+    assert cache.stats()['size'] == 8
+
+
+def test_entries_are_reloaded_from_disk(tmp_path):
+    DownloadCache(str(tmp_path / 'cache'), max_size=10, link='copy')\
+        .store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10)
+    assert cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+
+
+def test_entry_with_wrong_size_is_dropped(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10)
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    assert not cache.fetch('bucket', 'a', 5, str(tmp_path / 'target'))
+    assert cache.stats()['entries'] == 0
+    assert os.listdir(tmp_path / 'cache') == []
+
+
+def test_hardlink_mode_shares_the_cached_file(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10, link='hardlink')
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    assert cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+    assert os.stat(tmp_path / 'target').st_nlink == 3
+
+
+def test_disabled_cache(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=0)
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    assert not cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+    assert not os.path.exists(tmp_path / 'cache')
+    assert cache.stats()['enabled'] is False
+
+
+def test_download_is_copied_without_reflinks(tmp_path, mocker):
+    mocker.patch('tvb_ext_bucket.download_cache._reflink', side_effect=OSError('not supported'))
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10)
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    assert cache.fetch('bucket', 'a', 4, str(tmp_path / 'target'))
+    assert (tmp_path / 'target').read_bytes() == b'aaaa'
+
+
+def test_reflink_mode_caches_only_reflinked_downloads(tmp_path, mocker):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=10, link='reflink')
+    mocker.patch('tvb_ext_bucket.download_cache._reflink', side_effect=OSError('not supported'))
+    cache.store('bucket', 'a', make_file(tmp_path / 'a', b'aaaa'))
+    assert cache.stats()['entries'] == 0
+    assert os.listdir(tmp_path / 'cache') == []
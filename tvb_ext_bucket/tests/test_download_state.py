@@ -0,0 +1,37 @@
+from tvb_ext_bucket.bucket_api.download_state import DownloadState
+from tvb_ext_bucket.tests.test_drive_wrapper import MockFile
+
+
+def test_missing_ranges_of_new_state(tmp_path):
+    state = DownloadState(str(tmp_path / 'state.json'), 'hash', 'date', 10)
+    assert state.missing_ranges(4) == [(0, 3), (4, 7), (8, 9)]
+
+
+def test_missing_ranges_skips_completed(tmp_path):
+    state = DownloadState(str(tmp_path / 'state.json'), 'hash', 'date', 20, ranges=[(4, 7), (0, 3), (12, 15)])
+    assert state.missing_ranges(3) == [(8, 10), (11, 11), (16, 18), (19, 19)]
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'state.json')
+    state = DownloadState(path, 'hash', 'date', 10)
+    state.add_range(0, 4)
+    loaded = DownloadState.load(path)
+    assert loaded.ranges == [(0, 4)]
+    assert loaded.missing_ranges(10) == [(5, 9)]
+    loaded.remove()
+    assert DownloadState.load(path) is None
+
+
+def test_load_corrupted_state(tmp_path):
+    path = tmp_path / 'state.json'
+    path.write_text('{"hash": ')
+    assert DownloadState.load(str(path)) is None
+
+
+def test_matches():
+    dp_file = MockFile('file')
+    state = DownloadState.for_file('state.json', dp_file)
+    assert state.matches(dp_file)
+    dp_file.hash = 'changed'
+    assert not state.matches(dp_file)
@@ -4,22 +4,43 @@
 #
 # (c) 2022-2023, TVB Widgets Team
 #
+import hashlib
+import json
 import os
 import uuid
 import tempfile
 import shutil
+import threading
 
 import pytest
-
+from requests import Response
+
+from tvb_ext_bucket.bucket_api.bucket_list_cache import BUCKET_LIST_CACHE
+from tvb_ext_bucket.bucket_api.buckets import BucketDTO
+from tvb_ext_bucket.bucket_api.download_state import DownloadState
+from tvb_ext_bucket.bucket_api.link_cache import DOWNLOAD_LINK_CACHE
+from tvb_ext_bucket.bucket_api.listing import list_directory
+from tvb_ext_bucket.bucket_api.object_index import OBJECT_INDEX, ObjectIndex, file_metadata
+from tvb_ext_bucket.bucket_api.resilience import CIRCUIT_BREAKERS
+from tvb_ext_bucket.download_cache import DownloadCache
 from tvb_ext_bucket.ebrains_drive_wrapper import BucketWrapper
-from tvb_ext_bucket.exceptions import CollabAccessError, DataproxyFileNotFound
-from ebrains_drive.exceptions import Unauthorized
+from tvb_ext_bucket.exceptions import CollabAccessError, DataproxyFileNotFound, DataproxyTransferError, \
+    DataproxyIntegrityError
+from ebrains_drive.exceptions import Unauthorized, ClientHttpError
 
 
 class MockFile:
-    def __init__(self, name):
-        # type: (str) -> None
+    # md5 of b'test content', the content served by mock_requests_get
+    HASH = '9473fdd0d880a43c21b7778d34872157'
+    LAST_MODIFIED = '2023-01-11T08:27:45.613660'
+
+    def __init__(self, name, content=None):
+        # type: (str, bytes) -> None
         self.name = name
+        self.hash = self.HASH if content is None else hashlib.md5(content).hexdigest()
+        self.last_modified = self.LAST_MODIFIED
+        self.bytes = len(b'test content' if content is None else content)
+        self.content_type = 'text/plain'
 
     def get_content(self):
         return b'test content'
@@ -28,20 +49,78 @@ class MockFile:
         return f'{self.name}'
 
 
+class MockDataproxyClient:
+    """
+    Mock for the api client used by DataproxyFile instances. Download links are the file paths.
+    """
+    def __init__(self, bucket=None, supports_copy=True):
+        self.bucket = bucket
+        self.supports_copy = supports_copy
+
+    def put(self, url, params=None):
+        resp = Response()
+        if url.endswith('/copy'):
+            if not self.supports_copy:
+                raise ClientHttpError(404, 'Not found')
+            self.bucket.files.append(MockFile(params['name']))
+            resp._content = b'{}'
+            return resp
+        resp._content = b'{"url": "fake_upload_url"}'
+        return resp
+
+    def get(self, url, params=None):
+        resp = Response()
+        if params and 'delimiter' in params:
+            resp._content = json.dumps({'objects': self._list(**params)}).encode('utf-8')
+            return resp
+        resp._content = ('{"url": "%s"}' % url.split('/', 4)[-1]).encode('utf-8')
+        return resp
+
+    def _list(self, prefix, delimiter, limit, marker):
+        """
+        listing grouped by delimiter, as done by the storage
+        """
+        prefix = prefix or ''
+        entries = dict()
+        for f in sorted(self.bucket.files, key=lambda f: f.name):
+            if not f.name.startswith(prefix):
+                continue
+            relative_name = f.name[len(prefix):]
+            if delimiter in relative_name:
+                subdir = prefix + relative_name.split(delimiter)[0] + delimiter
+                entries[subdir] = {'subdir': subdir}
+            else:
+                entries[f.name] = file_metadata(f)
+        return [entry for name, entry in sorted(entries.items()) if marker is None or name > marker][:limit]
+
+    def delete(self, url):
+        resp = Response()
+        resp._content = b'{"detail":"Object deleted","status_code":200}'
+        if url.endswith('missing'):
+            resp._content = b'{"status_code":404}'
+        return resp
+
+
 class MockBucket:
     def __init__(self, files_count=2, name='test_bucket', target='buckets', dataproxy_entity_name='test_bucket'):
+        self.client = MockDataproxyClient(self)
         self.name = name
         self.files = [MockFile(f'file{number}') for number in range(files_count)]
         self.target = target
         self.dataproxy_entity_name = dataproxy_entity_name
+        self.lock = threading.Lock()
 
-    def ls(self, prefix=''):
-        return [f for f in self.files if f.name.startswith(prefix)]
+    def ls(self, prefix=None):
+        return [f for f in self.files if f.name.startswith(prefix or '')]
 
-    def upload(self, _file_obj, name):
+    def upload(self, file_obj, name):
         if name == '/err':
             raise RuntimeError('no upload')
-        self.files.append(MockFile(name))
+        name = name.lstrip('/')
+        uploaded = MockFile(name, file_obj.read())
+        # bulk uploads run concurrently
+        with self.lock:
+            self.files = [f for f in self.files if f.name != name] + [uploaded]
 
 
 class MockBuckets:
@@ -50,6 +129,9 @@ class MockBuckets:
             'test_bucket': MockBucket()
         }
 
+    def list_buckets(self):
+        return [BucketDTO(name, 'viewer', False) for name in self.buckets]
+
     def get_bucket(self, name):
         try:
             return self.buckets[name]
@@ -69,6 +151,12 @@ def mock_client(mocker):
         return MockBucketApiClient()
 
     mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.BucketWrapper.get_client', mock_get_client)
+    # downloads are not cached, unless a test enables its own cache
+    mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.DOWNLOAD_CACHE', DownloadCache(max_size=0))
+    OBJECT_INDEX.invalidate()
+    DOWNLOAD_LINK_CACHE.clear()
+    CIRCUIT_BREAKERS.reset()
+    BUCKET_LIST_CACHE.clear()
 
 
 @pytest.fixture(scope="session")
@@ -141,6 +229,26 @@ def test_upload_fails_from_server(temp_txt_file, mock_client):
     assert resp is False
 
 
+def test_upload_directory(mock_client, tmp_path):
+    source = tmp_path / 'project'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'a.txt').write_bytes(b'a')
+    (source / 'sub' / 'b.txt').write_bytes(b'bb')
+    client = BucketWrapper()
+    resp = client.upload_directory(str(source), 'test_bucket', '/dest/', workers=2)
+    assert resp['success']
+    assert resp['bytes'] == 3
+    assert sorted(f['name'] for f in resp['files']) == ['a.txt', 'sub/b.txt']
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    assert {'dest/project/a.txt', 'dest/project/sub/b.txt'} <= {f.name for f in bucket.files}
+
+
+def test_upload_directory_not_found(mock_client, tmp_path):
+    client = BucketWrapper()
+    with pytest.raises(FileNotFoundError):
+        client.upload_directory(str(tmp_path / 'missing'), 'test_bucket', '')
+
+
 def test_download_file_fail_as_file_is_not_in_bucket(temp_directory, mock_client):
     temp_location = temp_directory
     client = BucketWrapper()
@@ -150,14 +258,250 @@ def test_download_file_fail_as_file_is_not_in_bucket(temp_directory, mock_client
     assert resp is False
 
 
-def test_download_file_success(temp_directory, mock_client):
+def mock_requests_get(_url, **_kwargs):
+    return mock_get_content(b'test content')
+
+
+def mock_get_content(content):
+    resp = Response()
+    resp.status_code = 200
+    resp._content = content
+    resp._content_consumed = True
+    return resp
+
+
+def test_download_file_success(temp_directory, mock_client, mocker):
+    mocker.patch('requests.get', mock_requests_get)
     temp_location = tempfile.mkdtemp()
     client = BucketWrapper()
     file_path = 'file1'
     bucket_name = 'test_bucket'
     resp = client.download_file(file_path, bucket_name, temp_location)
+    with open(os.path.join(temp_location, file_path), 'rb') as f:
+        content = f.read()
+    leftovers = os.listdir(temp_location)
     shutil.rmtree(temp_location)
-    assert resp is True
+    assert resp == 'verified'
+    assert content == b'test content'
+    assert leftovers == [file_path]
+
+
+def test_download_file_served_from_cache(mock_client, mocker, tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache'), max_size=1024, link='copy')
+    mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.DOWNLOAD_CACHE', cache)
+    get_spy = mocker.patch('requests.get', side_effect=mock_requests_get)
+    client = BucketWrapper()
+    assert client.download_file('file1', 'test_bucket', str(tmp_path))
+    os.makedirs(tmp_path / 'other')
+    assert client.download_file('file1', 'test_bucket', str(tmp_path / 'other'))
+
+    assert get_spy.call_count == 1
+    assert (tmp_path / 'other' / 'file1').read_bytes() == b'test content'
+    assert os.listdir(tmp_path / 'other') == ['file1']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_download_file_already_exists(mock_client, mocker):
+    mocker.patch('requests.get', mock_requests_get)
+    temp_location = tempfile.mkdtemp()
+    try:
+        client = BucketWrapper()
+        assert client.download_file('file1', 'test_bucket', temp_location)
+        with pytest.raises(FileExistsError):
+            client.download_file('file1', 'test_bucket', temp_location)
+        assert os.listdir(temp_location) == ['file1']
+    finally:
+        shutil.rmtree(temp_location)
+
+
+def test_download_file_corrupted_is_retried_then_removed(mock_client, mocker, tmp_path):
+    contents = [b'test c0ntent', b'test content']
+
+    def mock_get(_url, **_kwargs):
+        resp = mock_requests_get(_url)
+        resp._content = contents.pop(0) if contents else b'test c0ntent'
+        return resp
+    mocker.patch('requests.get', mock_get)
+    client = BucketWrapper()
+    assert client.download_file('file1', 'test_bucket', str(tmp_path)) == 'verified'
+    assert (tmp_path / 'file1').read_bytes() == b'test content'
+
+    with pytest.raises(DataproxyIntegrityError):
+        client.download_file('file0', 'test_bucket', str(tmp_path))
+    assert os.listdir(tmp_path) == ['file1']
+
+
+def test_download_file_overwritten_since_listed(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', lambda _url, **_kwargs: mock_get_content(b'new content'))
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    # the object index still holds the metadata of the previous content
+    OBJECT_INDEX.refresh(bucket)
+    bucket.files = [MockFile('file1', b'new content')]
+    assert client.download_file('file1', 'test_bucket', str(tmp_path)) == 'verified'
+    assert (tmp_path / 'file1').read_bytes() == b'new content'
+
+
+def test_download_file_unverified_hash(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', mock_requests_get)
+    mocker.patch.object(MockFile, 'HASH', 'composite-7')
+    client = BucketWrapper()
+    assert client.download_file('file1', 'test_bucket', str(tmp_path)) == 'unverified'
+
+
+def test_upload_corrupted_is_removed(mock_client, mocker, tmp_path):
+    source = tmp_path / 'a.txt'
+    source.write_bytes(b'a')
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    upload_spy = mocker.patch.object(bucket, 'upload', side_effect=lambda _f, name: bucket.files.append(
+        MockFile(name.lstrip('/'), b'b')))
+    delete_spy = mocker.spy(bucket.client, 'delete')
+    with pytest.raises(DataproxyIntegrityError):
+        client.upload_file_to(str(source), 'test_bucket', 'dir', 'a.txt')
+    assert upload_spy.call_count == 2
+    delete_spy.assert_called_once_with('/v1/buckets/test_bucket/dir/a.txt')
+
+
+def test_download_file_resumes_partial_download(mock_client, mocker, tmp_path):
+    content = b'test content'
+    requested_ranges = []
+
+    def mock_get(_url, headers=None, stream=False):
+        start, end = [int(b) for b in headers['Range'].replace('bytes=', '').split('-')]
+        requested_ranges.append((start, end))
+        resp = Response()
+        resp.status_code = 206
+        resp._content = content[start:end + 1]
+        resp._content_consumed = True
+        return resp
+    mocker.patch('requests.get', mock_get)
+    mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.RANGED_DOWNLOAD_THRESHOLD', 0)
+    mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.RANGED_DOWNLOAD_SEGMENT_SIZE', 4)
+    # simulate a previous attempt which downloaded only the first 4 bytes
+    partial_file = tmp_path / '.file1.part'
+    partial_file.write_bytes(b'test' + b'\x00' * 8)
+    state = DownloadState(str(partial_file) + DownloadState.SUFFIX, MockFile.HASH, MockFile.LAST_MODIFIED,
+                          len(content), ranges=[(0, 3)])
+    state.save()
+
+    client = BucketWrapper()
+    assert client.download_file('file1', 'test_bucket', str(tmp_path), workers=2)
+    assert (tmp_path / 'file1').read_bytes() == content
+    assert sorted(requested_ranges) == [(4, 7), (8, 11)]
+    assert os.listdir(tmp_path) == ['file1']
+
+
+def test_download_file_restarts_when_remote_changed(mock_client, mocker, tmp_path):
+    content = b'test content'
+
+    def mock_get(_url, headers=None, stream=False):
+        start, end = [int(b) for b in headers['Range'].replace('bytes=', '').split('-')]
+        resp = Response()
+        resp.status_code = 206
+        resp._content = content[start:end + 1]
+        resp._content_consumed = True
+        return resp
+    mocker.patch('requests.get', mock_get)
+    mocker.patch('tvb_ext_bucket.ebrains_drive_wrapper.RANGED_DOWNLOAD_THRESHOLD', 0)
+    partial_file = tmp_path / '.file1.part'
+    partial_file.write_bytes(b'old!' + b'\x00' * 8)
+    DownloadState(str(partial_file) + DownloadState.SUFFIX, 'old hash', MockFile.LAST_MODIFIED,
+                  len(content), ranges=[(0, 3)]).save()
+
+    client = BucketWrapper()
+    assert client.download_file('file1', 'test_bucket', str(tmp_path))
+    assert (tmp_path / 'file1').read_bytes() == content
+
+
+def test_get_bucket_upload_urls(mock_client, mocker):
+    client = BucketWrapper()
+    get_bucket_spy = mocker.spy(client, '_get_bucket')
+    urls = client.get_bucket_upload_urls('test_bucket', [('a.txt', ''), ('b.txt', '/dir')])
+    get_bucket_spy.assert_called_once_with('test_bucket')
+    assert urls == [
+        {'with_name': 'a.txt', 'to_path': '', 'url': 'fake_upload_url', 'success': True, 'message': ''},
+        {'with_name': 'b.txt', 'to_path': '/dir', 'url': 'fake_upload_url', 'success': True, 'message': ''}
+    ]
+
+
+def test_delete_files(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files.extend([MockFile('results/a.txt'), MockFile('results/sub/b.txt'), MockFile('results2/c.txt')])
+    delete_spy = mocker.spy(MockDataproxyClient, 'delete')
+    ls_spy = mocker.spy(bucket, 'ls')
+    resp = client.delete_files('test_bucket', paths=['/file0', 'missing', 'results/a.txt'], prefix='results')
+    assert not resp['success']
+    assert resp['failures'] == ['missing']
+    assert resp['number_of_removals'] == 3
+    assert sorted(call.args[1].split('/', 4)[-1] for call in delete_spy.call_args_list) == \
+        ['file0', 'missing', 'results/a.txt', 'results/sub/b.txt']
+    ls_spy.assert_called_once_with(prefix='results/')
+
+
+def test_rename_file_with_server_side_copy(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    delete_spy = mocker.spy(MockDataproxyClient, 'delete')
+    resp = client.rename_file('test_bucket', 'file1', 'renamed')
+    assert resp == {'name': 'renamed', 'path': '/renamed'}
+    assert 'renamed' in [f.name for f in bucket.files]
+    delete_spy.assert_called_once()
+
+
+def test_rename_file_streams_when_copy_not_supported(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.client.supports_copy = False
+    mocker.patch('requests.get', mock_requests_get)
+    uploaded = []
+
+    def mock_request(method, url, data):
+        assert method == 'PUT' and url == 'fake_upload_url'
+        assert len(data) == len(b'test content')
+        uploaded.append(b''.join(data))
+        bucket.files.append(MockFile('dir/renamed'))
+        resp = Response()
+        resp.status_code = 200
+        return resp
+    mocker.patch('requests.request', mock_request)
+    bucket.files.append(MockFile('dir/file'))
+    resp = client.rename_file('test_bucket', 'dir/file', 'renamed')
+    assert resp == {'name': 'renamed', 'path': 'dir/renamed'}
+    assert uploaded == [b'test content']
+
+
+def test_rename_file_keeps_original_when_copy_not_verified(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+
+    def copy_without_result(*_args, **_kwargs):
+        resp = Response()
+        resp._content = b'{}'
+        return resp
+    # copy endpoint answers but the copy never shows up in the bucket
+    mocker.patch.object(MockDataproxyClient, 'put', copy_without_result)
+    delete_spy = mocker.spy(MockDataproxyClient, 'delete')
+    with pytest.raises(DataproxyTransferError):
+        client.rename_file('test_bucket', 'file1', 'renamed')
+    delete_spy.assert_not_called()
+
+
+def test_download_prefix(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', mock_requests_get)
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files.extend([MockFile('results/a.txt'), MockFile('results/sub/b.txt'), MockFile('results2/c.txt')])
+    (tmp_path / 'results').mkdir()
+    (tmp_path / 'results' / 'a.txt').write_bytes(b'already here')
+    resp = client.download_prefix('/results/', 'test_bucket', str(tmp_path), workers=2)
+    assert resp['succeeded'] == 1
+    assert resp['failed'] == 1
+    assert [f['name'] for f in resp['files']] == ['results/a.txt', 'results/sub/b.txt']
+    assert not resp['files'][0]['success']
+    assert (tmp_path / 'results' / 'sub' / 'b.txt').read_bytes() == b'test content'
+    assert not (tmp_path / 'results2').exists()
 
 
 def test_get_download_url_fail(mock_client):
@@ -174,3 +518,172 @@ def test_get_download_url_success(mock_client):
     existent_file = 'file1'
     url = client.get_download_url(existent_file, 'test_bucket')
     assert url == existent_file
+
+
+def test_list_directory(mock_client):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files.extend(MockFile(name) for name in ['dir/a', 'dir/b', 'dir/sub/c', 'other/d'])
+
+    page = client.list_directory('test_bucket')
+    assert page['directories'] == ['dir', 'other']
+    assert [f['name'] for f in page['files']] == ['file0', 'file1']
+    assert page['cursor'] is None
+
+    page = client.list_directory('test_bucket', '/dir/', page_size=2)
+    assert page['prefix'] == 'dir/'
+    assert [f['name'] for f in page['files']] == ['a', 'b']
+    assert page['files'][0]['bytes'] == len(b'test content')
+    page = client.list_directory('test_bucket', 'dir', cursor=page['cursor'], page_size=2)
+    assert page['directories'] == ['sub']
+    assert page['files'] == []
+    assert page['cursor'] is None
+
+
+def test_list_directory_folds_nested_objects(mocker):
+    bucket = MockBucket()
+    bucket.files = [MockFile(name) for name in ['a', 'dir/b', 'dir/sub/c']]
+    listing = [file_metadata(f) for f in bucket.files]
+    mocker.patch.object(bucket.client, 'get', lambda url, params: mocker.Mock(json=lambda: {'objects': listing}))
+    page = list_directory(bucket)
+    assert page['directories'] == ['dir']
+    assert [f['name'] for f in page['files']] == ['a']
+
+
+def test_sync_directory(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', mock_requests_get)
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files = [MockFile('dir/same.txt'), MockFile('dir/remote.txt')]
+    (tmp_path / 'same.txt').write_bytes(b'test content')
+    (tmp_path / 'local.txt').write_bytes(b'local content')
+
+    plan = client.sync_directory(str(tmp_path), 'test_bucket', 'dir', dry_run=True)
+    assert plan['dry_run']
+    assert [(a['path'], a['action']) for a in plan['actions']] == [('local.txt', 'upload'), ('remote.txt', 'download')]
+    assert not (tmp_path / 'remote.txt').exists()
+
+    resp = client.sync_directory(str(tmp_path), 'test_bucket', '/dir/')
+    assert resp['success']
+    assert resp['succeeded'] == 2
+    assert (tmp_path / 'remote.txt').read_bytes() == b'test content'
+    assert 'dir/local.txt' in [f.name for f in bucket.files]
+
+
+def test_sync_directory_deletes_extraneous(mock_client, tmp_path):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files = [MockFile('dir/extra.txt')]
+    (tmp_path / 'extra.txt').write_bytes(b'x')
+
+    resp = client.sync_directory(str(tmp_path), 'test_bucket', 'dir', direction='upload', delete_extraneous=True)
+    assert [(a['path'], a['action']) for a in resp['actions']] == [('extra.txt', 'upload')]
+    assert resp['verified'] == 1
+    (tmp_path / 'extra.txt').write_bytes(b'changed')
+    resp = client.sync_directory(str(tmp_path), 'test_bucket', 'dir', direction='download', delete_extraneous=True,
+                                 dry_run=True)
+    assert resp['actions'][0]['action'] == 'download'
+    os.remove(tmp_path / 'extra.txt')
+    resp = client.sync_directory(str(tmp_path), 'test_bucket', 'dir', direction='upload', delete_extraneous=True)
+    assert [(a['path'], a['action']) for a in resp['actions']] == [('extra.txt', 'delete_remote')]
+    assert resp['success']
+
+
+def test_get_download_urls(mock_client):
+    client = BucketWrapper()
+    urls = client.get_download_urls(['file1', '/file0', 'missing'], 'test_bucket')
+    assert [(url['file'], url['url'], url['success']) for url in urls] == [
+        ('file1', 'file1', True), ('/file0', 'file0', True), ('missing', '', False)
+    ]
+    assert 'Could not find' in urls[2]['message']
+
+
+def test_download_url_is_cached(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    get_spy = mocker.spy(bucket.client, 'get')
+    assert client.get_download_url('file1', 'test_bucket') == 'file1'
+    assert client.get_download_url('file1', 'test_bucket') == 'file1'
+    assert get_spy.call_count == 1
+
+    # a new version of the file gets a new link
+    bucket.files[1].hash = 'new_hash'
+    OBJECT_INDEX.invalidate()
+    client.get_download_url('file1', 'test_bucket')
+    assert get_spy.call_count == 2
+
+
+def test_dataproxy_file_lookup_uses_index(mock_client, mocker):
+    client = BucketWrapper()
+    assert client.get_files_in_bucket('test_bucket') == ['file0', 'file1']
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    ls_spy = mocker.spy(bucket, 'ls')
+    dataproxy_file = client._get_dataproxy_file('/file1', 'test_bucket')
+    assert dataproxy_file.name == 'file1'
+    assert dataproxy_file.hash == MockFile.HASH
+    ls_spy.assert_not_called()
+
+
+def test_object_index_is_bounded(mocker):
+    clock = mocker.patch('tvb_ext_bucket.bucket_api.object_index.time.time', return_value=1000)
+    index = ObjectIndex(ttl=60, max_size=2)
+    bucket = MockBucket(files_count=3)
+    for f in bucket.files:
+        index.put(bucket, file_metadata(f))
+    # the least recently used file was evicted
+    ls_spy = mocker.spy(bucket, 'ls')
+    assert index.lookup(bucket, 'file1')['name'] == 'file1'
+    ls_spy.assert_not_called()
+    assert index.lookup(bucket, 'file0')['name'] == 'file0'
+    ls_spy.assert_called_once_with(prefix='file0')
+    # stale entries are dropped by the next put
+    clock.return_value += 61
+    index.put(MockBucket(name='other', dataproxy_entity_name='other'), file_metadata(bucket.files[0]))
+    assert len(index._objects) == 1
+
+
+def test_dataproxy_file_lookup_cold_index_lists_by_prefix(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    ls_spy = mocker.spy(bucket, 'ls')
+    assert client._get_dataproxy_file('file0', 'test_bucket').name == 'file0'
+    ls_spy.assert_called_once_with(prefix='file0')
+
+
+def test_dataproxy_file_lookup_uses_browsed_directory(mock_client, mocker):
+    client = BucketWrapper()
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    bucket.files.append(MockFile('dir/a'))
+    client.list_directory('test_bucket', 'dir')
+    ls_spy = mocker.spy(bucket, 'ls')
+    assert client._get_dataproxy_file('dir/a', 'test_bucket').name == 'dir/a'
+    ls_spy.assert_not_called()
+
+
+def test_index_updated_after_upload(temp_txt_file, mock_client):
+    client = BucketWrapper()
+    client.get_files_in_bucket('test_bucket')
+    assert client.upload_file_to(temp_txt_file, 'test_bucket', 'dir', 'test.txt')
+    dataproxy_file = client._get_dataproxy_file('dir/test.txt', 'test_bucket')
+    assert dataproxy_file.bytes == os.path.getsize(temp_txt_file)
+
+
+def test_index_updated_after_delete(mock_client, mocker):
+    client = BucketWrapper()
+    client.get_files_in_bucket('test_bucket')
+    resp = client.delete_file_from_bucket('test_bucket', 'file0')
+    assert resp['success']
+    bucket = client.client.buckets.get_bucket('test_bucket')
+    ls_spy = mocker.spy(bucket, 'ls')
+    client._get_dataproxy_file('file0', 'test_bucket')
+    # deleted file is not in the index anymore, so the bucket has to be listed
+    ls_spy.assert_called_once_with(prefix='file0')
+
+
+def test_list_buckets_is_cached(mock_client, mocker):
+    wrapper = BucketWrapper()
+    list_buckets = mocker.spy(wrapper.client.buckets, 'list_buckets')
+    assert wrapper.list_buckets() == ['test_bucket']
+    assert wrapper.list_buckets() == ['test_bucket']
+    assert list_buckets.call_count == 1
+    assert BUCKET_LIST_CACHE.stats()['hits'] == 1
@@ -0,0 +1,62 @@
+import time
+
+from tvb_ext_bucket.guess_cache import GuessCache
+
+
+class MockGuess:
+    def __init__(self, *buckets):
+        self.buckets = list(buckets)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        bucket = self.buckets[min(self.calls, len(self.buckets)) - 1]
+        if isinstance(bucket, Exception):
+            raise bucket
+        return bucket
+
+
+def wait_revalidated(cache):
+    deadline = time.time() + 5
+    while cache._revalidating and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_guess_is_remembered(tmp_path):
+    cache = GuessCache(str(tmp_path / 'guess.json'))
+    guess = MockGuess('bucket')
+    assert cache.get('user', 'collab', guess) == 'bucket'
+    assert cache.get('user', 'collab', guess) == 'bucket'
+    assert guess.calls == 1
+    assert cache.get('other_user', 'collab', MockGuess('other_bucket')) == 'other_bucket'
+
+
+def test_persisted_guess_is_revalidated(tmp_path):
+    GuessCache(str(tmp_path / 'guess.json')).get('user', 'collab', MockGuess('bucket'))
+
+    cache = GuessCache(str(tmp_path / 'guess.json'))
+    guess = MockGuess('renamed_bucket')
+    assert cache.get('user', 'collab', guess) == 'bucket'
+    wait_revalidated(cache)
+    assert guess.calls == 1
+    assert cache.get('user', 'collab', guess) == 'renamed_bucket'
+    assert guess.calls == 1
+
+
+def test_failed_revalidation_keeps_guess(tmp_path):
+    cache = GuessCache(str(tmp_path / 'guess.json'), ttl=-1)
+    guess = MockGuess('bucket', ConnectionError('wiki is down'))
+    cache.get('user', 'collab', guess)
+    assert cache.get('user', 'collab', guess) == 'bucket'
+    wait_revalidated(cache)
+    assert guess.calls == 2
+    assert cache.get('user', 'collab', guess) == 'bucket'
+
+
+def test_invalidate(tmp_path):
+    cache = GuessCache(str(tmp_path / 'guess.json'))
+    guess = MockGuess('bucket', 'other_bucket')
+    cache.get('user', 'collab', guess)
+    cache.invalidate('user', 'collab')
+    assert cache.get('user', 'collab', guess) == 'other_bucket'
+    assert GuessCache(str(tmp_path / 'guess.json')).get('user', 'collab', guess) == 'other_bucket'
@@ -6,7 +6,19 @@
 #
 
 import json
-from tvb_ext_bucket.tests.test_drive_wrapper import mock_client
+import os
+
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from tvb_ext_bucket.bucket_api.listing import from_columnar
+from tvb_ext_bucket.download_cache import DownloadCache
+from tvb_ext_bucket.handlers import negotiate_encoding
+from tvb_ext_bucket.jobs import JobQueue
+from tvb_ext_bucket.metrics import ERRORS
+from tvb_ext_bucket.tests.test_drive_wrapper import mock_client, mock_requests_get, MockFile
+from tvb_ext_bucket.token_provider import TokenProvider
+from tvb_ext_bucket.tracing import Tracer
 
 
 async def test_get_example(jp_fetch, mock_client):
@@ -20,4 +32,295 @@ async def test_get_example(jp_fetch, mock_client):
         'success': False,
         "message": "No collab name provided!",
         "files": []
-    }
\ No newline at end of file
+    }
+
+async def test_get_bucket_files(jp_fetch, mock_client):
+    response = await jp_fetch("tvb_ext_bucket", "buckets", params={"bucket": "test_bucket"})
+
+    assert response.code == 200
+    payload = json.loads(response.body)
+    assert payload == {
+        'success': True,
+        'message': '',
+        'files': ['file0', 'file1']
+    }
+
+
+async def test_get_bucket_files_columnar(jp_fetch, mock_client):
+    response = await jp_fetch("tvb_ext_bucket", "buckets", params={"bucket": "test_bucket", "format": "columnar"})
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    files = from_columnar(payload['listing'])
+    assert [f['name'] for f in files] == ['file0', 'file1']
+    assert files[0]['bytes'] == len(b'test content')
+    assert files[0]['hash'] == MockFile.HASH
+
+
+async def test_large_listing_is_compressed(jp_fetch, mock_client, mocker):
+    mocker.patch.object(MockFile, 'HASH', 'h' * 2048)
+    response = await jp_fetch("tvb_ext_bucket", "buckets", params={"bucket": "test_bucket", "format": "columnar"},
+                              headers={'Accept-Encoding': 'gzip'})
+
+    # the http client of the tests decompresses the body and keeps the original encoding under this header
+    assert response.headers.get('X-Consumed-Content-Encoding') == 'gzip'
+    assert json.loads(response.body)['listing']['hashes'] == ['h' * 2048] * 2
+
+
+async def test_unknown_listing_format(jp_fetch, mock_client):
+    response = await jp_fetch("tvb_ext_bucket", "directory", params={"bucket": "test_bucket", "format": "xml"})
+
+    payload = json.loads(response.body)
+    assert not payload['success']
+    assert payload['message'] == 'Unknown listing format xml!'
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding('gzip, deflate, br') == 'gzip'
+    assert negotiate_encoding('deflate') == 'deflate'
+    assert negotiate_encoding('gzip;q=0, deflate;q=0.5') == 'deflate'
+    assert negotiate_encoding('*') == 'gzip'
+    assert negotiate_encoding('br') is None
+    assert negotiate_encoding(None) is None
+
+
+async def test_list_directory(jp_fetch, mock_client):
+    response = await jp_fetch("tvb_ext_bucket", "directory", params={"bucket": "test_bucket", "page_size": "1"})
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert [f['name'] for f in payload['files']] == ['file0']
+    assert payload['cursor'] == 'file0'
+
+
+async def test_download_prefix(jp_fetch, mock_client, mocker, tmp_path_factory):
+    mocker.patch('requests.get', mock_requests_get)
+    tmp_path = tmp_path_factory.mktemp('downloads')
+    response = await jp_fetch("tvb_ext_bucket", "download_prefix",
+                              params={"bucket": "test_bucket", "prefix": "", "download_destination": str(tmp_path)})
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert payload['succeeded'] == 2
+    assert sorted(os.listdir(tmp_path)) == ['file0', 'file1']
+    assert payload['verified'] == 2
+
+
+async def test_download_reports_verification(jp_fetch, mock_client, mocker, tmp_path_factory):
+    mocker.patch('requests.get', mock_requests_get)
+    tmp_path = tmp_path_factory.mktemp('downloads')
+    response = await jp_fetch("tvb_ext_bucket", "download",
+                              params={"bucket": "test_bucket", "file": "file1", "download_destination": str(tmp_path)})
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert payload['verification'] == 'verified'
+
+
+async def test_download_urls(jp_fetch, mock_client):
+    body = {'bucket': 'test_bucket', 'files': ['file0', 'file1']}
+    response = await jp_fetch("tvb_ext_bucket", "download_urls", method='POST', body=json.dumps(body))
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert [url['url'] for url in payload['urls']] == ['file0', 'file1']
+
+
+@pytest.mark.parametrize('body, message', [
+    ('', 'Expected a json object as request body!'),
+    (json.dumps({'bucket': 'test_bucket', 'files': 'file0'}), 'Expected a list as files in request body!'),
+    (json.dumps({'files': ['file0']}), "Missing 'bucket' in request body!")
+])
+async def test_download_urls_invalid_body(jp_fetch, mock_client, body, message):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "download_urls", method='POST', body=body)
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == message
+
+
+async def test_sync_dry_run(jp_fetch, mock_client, tmp_path_factory):
+    local_dir = tmp_path_factory.mktemp('sync')
+    (local_dir / 'file0').write_bytes(b'other content')
+    body = {'local_dir': str(local_dir), 'bucket': 'test_bucket', 'prefix': '', 'dry_run': True,
+            'direction': 'download'}
+    response = await jp_fetch("tvb_ext_bucket", "sync", method='POST', body=json.dumps(body))
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert [(a['path'], a['action']) for a in payload['actions']] == [('file0', 'download'), ('file1', 'download')]
+
+
+async def test_sync_unknown_direction(jp_fetch, mock_client, tmp_path_factory):
+    body = {'local_dir': str(tmp_path_factory.mktemp('sync')), 'bucket': 'test_bucket', 'prefix': '',
+            'direction': 'sideways'}
+    response = await jp_fetch("tvb_ext_bucket", "sync", method='POST', body=json.dumps(body))
+
+    payload = json.loads(response.body)
+    assert not payload['success']
+    assert payload['message'].startswith('Unknown sync direction sideways')
+
+
+async def test_sync_invalid_body(jp_fetch, mock_client):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "sync", method='POST', body='')
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == 'Expected a json object as request body!'
+
+
+async def test_local_upload_batch(jp_fetch, mock_client):
+    body = {'to_bucket': 'test_bucket', 'targets': [{'with_name': 'a.txt', 'to_path': 'dir'}]}
+    response = await jp_fetch("tvb_ext_bucket", "local_upload_batch", method='POST', body=json.dumps(body))
+
+    payload = json.loads(response.body)
+    assert payload['success']
+    assert payload['urls'] == [
+        {'with_name': 'a.txt', 'to_path': 'dir', 'url': 'fake_upload_url', 'success': True, 'message': ''}
+    ]
+
+
+@pytest.mark.parametrize('body, message', [
+    ('', 'Expected a json object as request body!'),
+    ({'to_bucket': 'test_bucket', 'targets': 'a.txt'}, 'Expected a list as targets in request body!'),
+    ({'to_bucket': 'test_bucket', 'targets': ['a.txt']},
+     'Expected {with_name, to_path} objects as targets in request body!'),
+    ({'to_bucket': 'test_bucket', 'targets': [{'with_name': 'a.txt'}]}, "Missing 'to_path' in request body!")
+])
+async def test_local_upload_batch_invalid_body(jp_fetch, mock_client, body, message):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "local_upload_batch", method='POST',
+                       body=body if isinstance(body, str) else json.dumps(body))
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == message
+
+
+@pytest.mark.parametrize('body, message', [
+    ('', 'Expected a json object as request body!'),
+    ({'to_bucket': 'test_bucket', 'with_name': 'a.txt', 'to_path': '', 'upload_id': 'id', 'etags': 'etag'},
+     'Expected a list as etags in request body!'),
+    ({'to_bucket': 'test_bucket', 'with_name': 'a.txt', 'to_path': '', 'etags': []},
+     "Missing 'upload_id' in request body!")
+])
+async def test_complete_multipart_upload_invalid_body(jp_fetch, mock_client, body, message):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "multipart_upload", method='POST',
+                       body=body if isinstance(body, str) else json.dumps(body))
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == message
+
+
+@pytest.mark.parametrize('body, message', [
+    ('', 'Expected a json object as request body!'),
+    ({'bucket': 'test_bucket', 'paths': 'file0'}, 'Expected a list as paths in request body!'),
+    ({'bucket': 'test_bucket'}, "Missing 'paths or prefix' in request body!")
+])
+async def test_bulk_delete_invalid_body(jp_fetch, mock_client, body, message):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "bulk_delete", method='POST',
+                       body=body if isinstance(body, str) else json.dumps(body))
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == message
+
+
+async def test_download_cache_stats(jp_fetch, mocker, tmp_path_factory):
+    cache = DownloadCache(str(tmp_path_factory.mktemp('cache')), max_size=10)
+    mocker.patch('tvb_ext_bucket.handlers.DOWNLOAD_CACHE', cache)
+    cache.fetch('bucket', 'hash', 4, 'target')
+    response = await jp_fetch("tvb_ext_bucket", "download_cache")
+
+    payload = json.loads(response.body)
+    assert (payload['hits'], payload['misses'], payload['max_size']) == (0, 1, 10)
+
+
+async def test_jobs(jp_fetch, mock_client, mocker, tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('jobs')
+    queue = JobQueue(str(tmp_path / 'jobs.json'), workers=0)
+    mocker.patch('tvb_ext_bucket.handlers.JOB_QUEUE', queue)
+    body = {'kind': 'download', 'params': {'file': 'file1', 'bucket': 'test_bucket',
+                                           'download_destination': str(tmp_path)}}
+    response = await jp_fetch("tvb_ext_bucket", "jobs", method='POST', body=json.dumps(body))
+    job = json.loads(response.body)['job']
+    assert job['state'] == 'queued'
+
+    # jobs of other users are neither listed nor found nor cancelled
+    other = queue.enqueue('download', body['params'], 'other_user')
+    response = await jp_fetch("tvb_ext_bucket", "jobs")
+    assert [j['id'] for j in json.loads(response.body)['jobs']] == [job['id']]
+    response = await jp_fetch("tvb_ext_bucket", "jobs", params={'id': other.id})
+    assert not json.loads(response.body)['success']
+    response = await jp_fetch("tvb_ext_bucket", "jobs", method='DELETE', params={'id': other.id})
+    assert not json.loads(response.body)['success']
+    assert other.state == 'queued'
+
+    response = await jp_fetch("tvb_ext_bucket", "jobs", method='DELETE', params={'id': job['id']})
+    assert json.loads(response.body)['job']['state'] == 'cancelled'
+    response = await jp_fetch("tvb_ext_bucket", "jobs", params={'id': job['id']})
+    assert json.loads(response.body)['job']['state'] == 'cancelled'
+    queue.shutdown()
+
+
+async def test_jobs_unknown_kind(jp_fetch, mock_client, mocker, tmp_path_factory):
+    mocker.patch('tvb_ext_bucket.handlers.JOB_QUEUE', JobQueue(str(tmp_path_factory.mktemp('jobs') / 'jobs.json')))
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "jobs", method='POST', body=json.dumps({'kind': 'x', 'params': {}}))
+    assert e.value.code == 400
+    payload = json.loads(e.value.response.body)
+    assert not payload['success']
+    assert payload['message'].startswith('Unknown job kind x')
+
+
+async def test_jobs_invalid_params(jp_fetch, mock_client, mocker, tmp_path_factory):
+    mocker.patch('tvb_ext_bucket.handlers.JOB_QUEUE', JobQueue(str(tmp_path_factory.mktemp('jobs') / 'jobs.json')))
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "jobs", method='POST',
+                       body=json.dumps({'kind': 'download', 'params': 'file1'}))
+    assert e.value.code == 400
+    assert json.loads(e.value.response.body)['message'] == 'The params of a download job must be an object!'
+
+
+async def test_token_validity(jp_fetch, mocker):
+    provider = TokenProvider(fetch=lambda: 'not a jwt', ttl=60)
+    mocker.patch('tvb_ext_bucket.handlers.TOKEN_PROVIDER', provider)
+    response = await jp_fetch("tvb_ext_bucket", "token")
+
+    payload = json.loads(response.body)
+    provider.invalidate()
+    assert payload['success']
+    assert 'token' not in payload
+    assert 55 < payload['expires_in'] <= 60
+
+
+async def test_metrics(jp_fetch, mock_client):
+    await jp_fetch("tvb_ext_bucket", "buckets", params={"bucket": "test_bucket"})
+    response = await jp_fetch("tvb_ext_bucket", "metrics")
+
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    body = response.body.decode('utf-8')
+    assert 'tvb_ext_bucket_handler_requests_total{handler="BucketHandler",method="GET",status="200"}' in body
+    assert 'tvb_ext_bucket_handler_latency_seconds_count{handler="BucketHandler",method="GET"}' in body
+    assert 'tvb_ext_bucket_cache_hit_ratio{cache="download"}' in body
+
+
+async def test_handled_errors_are_not_counted(jp_fetch, mock_client):
+    errors = ERRORS.value('DataproxyFileNotFound')
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch("tvb_ext_bucket", "rename", params={'bucket': 'test_bucket', 'path': 'missing',
+                                                           'new_name': 'other'})
+    assert e.value.code == 400
+    assert ERRORS.value('DataproxyFileNotFound') == errors
+
+
+async def test_download_is_traced(jp_fetch, mock_client, mocker, tmp_path_factory):
+    mocker.patch('requests.get', mock_requests_get)
+    tmp_path = tmp_path_factory.mktemp('downloads')
+    log_file = tmp_path_factory.mktemp('traces') / 'traces.jsonl'
+    mocker.patch('tvb_ext_bucket.handlers.TRACER', Tracer(sample_rate=1, log_file=str(log_file)))
+    await jp_fetch("tvb_ext_bucket", "download",
+                   params={"bucket": "test_bucket", "file": "file1", "download_destination": str(tmp_path)})
+
+    with open(log_file) as f:
+        trace = json.loads(f.readline())
+    assert (trace['name'], trace['attributes']['status']) == ('DownloadHandler', 200)
+    assert [child['name'] for child in trace['children']] == ['bucket', 'ls', 'download']
+    download = trace['children'][2]
+    assert download['attributes']['bytes'] == len(b'test content')
+    assert [child['name'] for child in download['children']] == ['download_link', 'http']
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+import pytest
+
+from tvb_ext_bucket.jobs import JobQueue, Job, QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+from tvb_ext_bucket.tests.test_drive_wrapper import mock_client, mock_requests_get
+from tvb_ext_bucket.transfers import cancellable, run_transfers
+
+
+def wait_for(queue, job, *states):
+    for _ in range(500):
+        if queue.get(job.id).state in states:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f'job {job.id} stuck in state {job.state}')
+
+
+@pytest.fixture
+def blocked(mocker):
+    """
+    Downloads block until the returned event is set
+    """
+    release = threading.Event()
+
+    def blocking_get(url, **kwargs):
+        release.wait(5)
+        return mock_requests_get(url, **kwargs)
+    mocker.patch('requests.get', blocking_get)
+    yield release
+    release.set()
+
+
+def test_job_runs_in_background(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', mock_requests_get)
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    job = queue.enqueue('download', {'file': 'file1', 'bucket': 'test_bucket',
+                                     'download_destination': str(tmp_path)}, 'user')
+    wait_for(queue, job, SUCCEEDED)
+    assert job.result == 'verified'
+    assert (tmp_path / 'file1').read_bytes() == b'test content'
+    # the state is persisted right after it changes, once the job is over
+    queue.shutdown()
+    with open(tmp_path / 'jobs.json') as f:
+        assert json.load(f)[0]['state'] == SUCCEEDED
+
+
+def test_failed_job(mock_client, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    job = queue.enqueue('upload_directory', {'source_dir': str(tmp_path / 'missing'), 'bucket': 'test_bucket',
+                                             'destination': ''}, 'user')
+    wait_for(queue, job, FAILED)
+    assert 'Could not find source directory' in job.message
+    queue.shutdown()
+
+
+def test_enqueue_validates_params(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    with pytest.raises(ValueError):
+        queue.enqueue('teleport', {}, 'user')
+    with pytest.raises(ValueError, match='Missing bucket'):
+        queue.enqueue('download', {'file': 'a', 'download_destination': ''}, 'user')
+    with pytest.raises(ValueError, match='must be an object'):
+        queue.enqueue('download', ['a', 'test_bucket', ''], 'user')
+    with pytest.raises(ValueError, match='Invalid priority'):
+        queue.enqueue('download', {'file': 'a', 'bucket': 'b', 'download_destination': ''}, 'user', priority='high')
+
+
+def test_concurrency_limits_and_priorities(mock_client, blocked, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.json'), workers=2, workers_per_user=1)
+
+    def download(user, file_name, kind='download'):
+        params = {'file': file_name, 'prefix': file_name, 'bucket': 'test_bucket',
+                  'download_destination': str(tmp_path / user)}
+        (tmp_path / user).mkdir(exist_ok=True)
+        return queue.enqueue(kind, params, user)
+    first = download('alice', 'file0')
+    bulk = download('alice', 'file1', kind='download_prefix')
+    interactive = download('alice', 'file1')
+    other_user = download('bob', 'file0')
+    wait_for(queue, other_user, RUNNING)
+    # one job per user, the interactive download goes ahead of the bulk one
+    assert [job.state for job in (first, bulk, interactive)] == [RUNNING, QUEUED, QUEUED]
+
+    blocked.set()
+    for job in (first, bulk, interactive, other_user):
+        wait_for(queue, job, SUCCEEDED)
+    assert interactive.started_at <= bulk.started_at
+    queue.shutdown()
+
+
+def test_cancel(mock_client, blocked, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.json'), workers=1)
+    params = {'prefix': '', 'bucket': 'test_bucket', 'download_destination': str(tmp_path)}
+    running = queue.enqueue('download_prefix', params, 'user')
+    queued = queue.enqueue('download_prefix', params, 'user')
+    wait_for(queue, running, RUNNING)
+    assert queue.cancel(queued.id, 'other_user') is None
+    assert queue.cancel(queued.id, 'user').state == CANCELLED
+    assert queue.cancel(running.id, 'user').cancel_requested
+    blocked.set()
+    # cancelled if the cancel came before its files started, otherwise the job completed
+    wait_for(queue, running, CANCELLED, SUCCEEDED)
+    queue.shutdown()
+    assert queued.started_at is None
+
+
+def test_cancel_skipping_files(mock_client, mocker, tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def transfer(item):
+        started.set()
+        release.wait(5)
+
+    def download_prefix(wrapper, prefix, bucket, destination):
+        return run_transfers(transfer, ['file0', 'file1'], workers=1)
+    mocker.patch('tvb_ext_bucket.jobs.BucketWrapper.download_prefix', download_prefix)
+    queue = JobQueue(str(tmp_path / 'jobs.json'))
+    job = queue.enqueue('download_prefix', {'prefix': '', 'bucket': 'test_bucket',
+                                            'download_destination': str(tmp_path)}, 'user')
+    started.wait(5)
+    queue.cancel(job.id, 'user')
+    release.set()
+    wait_for(queue, job, CANCELLED)
+    assert job.result['cancelled'] == 1
+    queue.shutdown()
+
+
+def test_queued_jobs_survive_restart(tmp_path):
+    path = tmp_path / 'jobs.json'
+    interrupted = Job('download', {}, 'user', 0, state=RUNNING)
+    done = Job('download', {}, 'user', 0, state=SUCCEEDED)
+    path.write_text(json.dumps([interrupted.to_json(), done.to_json()]))
+    queue = JobQueue(str(path), workers=0)
+    queue.start()
+    assert [(job.id, job.state) for job in queue.list('user')] == [(interrupted.id, QUEUED), (done.id, SUCCEEDED)]
+    queue.shutdown()
+
+
+
+def test_restarted_bulk_download_keeps_completed_files(mock_client, mocker, tmp_path):
+    mocker.patch('requests.get', mock_requests_get)
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+    # the first run downloaded file0 before the server stopped
+    (destination / 'file0').write_bytes(b'test content')
+    params = {'prefix': '', 'bucket': 'test_bucket', 'download_destination': str(destination)}
+    interrupted = Job('download_prefix', params, 'user', 10, state=RUNNING)
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps([interrupted.to_json()]))
+    queue = JobQueue(str(path))
+    queue.start()
+    job = queue.get(interrupted.id)
+    wait_for(queue, job, SUCCEEDED, FAILED)
+    assert job.state == SUCCEEDED
+    assert job.result['verified'] == 2
+    assert sorted(os.listdir(destination)) == ['file0', 'file1']
+    queue.shutdown()
+
+def test_cancelled_bulk_transfer_skips_remaining_files():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with cancellable(cancel_event):
+        summary = run_transfers(lambda item: item, ['a', 'b'], workers=1)
+    assert summary['failed'] == summary['cancelled'] == 2
+    assert summary['files'][0]['message'] == 'Transfer cancelled'
+    assert run_transfers(lambda item: item, ['a'])['success']
@@ -0,0 +1,56 @@
+import time
+
+from tvb_ext_bucket.bucket_api.link_cache import DownloadLinkCache, get_link_expiry
+from tvb_ext_bucket.tests.test_drive_wrapper import MockBucket, MockFile
+
+
+def make_file(name='file', file_hash='hash'):
+    dataproxy_file = MockFile(name)
+    dataproxy_file.bucket = MockBucket()
+    dataproxy_file.hash = file_hash
+    return dataproxy_file
+
+
+def test_get_link_expiry():
+    assert get_link_expiry('https://object.storage/v1/file?temp_url_sig=abc&temp_url_expires=1700000000') \
+        == 1700000000
+    assert get_link_expiry('https://s3/file?X-Amz-Date=20231114T221320Z&X-Amz-Expires=60') == 1700000000 + 60
+    assert get_link_expiry('https://s3/file?Expires=1700000000') == 1700000000
+    now = time.time()
+    assert now + 9 <= get_link_expiry('https://storage/file', default_ttl=10) <= time.time() + 10
+
+
+def test_link_is_cached_until_refresh_margin():
+    cache = DownloadLinkCache(refresh_margin=5)
+    dataproxy_file = make_file()
+    links = iter([f'url?temp_url_expires={time.time() + 60}', f'url?temp_url_expires={time.time() + 3}',
+                  'never_requested'])
+    first = cache.get(dataproxy_file, lambda: next(links))
+    assert cache.get(dataproxy_file, lambda: next(links)) == first
+
+    cache.expire(dataproxy_file, 'another_url')
+    assert cache.get(dataproxy_file, lambda: next(links)) == first
+    cache.expire(dataproxy_file, first)
+    # a link valid for 3s is refreshed half way through its lifetime
+    short_lived = cache.get(dataproxy_file, lambda: next(links))
+    assert short_lived != first
+    assert cache.get(dataproxy_file, lambda: next(links)) == short_lived
+
+
+def test_expired_link_is_requested_again():
+    cache = DownloadLinkCache(refresh_margin=5)
+    dataproxy_file = make_file()
+    links = iter([f'url?temp_url_expires={time.time() + 4}', 'new_url'])
+    cache.get(dataproxy_file, lambda: next(links))
+    cache._links[cache._key(dataproxy_file)] = ('url', time.time() - 1)
+    assert cache.get(dataproxy_file, lambda: next(links)) == 'new_url'
+
+
+def test_links_are_keyed_by_hash_and_evicted():
+    cache = DownloadLinkCache(max_size=2)
+    old_version, new_version = make_file(file_hash='old'), make_file(file_hash='new')
+    assert cache.get(old_version, lambda: 'old_url') == 'old_url'
+    assert cache.get(new_version, lambda: 'new_url') == 'new_url'
+    cache.get(make_file(name='other'), lambda: 'other_url')
+    assert len(cache) == 2
+    assert cache.get(old_version, lambda: 'refreshed_url') == 'refreshed_url'
@@ -0,0 +1,23 @@
+from tvb_ext_bucket.bucket_api.listing import from_columnar, to_columnar
+
+
+FILES = [
+    {'name': 'a.txt', 'bytes': 1, 'hash': 'h1', 'last_modified': '2023-01-11T08:27:45.613660'},
+    {'name': 'dir/b.txt', 'bytes': 2, 'hash': 'h2', 'last_modified': '2023-01-12T08:27:45.613660'},
+    {'name': 'dir/c.txt', 'bytes': 3, 'hash': None, 'last_modified': None},
+    {'name': 'dir/sub/d.txt', 'bytes': 4, 'hash': 'h4', 'last_modified': '2023-01-13T08:27:45.613660'}
+]
+
+
+def test_to_columnar():
+    listing = to_columnar(FILES)
+    assert listing['prefixes'] == ['', 'dir', 'dir/sub']
+    assert listing['prefix_ids'] == [0, 1, 1, 2]
+    assert listing['names'] == ['a.txt', 'b.txt', 'c.txt', 'd.txt']
+    assert listing['sizes'] == [1, 2, 3, 4]
+    assert listing['hashes'] == ['h1', 'h2', None, 'h4']
+
+
+def test_columnar_round_trip():
+    assert from_columnar(to_columnar(FILES)) == FILES
+    assert from_columnar(to_columnar([])) == []
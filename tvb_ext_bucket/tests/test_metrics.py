@@ -0,0 +1,55 @@
+import requests
+
+from tvb_ext_bucket.bucket_api.resilience import call_with_retries
+from tvb_ext_bucket.metrics import MetricsRegistry, UPSTREAM_CALLS, UPSTREAM_LATENCY
+from tvb_ext_bucket.tests.test_resilience import response, sleeps
+
+
+def test_counter_render():
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Requests', ('handler', 'status'))
+    counter.inc('a', '200')
+    counter.inc('a', '200', amount=2)
+    counter.inc('b"c', '500')
+    assert registry.render() == '# HELP requests_total Requests\n' \
+                                '# TYPE requests_total counter\n' \
+                                'requests_total{handler="a",status="200"} 3\n' \
+                                'requests_total{handler="b\\"c",status="500"} 1\n'
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('handler',), buckets=(0.1, 1))
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.5, 'a')
+    histogram.observe(5, 'a')
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{handler="a",le="0.1"} 1',
+        'latency_seconds_bucket{handler="a",le="1"} 2',
+        'latency_seconds_bucket{handler="a",le="+Inf"} 3',
+        'latency_seconds_sum{handler="a"} 5.55',
+        'latency_seconds_count{handler="a"} 3'
+    ]
+
+
+def test_collected_render():
+    registry = MetricsRegistry()
+    registry.collected('cache_hit_ratio', 'Hit ratio', 'gauge', ('cache',), lambda: [(('download',), 0.25)])
+    assert registry.render().splitlines()[2:] == ['cache_hit_ratio{cache="download"} 0.25']
+
+
+def test_upstream_calls_are_counted(sleeps):
+    endpoint = 'GET /v1/buckets/{bucket}'
+    calls, errors = UPSTREAM_CALLS.value(endpoint, '200'), UPSTREAM_CALLS.value(endpoint, 'ConnectionError')
+    observed = UPSTREAM_LATENCY.count(endpoint)
+    responses = [requests.ConnectionError('reset'), response(200)]
+
+    def call():
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+    call_with_retries('GET', '/v1/buckets/b', call)
+    assert UPSTREAM_CALLS.value(endpoint, '200') == calls + 1
+    assert UPSTREAM_CALLS.value(endpoint, 'ConnectionError') == errors + 1
+    assert UPSTREAM_LATENCY.count(endpoint) == observed + 1
@@ -0,0 +1,102 @@
+import hashlib
+import json
+
+import pytest
+import requests
+from requests import Response
+
+from tvb_ext_bucket.bucket_api.checksum import composite_hash
+from tvb_ext_bucket.bucket_api.multipart import MultipartUpload
+from tvb_ext_bucket.exceptions import DataproxyTransferError
+
+
+def json_response(data):
+    resp = Response()
+    resp.status_code = 200
+    resp._content = json.dumps(data).encode('utf-8')
+    return resp
+
+
+class MockMultipartClient:
+    def __init__(self):
+        self.completed = None
+        self.aborted = []
+
+    def put(self, url, params=None, json=None):
+        if url.endswith('/multipart'):
+            return json_response({'uploadId': 'upload-id'})
+        if url.endswith('/multipart/upload-id'):
+            self.completed = json
+            return json_response({})
+        part_number = url.split('/')[-1]
+        return json_response({'url': f'part_url_{part_number}'})
+
+    def delete(self, url):
+        self.aborted.append(url)
+        return json_response({})
+
+
+class MockBucket:
+    def __init__(self):
+        self.client = MockMultipartClient()
+        self.target = 'buckets'
+        self.dataproxy_entity_name = 'test_bucket'
+
+
+def test_get_part_urls():
+    upload = MultipartUpload(MockBucket(), '/dir/big.bin')
+    assert upload.start() == 'upload-id'
+    assert upload.get_part_urls(range(2, 5)) == {2: 'part_url_2', 3: 'part_url_3', 4: 'part_url_4'}
+
+
+def test_upload_file_in_parallel_parts(mocker, tmp_path):
+    source = tmp_path / 'big.bin'
+    source.write_bytes(b'0123456789')
+    uploaded = {}
+    failures = {'part_url_2': 1}
+
+    def mock_put(url, data):
+        resp = Response()
+        if failures.get(url):
+            failures[url] -= 1
+            raise requests.ConnectionError('reset')
+        uploaded[url] = data
+        resp.status_code = 200
+        resp.headers['etag'] = f'"etag_{url[-1]}"'
+        return resp
+    mocker.patch('requests.put', mock_put)
+    mocker.patch('time.sleep')
+    bucket = MockBucket()
+    digest = MultipartUpload(bucket, 'big.bin').upload_file(str(source), part_size=4, workers=2)
+    assert digest == composite_hash([hashlib.md5(part).digest() for part in [b'0123', b'4567', b'89']])
+    assert uploaded == {'part_url_1': b'0123', 'part_url_2': b'4567', 'part_url_3': b'89'}
+    assert bucket.client.completed == {'1': 'etag_1', '2': 'etag_2', '3': 'etag_3'}
+    assert bucket.client.aborted == []
+
+
+def test_upload_file_fails_after_retries(mocker, tmp_path):
+    source = tmp_path / 'big.bin'
+    source.write_bytes(b'0123456789')
+
+    def mock_put(url, data):
+        raise requests.ConnectionError('reset')
+    mocker.patch('requests.put', mock_put)
+    mocker.patch('time.sleep')
+    bucket = MockBucket()
+    with pytest.raises(DataproxyTransferError):
+        MultipartUpload(bucket, 'big.bin').upload_file(str(source), part_size=4)
+    assert bucket.client.completed is None
+    assert bucket.client.aborted == ['/v1/buckets/test_bucket/big.bin/multipart/upload-id']
+
+
+def test_failed_completion_aborts_upload(mocker, tmp_path):
+    source = tmp_path / 'big.bin'
+    source.write_bytes(b'0123456789')
+    resp = Response()
+    resp.status_code = 200
+    mocker.patch('requests.put', return_value=resp)
+    bucket = MockBucket()
+    mocker.patch.object(MultipartUpload, 'complete', side_effect=DataproxyTransferError('could not complete'))
+    with pytest.raises(DataproxyTransferError):
+        MultipartUpload(bucket, 'big.bin').upload_file(str(source), part_size=4)
+    assert bucket.client.aborted == ['/v1/buckets/test_bucket/big.bin/multipart/upload-id']
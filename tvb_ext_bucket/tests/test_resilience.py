@@ -0,0 +1,157 @@
+import io
+import time
+
+import pytest
+import requests
+from ebrains_drive.exceptions import ClientHttpError
+from requests import Response
+
+from tvb_ext_bucket.bucket_api.bucket_api import ExtendedBucketApiClient
+from tvb_ext_bucket.bucket_api.resilience import CIRCUIT_BREAKERS, CircuitBreaker, backoff_delay, \
+    call_with_retries, endpoint_of, parse_retry_after
+from tvb_ext_bucket.exceptions import DataproxyUnavailable
+from tvb_ext_bucket.tests.test_client_registry import make_token
+
+
+def response(status_code, headers=None):
+    resp = Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or {})
+    resp._content = b"{}"
+    resp.raw = io.BytesIO()
+    return resp
+
+
+@pytest.fixture
+def sleeps(mocker):
+    CIRCUIT_BREAKERS.reset()
+    yield mocker.patch('time.sleep')
+    CIRCUIT_BREAKERS.reset()
+
+
+def test_endpoint_of():
+    assert endpoint_of('get', '/v1/buckets') == 'GET /v1/buckets'
+    assert endpoint_of('GET', 'https://data-proxy.ebrains.eu/api/v1/buckets/b/dir/f.txt') == \
+        'GET /v1/buckets/{bucket}/{object}'
+    assert endpoint_of('PUT', '/v1/buckets/b/f.txt/multipart/id/2') == 'PUT /v1/buckets/{bucket}/{object}/multipart'
+    assert endpoint_of('PUT', '/v1/buckets/b/f.txt/copy') == 'PUT /v1/buckets/{bucket}/{object}/copy'
+    assert endpoint_of('GET', 'https://storage.example/swift/f.txt?temp_url_sig=x') == 'GET storage.example'
+
+
+def test_retry_after_and_backoff():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert backoff_delay(1, retry_after=2) == 2
+    assert backoff_delay(1, retry_after=3600) == 30
+    assert all(0 <= backoff_delay(3) <= 2 for _ in range(20))
+
+
+def test_retries_transient_errors(sleeps):
+    responses = [response(503, {'Retry-After': '2'}), requests.ConnectionError('reset'), response(200)]
+
+    def call():
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+    assert call_with_retries('GET', '/v1/buckets', call).status_code == 200
+    assert sleeps.call_args_list[0].args == (2,)
+    assert sleeps.call_count == 2
+
+
+def test_no_retry_of_processed_non_idempotent_request(sleeps):
+    calls = []
+    assert call_with_retries('POST', '/v1/buckets', lambda: calls.append(1) or response(500)).status_code == 500
+    assert len(calls) == 1
+    assert call_with_retries('POST', '/v1/buckets', lambda: calls.append(1) or response(429), attempts=2)\
+        .status_code == 429
+    assert len(calls) == 3
+
+
+def test_circuit_breaker(mocker):
+    clock = mocker.patch('tvb_ext_bucket.bucket_api.resilience.time.time', return_value=1000)
+    breaker = CircuitBreaker('GET /v1/buckets', failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(DataproxyUnavailable):
+        breaker.before_call()
+    # the reset timeout elapsed, a single trial call is let through
+    clock.return_value = 1030
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(DataproxyUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_unfinished_trial(mocker):
+    clock = mocker.patch('tvb_ext_bucket.bucket_api.resilience.time.time', return_value=1000)
+    breaker = CircuitBreaker('GET /v1/buckets', failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.return_value = 1030
+    breaker.before_call()
+    # the outcome of the trial call is never recorded
+    clock.return_value = 1059
+    with pytest.raises(DataproxyUnavailable):
+        breaker.before_call()
+    clock.return_value = 1060
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_trial_failing_with_other_error_reopens_circuit(mocker, sleeps):
+    clock = mocker.patch('tvb_ext_bucket.bucket_api.resilience.time.time', return_value=1000)
+    breaker = CIRCUIT_BREAKERS.get('GET /v1/buckets')
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    clock.return_value += breaker.reset_timeout
+
+    def call():
+        raise requests.TooManyRedirects('redirected')
+    with pytest.raises(requests.TooManyRedirects):
+        call_with_retries('GET', '/v1/buckets', call)
+    assert CIRCUIT_BREAKERS.states() == {'GET /v1/buckets': CircuitBreaker.OPEN}
+    clock.return_value += breaker.reset_timeout
+    assert call_with_retries('GET', '/v1/buckets', lambda: response(200)).status_code == 200
+    assert CIRCUIT_BREAKERS.states() == {'GET /v1/buckets': CircuitBreaker.CLOSED}
+
+
+def test_other_errors_dont_open_circuit(sleeps):
+    breaker = CIRCUIT_BREAKERS.get('GET /v1/buckets')
+
+    def call():
+        raise requests.TooManyRedirects('redirected')
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(requests.TooManyRedirects):
+            call_with_retries('GET', '/v1/buckets', call)
+    assert CIRCUIT_BREAKERS.states() == {'GET /v1/buckets': CircuitBreaker.CLOSED}
+    assert breaker.failures == 0
+
+
+def test_client_fails_fast_once_circuit_is_open(mocker, sleeps):
+    client = ExtendedBucketApiClient(token=make_token(exp=time.time() + 100))
+    request = mocker.patch.object(client.session, 'request', return_value=response(502))
+    with pytest.raises(ClientHttpError):
+        client.get('/v1/buckets')
+    assert request.call_count == 3
+    # the circuit opens on the 5th consecutive failure, the last attempt is not sent
+    with pytest.raises(DataproxyUnavailable):
+        client.get('/v1/buckets')
+    assert request.call_count == 5
+    with pytest.raises(DataproxyUnavailable):
+        client.buckets.list_buckets()
+    assert request.call_count == 5
+    assert CIRCUIT_BREAKERS.states() == {'GET /v1/buckets': CircuitBreaker.OPEN}
+
+
+def test_client_keeps_expected_statuses(mocker, sleeps):
+    client = ExtendedBucketApiClient(token=make_token(exp=time.time() + 100))
+    mocker.patch.object(client.session, 'request', side_effect=[response(503), response(204)])
+    assert client.delete('/v1/buckets/b/f', expected=204).status_code == 204
+    mocker.patch.object(client.session, 'request', return_value=response(404))
+    with pytest.raises(ClientHttpError):
+        client.get('/v1/buckets/b')
@@ -0,0 +1,108 @@
+import hashlib
+import os
+
+import pytest
+
+from tvb_ext_bucket.sync import is_partial_download, is_same_file, list_local, local_hash, parse_last_modified, \
+    plan_sync
+
+
+def remote(size, file_hash='hash', last_modified='2023-01-11T08:27:45'):
+    return {'bytes': size, 'hash': file_hash, 'last_modified': last_modified}
+
+
+def local(size, mtime=0.0):
+    return {'path': 'path', 'bytes': size, 'mtime': mtime}
+
+
+def same_hash(_path, remote_hash):
+    return remote_hash
+
+
+def other_hash(_path, _remote_hash):
+    return 'other'
+
+
+def test_list_local_skips_partial_downloads(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'a.txt').write_bytes(b'abc')
+    (tmp_path / '.b.txt.part').write_bytes(b'a')
+    (tmp_path / '.b.txt.part.json').write_bytes(b'{}')
+    files = list_local(str(tmp_path))
+    assert list(files) == ['sub/a.txt']
+    assert files['sub/a.txt']['bytes'] == 3
+    assert is_partial_download('.b.txt.part')
+    assert not is_partial_download('b.txt.part')
+
+
+def test_local_hash(tmp_path):
+    path = tmp_path / 'file'
+    path.write_bytes(b'0123456789')
+    assert local_hash(str(path), 'md5') == hashlib.md5(b'0123456789').hexdigest()
+    parts = hashlib.md5(b''.join(hashlib.md5(part).digest() for part in [b'0123', b'4567', b'89'])).hexdigest()
+    assert local_hash(str(path), 'x-3', part_size=4) == f'{parts}-3'
+    # the object was uploaded with another part size
+    assert local_hash(str(path), 'x-2', part_size=4) is None
+    assert local_hash(str(path), None) is None
+
+
+def test_parse_last_modified():
+    assert parse_last_modified('1970-01-01T00:01:00') == 60
+    assert parse_last_modified('1970-01-01T00:01:00Z') == 60
+    assert parse_last_modified(None) is None
+    assert parse_last_modified('yesterday') is None
+
+
+
+def test_is_same_file():
+    remote_mtime = parse_last_modified('2023-01-11T08:27:45')
+    hashed = []
+
+    def hash_of(path, remote_hash):
+        hashed.append(path)
+        return remote_hash
+    # a download of the object got its last_modified date, no need to hash it
+    assert is_same_file(dict(local(1, remote_mtime), path='downloaded'), remote(1), hash_of)
+    assert hashed == []
+    # the hash of an unchanged file is computed once
+    assert is_same_file(dict(local(1, remote_mtime - 10), path='uploaded'), remote(1), hash_of)
+    assert is_same_file(dict(local(1, remote_mtime - 10), path='uploaded'), remote(1), hash_of)
+    assert hashed == ['uploaded']
+    # without a usable hash, a file edited after the object was written has changed
+    assert not is_same_file(local(1, remote_mtime + 10), remote(1, None), hash_of)
+    assert is_same_file(local(1, remote_mtime - 10), remote(1, None), hash_of)
+    assert not is_same_file(local(1, remote_mtime + 10), remote(1, 'x-2'), lambda _path, _hash: None)
+
+def test_plan_one_way_sync():
+    local_files = {'new': local(1), 'changed': local(1), 'same': local(1)}
+    remote_files = {'changed': remote(2), 'same': remote(1), 'extra': remote(1)}
+    assert plan_sync(local_files, remote_files, 'upload', hash_of=same_hash) == [
+        {'path': 'changed', 'action': 'upload', 'reason': 'changed'},
+        {'path': 'new', 'action': 'upload', 'reason': 'missing from the bucket'}
+    ]
+    assert [(a['path'], a['action']) for a in plan_sync(local_files, remote_files, 'upload', True, hash_of=same_hash)] \
+        == [('changed', 'upload'), ('extra', 'delete_remote'), ('new', 'upload')]
+    assert [(a['path'], a['action']) for a in plan_sync(local_files, remote_files, 'download', True,
+                                                        hash_of=other_hash)] \
+        == [('changed', 'download'), ('extra', 'download'), ('new', 'delete_local'), ('same', 'download')]
+
+
+def test_plan_two_way_sync_conflicts():
+    remote_mtime = parse_last_modified('2023-01-11T08:27:45')
+    local_files = {'newer_local': local(1, remote_mtime + 10), 'newer_remote': local(1, remote_mtime - 10)}
+    remote_files = {'newer_local': remote(1), 'newer_remote': remote(1)}
+
+    def actions(conflict):
+        return [a['action'] for a in plan_sync(local_files, remote_files, 'both', conflict=conflict,
+                                               hash_of=other_hash)]
+    assert actions('newer') == ['upload', 'download']
+    assert actions('local') == ['upload', 'upload']
+    assert actions('remote') == ['download', 'download']
+    assert actions('skip') == ['conflict', 'conflict']
+
+
+def test_plan_sync_rejects_unknown_policies():
+    with pytest.raises(ValueError):
+        plan_sync({}, {}, direction='sideways')
+    with pytest.raises(ValueError):
+        plan_sync({}, {}, conflict='random')
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tvb_ext_bucket.client_registry import ClientRegistry
+from tvb_ext_bucket.exceptions import CollabTokenError
+from tvb_ext_bucket.tests.test_client_registry import MockClient, make_token
+from tvb_ext_bucket.token_provider import TokenProvider, TOKEN_MIN_VALIDITY, get_collab_token
+
+
+class MockFetch:
+    def __init__(self, *tokens):
+        self.tokens = list(tokens)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        token = self.tokens[min(self.calls, len(self.tokens)) - 1]
+        if isinstance(token, Exception):
+            raise token
+        return token
+
+
+@pytest.fixture
+def provider_factory():
+    providers = []
+
+    def factory(*tokens, **kwargs):
+        provider = TokenProvider(fetch=MockFetch(*tokens), **kwargs)
+        providers.append(provider)
+        return provider
+
+    yield factory
+    for provider in providers:
+        provider.invalidate()
+
+
+def test_token_is_cached(provider_factory):
+    token = make_token(preferred_username='user', exp=time.time() + 3600)
+    provider = provider_factory(token)
+    assert provider.get_token() == token
+    assert provider.get_token() == token
+    assert provider._fetch.calls == 1
+    assert 3500 < provider.remaining() <= 3600
+
+
+def test_expiring_token_is_fetched_again(provider_factory):
+    first = make_token(preferred_username='user', exp=time.time() + TOKEN_MIN_VALIDITY / 2)
+    second = make_token(preferred_username='user', exp=time.time() + 3600)
+    provider = provider_factory(first, second)
+    assert provider.get_token() == first
+    assert provider.get_token() == second
+    assert provider._fetch.calls == 2
+
+
+def test_concurrent_callers_share_one_fetch(provider_factory):
+    token = make_token(preferred_username='user', exp=time.time() + 3600)
+    provider = provider_factory(token)
+    fetch, release = provider._fetch, threading.Event()
+
+    def slow_fetch():
+        release.wait(5)
+        return fetch()
+    provider._fetch = slow_fetch
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(provider.get_token) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        assert [future.result() for future in futures] == [token] * 4
+    assert fetch.calls == 1
+
+
+def test_token_without_exp_uses_ttl(provider_factory):
+    provider = provider_factory('not a jwt', ttl=60)
+    assert provider.get_token() == 'not a jwt'
+    assert 55 < provider.remaining() <= 60
+
+
+def test_refresh_is_scheduled_before_expiry(provider_factory):
+    token = make_token(preferred_username='user', exp=time.time() + 3600)
+    provider = provider_factory(token, refresh_margin=600)
+    provider.get_token()
+    assert provider._timer is not None
+    assert 2900 < provider._timer.interval <= 3000
+
+
+def test_refresh_notifies_new_token(provider_factory):
+    first = make_token(preferred_username='user', exp=time.time() + 3600)
+    second = make_token(preferred_username='user', exp=time.time() + 7200)
+    refreshed = []
+    provider = provider_factory(first, second, on_refresh=lambda old, new: refreshed.append((old, new)))
+    provider.get_token()
+    provider._refresh_in_background()
+    assert provider.get_token() == second
+    assert refreshed == [(first, second)]
+
+
+def test_failed_background_refresh_keeps_token(provider_factory):
+    token = make_token(preferred_username='user', exp=time.time() + 3600)
+    provider = provider_factory(token, CollabTokenError('EBRAINS is down'))
+    provider.get_token()
+    provider._refresh_in_background()
+    assert provider.get_token() == token
+    assert provider._timer is not None
+
+
+def test_invalidate(provider_factory):
+    first = make_token(preferred_username='user', exp=time.time() + 3600)
+    second = make_token(preferred_username='user', exp=time.time() + 7200)
+    provider = provider_factory(first, second)
+    provider.get_token()
+    provider.invalidate('another token')
+    assert provider.remaining() is not None
+    provider.invalidate(first)
+    assert provider.remaining() is None
+    assert provider.get_token() == second
+
+
+def test_registry_update_token():
+    registry = ClientRegistry(client_factory=MockClient)
+    first = make_token(preferred_username='user', exp=time.time() + 100)
+    second = make_token(preferred_username='user', exp=time.time() + 3600)
+    client = registry.get_client(first)
+    client._token = first
+    registry.update_token(first, second)
+    assert client._token == second
+    assert registry.get_client(second) is client
+    assert len(registry) == 1
+
+
+def test_get_collab_token_is_still_importable_from_wrapper():
+    from tvb_ext_bucket.ebrains_drive_wrapper import get_collab_token as wrapper_get_collab_token
+    assert wrapper_get_collab_token is get_collab_token
@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tvb_ext_bucket.tracing import NOOP_SPAN, Tracer, current_span, propagated, span, traced
+
+
+def read_traces(log_file):
+    with open(log_file) as f:
+        return [json.loads(line) for line in f]
+
+
+@traced('phase')
+def phase(size):
+    current_span().set('bytes', size)
+
+
+def test_unsampled_requests_are_not_traced(tmp_path):
+    tracer = Tracer(sample_rate=0, log_file=str(tmp_path / 'traces.jsonl'))
+    with tracer.trace('request') as root:
+        assert root is NOOP_SPAN
+        with span('phase') as child:
+            assert child is NOOP_SPAN
+        phase(10)
+    assert not (tmp_path / 'traces.jsonl').exists()
+
+
+def test_span_tree(tmp_path):
+    tracer = Tracer(sample_rate=1, log_file=str(tmp_path / 'traces.jsonl'))
+    with tracer.trace('request', method='GET'):
+        with span('bucket'):
+            pass
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(propagated(phase), [1, 2]))
+    assert current_span() is NOOP_SPAN
+
+    trace, = read_traces(tmp_path / 'traces.jsonl')
+    assert trace['name'] == 'request'
+    assert trace['attributes'] == {'method': 'GET'}
+    assert [child['name'] for child in trace['children']] == ['bucket', 'phase', 'phase']
+    assert sorted(child['attributes'].get('bytes', 0) for child in trace['children']) == [0, 1, 2]
+    assert trace['duration_ms'] >= max(child['duration_ms'] for child in trace['children'])
+
+
+def test_errors_are_recorded(tmp_path):
+    tracer = Tracer(sample_rate=1, log_file=str(tmp_path / 'traces.jsonl'))
+    with pytest.raises(ValueError):
+        with tracer.trace('request'):
+            with span('phase'):
+                raise ValueError('failed')
+
+    trace, = read_traces(tmp_path / 'traces.jsonl')
+    assert trace['error'] == 'ValueError'
+    assert trace['children'][0]['error'] == 'ValueError'
+
+
+def test_span_log_is_rotated(tmp_path):
+    log_file = tmp_path / 'traces.jsonl'
+    tracer = Tracer(sample_rate=1, log_file=str(log_file), log_max_bytes=300)
+    for _ in range(3):
+        with tracer.trace('request'):
+            pass
+    assert len(read_traces(log_file)) < 3
+    assert (tmp_path / 'traces.jsonl.1').exists()
+
+
+def test_missing_opentelemetry_is_ignored(mocker, tmp_path):
+    mocker.patch('tvb_ext_bucket.tracing.otel_trace', None)
+    tracer = Tracer(sample_rate=1, exporters='log,otel', log_file=str(tmp_path / 'traces.jsonl'))
+    assert tracer.exporters == ['log']
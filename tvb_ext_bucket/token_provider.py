@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from tvb_ext_bucket.client_registry import CLIENT_REGISTRY, get_token_claims
+from tvb_ext_bucket.exceptions import CollabTokenError
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+TOKEN_ENV_VAR = 'CLB_AUTH'
+# seconds before its expiry when a token is refreshed in the background
+TOKEN_REFRESH_MARGIN = int(os.getenv('TVB_EXT_BUCKET_TOKEN_REFRESH_MARGIN', 5 * 60))
+# seconds a token is cached when its expiry can't be read from it (not a JWT)
+TOKEN_TTL = int(os.getenv('TVB_EXT_BUCKET_TOKEN_TTL', 5 * 60))
+# seconds waited before trying again a background refresh which failed
+TOKEN_RETRY_DELAY = 30
+# a token expiring in less than this (in seconds) is not handed out anymore, a new one is fetched first
+TOKEN_MIN_VALIDITY = 10
+
+
+def get_collab_token():
+    # type: () -> str
+    """
+    Try to get the collab authentication token of the current user
+    -----
+    :return: token
+    """
+    try:
+        from clb_nb_utils import oauth as clb_oauth
+        token = clb_oauth.get_token()
+    except (ModuleNotFoundError, ConnectionError) as e:
+        LOGGER.warning(f"Could not connect to EBRAINS to retrieve an auth token: {e}")
+        LOGGER.info(f"Will try to use the auth token defined by environment variable {TOKEN_ENV_VAR}...")
+
+        token = os.environ.get(TOKEN_ENV_VAR)
+        if token is None:
+            LOGGER.error(f"No auth token defined as environment variable {TOKEN_ENV_VAR}! Please define one!")
+            raise CollabTokenError("Cannot connect to EBRAINS HPC without an auth token! Either run this on "
+                                   f"Collab, or define the {TOKEN_ENV_VAR} environment variable!")
+
+        LOGGER.info(f"Successfully retrieved the auth token from environment variable {TOKEN_ENV_VAR}!")
+
+    return token
+
+
+class TokenProvider:
+    """
+    Process wide cache of the collab token. The expiry of the token is read from its 'exp' claim, and the
+    token is fetched again in the background <refresh_margin> seconds before it expires, so requests
+    never wait for EBRAINS and long transfers never run into an expired token. Tokens which are not JWTs
+    are cached for <ttl> seconds.
+    """
+
+    def __init__(self, fetch=get_collab_token, refresh_margin=TOKEN_REFRESH_MARGIN, ttl=TOKEN_TTL,
+                 on_refresh=None):
+        # type: (Callable[[], str], int, int, Optional[Callable[[str, str], None]]) -> None
+        self.refresh_margin = refresh_margin
+        self.ttl = ttl
+        self._fetch = fetch
+        # called with (old token, new token) when the token is replaced
+        self._on_refresh = on_refresh
+        self._token = None  # type: Optional[str]
+        self._expires_at = None  # type: Optional[float]
+        self._timer = None  # type: Optional[threading.Timer]
+        self._lock = threading.Lock()
+        # held while a token is fetched, so concurrent callers wait for one fetch instead of each calling EBRAINS
+        self._refresh_lock = threading.Lock()
+
+    def _expiry_of(self, token):
+        # type: (str) -> float
+        exp = get_token_claims(token).get('exp')
+        return float(exp) if exp is not None else time.time() + self.ttl
+
+    def get_token(self):
+        # type: () -> str
+        """
+        Get the cached token, fetching a new one if there is none or it is about to expire. Callers arriving
+        while a token is fetched wait for it instead of fetching one too.
+        """
+        with self._lock:
+            if self._is_valid():
+                return self._token
+        with self._refresh_lock:
+            with self._lock:
+                if self._is_valid():
+                    return self._token
+            return self._refresh()
+
+    def _is_valid(self):
+        # type: () -> bool
+        """
+        Whether the cached token can still be handed out. Must be called with the lock held
+        """
+        return self._token is not None and self._expires_at - time.time() > TOKEN_MIN_VALIDITY
+
+    def refresh(self):
+        # type: () -> str
+        """
+        Fetch a new token, cache it and schedule its refresh
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self):
+        # type: () -> str
+        """
+        Same as refresh. Must be called with the refresh lock held
+        """
+        token = self._fetch()
+        if not token:
+            return token
+        expires_at = self._expiry_of(token)
+        validity = expires_at - time.time()
+        with self._lock:
+            old_token, self._token, self._expires_at = self._token, token, expires_at
+            if validity - self.refresh_margin > TOKEN_RETRY_DELAY:
+                self._schedule(validity - self.refresh_margin)
+            elif validity > TOKEN_RETRY_DELAY + TOKEN_MIN_VALIDITY:
+                # no fresher token was available, look for one again later
+                self._schedule(TOKEN_RETRY_DELAY)
+        if old_token is not None and old_token != token and self._on_refresh is not None:
+            self._on_refresh(old_token, token)
+        LOGGER.info(f'Token refreshed, valid for {validity:.0f}s')
+        return token
+
+    def _schedule(self, delay):
+        # type: (float) -> None
+        """
+        Schedule a background refresh in <delay> seconds. Must be called with the lock held
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self):
+        # type: () -> None
+        try:
+            self.refresh()
+        except Exception as e:
+            LOGGER.warning(f'Background refresh of the token failed: {e}')
+            with self._lock:
+                if self._token is not None and self._expires_at - time.time() > TOKEN_RETRY_DELAY + TOKEN_MIN_VALIDITY:
+                    self._schedule(TOKEN_RETRY_DELAY)
+
+    def remaining(self):
+        # type: () -> Optional[float]
+        """
+        Seconds the cached token is still valid, None if no token is cached
+        """
+        with self._lock:
+            if self._token is None:
+                return None
+            return max(0.0, self._expires_at - time.time())
+
+    def invalidate(self, token=None):
+        # type: (Optional[str]) -> None
+        """
+        Drop the cached token (e.g. after it was rejected), if <token> is provided only if it is still the cached one
+        """
+        with self._lock:
+            if token is not None and token != self._token:
+                return
+            self._token = None
+            self._expires_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+TOKEN_PROVIDER = TokenProvider(on_refresh=CLIENT_REGISTRY.update_token)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:  # OpenTelemetry export is optional
+    otel_trace = None
+
+from tvb_ext_bucket.logger.builder import get_logger
+
+LOGGER = get_logger(__name__)
+
+# fraction of the requests (and background jobs) which are traced, 0 disables the tracing
+TRACE_SAMPLE_RATE = float(os.getenv('TVB_EXT_BUCKET_TRACE_SAMPLE_RATE', 0))
+# where the traces are exported, comma separated: 'log' (the json span log) and/or 'otel' (OpenTelemetry)
+TRACE_EXPORTERS = os.getenv('TVB_EXT_BUCKET_TRACE_EXPORTERS', 'log')
+# json span log, one trace (the tree of its spans) per line
+TRACE_LOG_FILE = os.getenv('TVB_EXT_BUCKET_TRACE_LOG_FILE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'tvb_ext_bucket', 'traces.jsonl'))
+# size in bytes past which the span log is rotated, keeping the previous one as <file>.1
+TRACE_LOG_MAX_BYTES = int(os.getenv('TVB_EXT_BUCKET_TRACE_LOG_MAX_BYTES', 10 * 1024 * 1024))
+
+# span of the current request, None outside of sampled traces
+_CURRENT = contextvars.ContextVar('tvb_ext_bucket_span', default=None)
+
+
+class Span:
+    """
+    Timed phase of a traced request, with its attributes (e.g. transferred bytes) and the spans of its sub phases
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        # type: (str, Optional[Span], Optional[Dict[str, Any]]) -> None
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.children = []  # type: List[Span]
+        self.error = None  # type: Optional[str]
+        self.start = time.time()
+        self.duration = None  # type: Optional[float]
+        self._started = time.perf_counter()
+        # token restoring the span which was current before this one
+        self.token = None  # type: Optional[contextvars.Token]
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, key, value):
+        # type: (str, Any) -> None
+        self.attributes[key] = value
+
+    def add(self, key, amount):
+        # type: (str, float) -> None
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self, error=None):
+        # type: (Optional[BaseException]) -> None
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = type(error).__name__
+
+    def to_json(self):
+        # type: () -> Dict[str, Any]
+        data = {
+            'name': self.name,
+            'span_id': self.span_id,
+            'start': self.start,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'attributes': self.attributes,
+            'children': [child.to_json() for child in list(self.children)]
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+class _NoopSpan:
+    """
+    Span handed out outside of sampled traces, records nothing
+    """
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    # type: () -> Any
+    span = _CURRENT.get()
+    return span if span is not None else NOOP_SPAN
+
+
+@contextmanager
+def span(name, **attributes):
+    # type: (str, Any) -> Iterator[Any]
+    """
+    Time the enclosed block as a sub phase of the current span, does nothing outside of sampled traces
+    """
+    parent = _CURRENT.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(name, parent, attributes)
+    token = _CURRENT.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    else:
+        child.end()
+    finally:
+        _CURRENT.reset(token)
+
+
+def traced(name):
+    # type: (str) -> Callable
+    """
+    Decorator timing each call of the decorated function as a span named <name>
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _CURRENT.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagated(func):
+    # type: (Callable) -> Callable
+    """
+    Wrap <func> to run in the context of the caller, so the spans of the calls made on a thread pool
+    are attached to the current span. The context is copied for each call, calls can run concurrently.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+class Tracer:
+    """
+    Starts the traces of a sampled fraction (<sample_rate>) of the requests and exports the finished ones
+    to <exporters>: 'log' appends the tree of spans as a json line to <log_file>, 'otel' sends the spans to
+    the OpenTelemetry tracer provider configured in the process. Requests which are not sampled only pay
+    for a context variable lookup per instrumented call.
+    """
+
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, exporters=TRACE_EXPORTERS, log_file=TRACE_LOG_FILE,
+                 log_max_bytes=TRACE_LOG_MAX_BYTES):
+        # type: (float, str, str, int) -> None
+        self.sample_rate = sample_rate
+        self.exporters = [exporter.strip() for exporter in exporters.split(',') if exporter.strip()]
+        self.log_file = log_file
+        self.log_max_bytes = log_max_bytes
+        self._lock = threading.Lock()
+        if 'otel' in self.exporters and otel_trace is None:
+            LOGGER.warning('OpenTelemetry is not installed, traces are not exported to it')
+            self.exporters.remove('otel')
+
+    def start(self, name, **attributes):
+        # type: (str, Any) -> Optional[Span]
+        """
+        Start a trace for the current request if it is sampled, its root span becomes the current span
+        -------
+        :return: the root span, None if the request is not sampled
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        root = Span(name, attributes=attributes)
+        root.token = _CURRENT.set(root)
+        return root
+
+    def finish(self, root, error=None):
+        # type: (Span, Optional[BaseException]) -> None
+        root.end(error)
+        try:
+            _CURRENT.reset(root.token)
+        except ValueError:
+            # finished from another context than the one it started in
+            _CURRENT.set(None)
+        self.export(root)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        # type: (str, Any) -> Iterator[Any]
+        """
+        Trace the enclosed block if it is sampled, for the work which is not started by a request (e.g. jobs)
+        """
+        root = self.start(name, **attributes)
+        if root is None:
+            yield NOOP_SPAN
+            return
+        try:
+            yield root
+        except BaseException as e:
+            self.finish(root, e)
+            raise
+        self.finish(root)
+
+    def export(self, root):
+        # type: (Span) -> None
+        try:
+            if 'log' in self.exporters:
+                self._export_log(root)
+            if 'otel' in self.exporters:
+                self._export_otel(root)
+        except Exception as e:
+            LOGGER.warning(f'Could not export trace {root.trace_id}: {e}')
+
+    def _export_log(self, root):
+        # type: (Span) -> None
+        line = json.dumps(dict(root.to_json(), trace_id=root.trace_id)) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+            try:
+                if os.path.getsize(self.log_file) + len(line) > self.log_max_bytes:
+                    os.replace(self.log_file, f'{self.log_file}.1')
+            except FileNotFoundError:
+                pass
+            with open(self.log_file, 'a') as f:
+                f.write(line)
+
+    def _export_otel(self, span, parent_context=None):
+        # type: (Span, Any) -> None
+        """
+        Replay the finished <span> and its children to OpenTelemetry, with their recorded timings
+        """
+        tracer = otel_trace.get_tracer('tvb_ext_bucket')
+        otel_span = tracer.start_span(span.name, context=parent_context, attributes=span.attributes,
+                                      start_time=int(span.start * 1e9))
+        if span.error is not None:
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        context = otel_trace.set_span_in_context(otel_span)
+        for child in list(span.children):
+            self._export_otel(child, context)
+        otel_span.end(end_time=int((span.start + (span.duration or 0)) * 1e9))
+
+
+TRACER = Tracer()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# "TheVirtualBrain - Widgets" package
+#
+# (c) 2022-2025, TVB Widgets Team
+#
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable
+
+from tvb_ext_bucket.exceptions import TransferCancelled
+from tvb_ext_bucket.logger.builder import get_logger
+from tvb_ext_bucket.tracing import propagated
+
+LOGGER = get_logger(__name__)
+
+# number of files transferred at the same time by bulk operations
+BULK_TRANSFER_WORKERS = int(os.getenv('TVB_EXT_BUCKET_BULK_TRANSFER_WORKERS', 8))
+
+_cancellation = threading.local()
+
+
+@contextmanager
+def cancellable(cancel_event):
+    # type: (threading.Event) -> None
+    """
+    Bulk transfers started by the current thread in this context skip the items not started yet
+    once <cancel_event> is set. Transfers already in progress are completed.
+    """
+    _cancellation.event = cancel_event
+    try:
+        yield
+    finally:
+        _cancellation.event = None
+
+
+def run_transfers(transfer, items, workers=BULK_TRANSFER_WORKERS, name_of=str, size_of=None):
+    # type: (Callable[[Any], Any], Iterable[Any], int, Callable[[Any], str], Callable[[Any], int]) -> dict
+    """
+    Call <transfer> for each of the <items> on a pool of <workers> threads. Items are submitted in order,
+    so callers can schedule some transfers ahead of others by sorting them.
+    -------
+    :return: summary with the outcome of each item, named by <name_of>, in the order of <items>. The outcome
+    holds the value returned by <transfer>, if any, as 'result'. The summary counts the items skipped by a
+    cancellation as 'cancelled'. When <size_of> is provided, the summary also has the bytes transferred
+    successfully and the aggregate throughput (bytes/s)
+    """
+    items = list(items)
+    cancel_event = getattr(_cancellation, 'event', None)
+
+    def run(item):
+        if cancel_event is not None and cancel_event.is_set():
+            raise TransferCancelled('Transfer cancelled')
+        return transfer(item)
+
+    started_at = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='tvb_ext_bucket_bulk') as pool:
+        run = propagated(run)
+        futures = [pool.submit(run, item) for item in items]
+        outcomes = []
+        cancelled = 0
+        for item, future in zip(items, futures):
+            outcome = {'name': name_of(item), 'success': True, 'message': ''}
+            try:
+                result = future.result()
+                if result is not None:
+                    outcome['result'] = result
+            except TransferCancelled as e:
+                outcome['success'] = False
+                outcome['message'] = str(e)
+                cancelled += 1
+            except Exception as e:
+                LOGGER.error(f'Transfer of {outcome["name"]} failed: {e}')
+                outcome['success'] = False
+                outcome['message'] = str(e)
+            outcomes.append(outcome)
+
+    elapsed = time.time() - started_at
+    failed = sum(not outcome['success'] for outcome in outcomes)
+    summary = {
+        'success': failed == 0,
+        'succeeded': len(outcomes) - failed,
+        'failed': failed,
+        'cancelled': cancelled,
+        'elapsed': elapsed,
+        'files': outcomes
+    }
+    if size_of is not None:
+        transferred = sum(size_of(item) or 0 for item, outcome in zip(items, outcomes) if outcome['success'])
+        summary['bytes'] = transferred
+        summary['throughput'] = transferred / elapsed if elapsed > 0 else 0
+    return summary